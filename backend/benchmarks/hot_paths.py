@@ -0,0 +1,135 @@
+"""
+Microbenchmarks for template_engine and document_processor hot paths
+
+Run from backend/:
+    python -m benchmarks.hot_paths                      # full suite
+    python -m benchmarks.hot_paths --quick              # small sizes only
+    python -m benchmarks.hot_paths --save baseline.json
+    python -m benchmarks.hot_paths --compare baseline.json
+
+Reports ops/sec and peak traced memory per case. Runs fully offline.
+With --compare, exits non-zero if any case is slower than the baseline
+by more than --threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Settings are read at import time; benchmarks never call external services
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from benchmarks.synthetic import make_variables, make_answers, make_text
+from services import template_engine
+from services.document_processor import chunk_text
+
+KB = 1024
+MB = 1024 * KB
+
+# (body size, number of variables)
+FULL_SIZES = [(1 * KB, 10), (100 * KB, 100), (1 * MB, 1000), (5 * MB, 1000)]
+QUICK_SIZES = [(1 * KB, 10), (100 * KB, 100)]
+
+def measure(func, min_time: float) -> dict:
+    """Run func repeatedly for at least min_time seconds, then once more under tracemalloc"""
+    func()  # Warm up (fills caches the way a running server would)
+
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or runs < 3:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(runs / elapsed, 3),
+        "mean_ms": round(elapsed / runs * 1000, 4),
+        "peak_kb": round(peak / KB, 1),
+    }
+
+def build_cases(sizes: list) -> list:
+    cases = []
+    for size, num_variables in sizes:
+        label = f"{size // KB}KB/{num_variables}vars"
+        variables = make_variables(num_variables)
+        answers = make_answers(variables)
+        template_body = make_text(size, variables, placeholders=True)
+        plain_text = make_text(size, variables, placeholders=False)
+
+        cases.append((f"generate_draft[{label}]",
+                      lambda b=template_body, a=answers: template_engine.generate_draft(b, a, "bench")))
+        cases.append((f"parse_template[{label}]",
+                      lambda b=template_body: template_engine.parse_template(b)))
+        cases.append((f"create_template_from_text[{label}]",
+                      lambda t=plain_text, v=variables: template_engine.create_template_from_text(t, v)))
+        cases.append((f"chunk_text[{label}]",
+                      lambda t=plain_text: chunk_text(t)))
+
+    for num_variables in sorted({n for _, n in sizes}):
+        variables = make_variables(num_variables)
+        answers = make_answers(variables)
+        cases.append((f"validate_answers[{num_variables}vars]",
+                      lambda v=variables, a=answers: template_engine.validate_answers(v, a)))
+    return cases
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print deltas against a baseline and return the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':<48} {'baseline':>12} {'current':>12} {'delta':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"{name:<48} {'-':>12} {current['ops_per_sec']:>12.1f} {'new':>8}")
+            continue
+        delta = current["ops_per_sec"] / previous["ops_per_sec"] - 1
+        marker = ""
+        if delta < -threshold:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print(f"{name:<48} {previous['ops_per_sec']:>12.1f} {current['ops_per_sec']:>12.1f} {delta:>+8.1%}{marker}")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="only the small document sizes")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to run each case")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'case':<48} {'ops/sec':>12} {'mean ms':>12} {'peak KB':>12}")
+    for name, func in build_cases(QUICK_SIZES if args.quick else FULL_SIZES):
+        if args.filter not in name:
+            continue
+        result = measure(func, args.min_time)
+        results[name] = result
+        print(f"{name:<48} {result['ops_per_sec']:>12.1f} {result['mean_ms']:>12.3f} {result['peak_kb']:>12.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Concurrent read/write throughput of SQLite with the default and tuned profiles
+
+Run from backend/:
+    python -m benchmarks.sqlite_concurrency
+    python -m benchmarks.sqlite_concurrency --writers 8 --readers 8 --seconds 10
+
+Each profile gets a fresh database file. In the default and tuned profiles,
+writer threads insert DraftInstance rows one transaction per draft. The
+batched profile runs the shipped DraftWriteBatcher instead: --concurrency
+coroutines each submit one draft at a time, like concurrent /drafts/generate
+requests, and the batcher groups them into transactions. Readers run the
+point lookups and listings the API serves, in separate processes (like other
+API workers) so they don't compete with the writers for the GIL. Reports
+committed drafts/sec, reads/sec and "database is locked" errors.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, event, insert, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from database import Base, apply_sqlite_pragmas
+from services.draft_writer import DraftWriteBatcher
+import models
+
+# (name, tuned, use the draft write batcher)
+PROFILES = [
+    ("default", False, False),
+    ("tuned", True, False),
+    ("tuned+batcher", True, True),
+]
+
+def connect_engine(path: str, tuned: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if tuned:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+def make_engine(path: str, tuned: bool):
+    engine = connect_engine(path, tuned)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Template), [{"template_id": "tpl_bench", "title": "Bench", "body_md": "x"}])
+    return engine
+
+def draft_row(i: int) -> dict:
+    return {
+        "template_id": "tpl_bench",
+        "user_query": "",
+        "answers_json": {"claimant_full_name": f"Claimant {i}", "policy_number": f"POL-{i:06d}"},
+        "draft_md": "Notice to insurer. " * 200,
+    }
+
+def reader_process(path: str, tuned: bool, ready, stop_at, results):
+    """Point lookups and listings until stop_at (wall clock), set by the parent once all readers are up"""
+    engine = connect_engine(path, tuned)
+    rng = random.Random()
+    reads = locked = 0
+    ready.put(True)
+    while not stop_at.value:
+        time.sleep(0.001)
+    while time.time() < stop_at.value:
+        try:
+            with engine.connect() as conn:
+                top = conn.execute(select(func.max(models.DraftInstance.id))).scalar() or 1
+                conn.execute(
+                    select(models.DraftInstance).where(models.DraftInstance.id == rng.randint(1, top))
+                ).first()
+                conn.execute(
+                    select(models.DraftInstance.id, models.DraftInstance.created_at)
+                    .order_by(models.DraftInstance.id.desc()).limit(20)
+                ).all()
+            reads += 1
+        except OperationalError:
+            locked += 1
+    engine.dispose()
+    results.put((reads, locked))
+
+async def run_batcher_writers(path: str, concurrency: int, max_batch: int, stop: float, counts: dict):
+    """Concurrent single-draft submits through DraftWriteBatcher, as the API does them"""
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    batcher = DraftWriteBatcher(
+        max_batch=max_batch,
+        session_factory=async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+
+    async def submitter(n: int):
+        i = n
+        while time.time() < stop:
+            try:
+                await batcher.submit(draft_row(i))
+                counts["writes"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+            i += concurrency
+
+    await asyncio.gather(*(submitter(n) for n in range(concurrency)))
+    await batcher.close()
+    await async_engine.dispose()
+
+def run_profile(tuned: bool, use_batcher: bool, writers: int, readers: int, seconds: float, concurrency: int, batch: int) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="lexi-sqlite-bench-")
+    path = os.path.join(tmpdir, "bench.db")
+    engine = make_engine(path, tuned)
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Queue(), context.Queue()
+    stop_at = context.Value("d", 0.0)
+    processes = [
+        context.Process(target=reader_process, args=(path, tuned, ready, stop_at, results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+    stop = time.time() + seconds
+    stop_at.value = stop
+
+    def writer():
+        i = 0
+        while time.time() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(models.DraftInstance), [draft_row(i)])
+                with lock:
+                    counts["writes"] += 1
+            except OperationalError:
+                with lock:
+                    counts["locked"] += 1
+            i += 1
+
+    if use_batcher:
+        asyncio.run(run_batcher_writers(path, concurrency, batch, stop, counts))
+    else:
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    for _ in processes:
+        reads, locked = results.get()
+        counts["reads"] += reads
+        counts["locked"] += locked
+    for process in processes:
+        process.join()
+    engine.dispose()
+
+    return {
+        "drafts_per_sec": round(counts["writes"] / seconds, 1),
+        "reads_per_sec": round(counts["reads"] / seconds, 1),
+        "locked_errors": counts["locked"],
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent draft submits for the batcher profile")
+    parser.add_argument("--batch", type=int, default=100, help="max rows per transaction for the batcher profile")
+    args = parser.parse_args(argv)
+
+    print(f"{args.writers} writer threads (batcher: {args.concurrency} concurrent submits), "
+          f"{args.readers} reader processes, {args.seconds}s per profile\n")
+    print(f"{'profile':<16} {'drafts/sec':>12} {'reads/sec':>12} {'locked':>8}")
+    for name, tuned, use_batcher in PROFILES:
+        result = run_profile(tuned, use_batcher, args.writers, args.readers, args.seconds, args.concurrency, args.batch)
+        print(f"{name:<16} {result['drafts_per_sec']:>12.1f} {result['reads_per_sec']:>12.1f} {result['locked_errors']:>8}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Cold-start cost of the API process
+
+Run from backend/:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 15
+
+Each run is a fresh interpreter, so nothing is warm. Reports:
+- the time to `import main` (what every autoscaled worker pays before serving)
+- the time to run the app's lifespan startup (schema creation) against a scratch SQLite file
+- the slowest modules by cumulative import time, from python -X importtime
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+LIFESPAN_SNIPPET = """
+import asyncio, time
+import main
+async def run():
+    start = time.perf_counter()
+    async with main.lifespan(main.app):
+        print(time.perf_counter() - start)
+asyncio.run(run())
+"""
+
+def _run(args: list, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+
+def _scratch_env(tmpdir: str) -> dict:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'startup.db')}"
+    env["LLM_CACHE_PATH"] = os.path.join(tmpdir, "llm_cache.db")
+    return env
+
+def slowest_imports(env: dict, top: int) -> list:
+    """(cumulative_ms, module) pairs from -X importtime, slowest first"""
+    result = _run(["-X", "importtime", "-c", "import main"], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|", 2)
+        # Nesting is shown as two extra spaces per level; keep the first two levels
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth <= 1:
+            rows.append((int(cumulative) / 1000, module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="how many slow imports to list")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="lexi-startup-") as tmpdir:
+        env = _scratch_env(tmpdir)
+        import_times = [float(_run(["-c", IMPORT_SNIPPET], env).stdout.strip()) for _ in range(args.runs)]
+        lifespan_times = []
+        for i in range(args.runs):
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, f'startup_{i}.db')}"
+            lifespan_times.append(float(_run(["-c", LIFESPAN_SNIPPET], env).stdout.strip().splitlines()[-1]))
+        slow = slowest_imports(env, args.top)
+
+    print(f"{'phase':<24} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, times in (("import main", import_times), ("lifespan startup", lifespan_times)):
+        ms = [t * 1000 for t in times]
+        print(f"{name:<24} {statistics.median(ms):>10.1f} {min(ms):>10.1f} {max(ms):>10.1f}")
+
+    print("\nSlowest top-level imports (cumulative ms):")
+    for ms, module in slow:
+        print(f"{ms:>10.1f}  {module}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
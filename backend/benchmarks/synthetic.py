@@ -0,0 +1,74 @@
+"""
+Synthetic legal documents for benchmarks
+Deterministic (seeded) so runs are comparable against a saved baseline
+"""
+import random
+
+CLAUSES = [
+    "The Insured shall notify the Insurer of any incident within thirty (30) days of its occurrence.",
+    "This Agreement shall be governed by and construed in accordance with the laws of the jurisdiction stated herein.",
+    "Any dispute arising out of or in connection with this Agreement shall be referred to arbitration.",
+    "The Parties agree that time shall be of the essence in the performance of their obligations.",
+    "No waiver of any breach shall be deemed a waiver of any subsequent breach of the same or any other provision.",
+    "The Tenant shall pay the monthly rent on or before the fifth day of each calendar month.",
+    "All notices under this Agreement shall be in writing and delivered to the addresses set out above.",
+    "The Employee shall not disclose any Confidential Information during or after the term of employment.",
+]
+
+FIRST_NAMES = ["Rajesh", "Priya", "Arjun", "Meera", "Vikram", "Anita", "Rahul", "Sunita"]
+LAST_NAMES = ["Kumar", "Sharma", "Patel", "Iyer", "Singh", "Reddy", "Gupta", "Nair"]
+
+def make_variables(num_variables: int, seed: int = 0) -> list:
+    """Variable definitions with a mix of dtypes, regexes and enums"""
+    rng = random.Random(seed)
+    variables = []
+    for i in range(num_variables):
+        kind = i % 5
+        variable = {
+            "key": f"field_{i}",
+            "label": f"Field {i}",
+            "description": f"Synthetic field number {i}",
+            "required": i % 2 == 0,
+            "dtype": "string",
+        }
+        if kind == 0:
+            variable["example"] = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        elif kind == 1:
+            variable["dtype"] = "date"
+            variable["example"] = f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}"
+        elif kind == 2:
+            variable["dtype"] = "number"
+            variable["example"] = str(1000 + i * 37)
+        elif kind == 3:
+            variable["example"] = f"POL-{100000 + i}"
+            variable["regex"] = r"^POL-\d{6}$"
+        else:
+            variable["example"] = "Mumbai" if i % 2 else "Delhi"
+            variable["enum"] = ["Mumbai", "Delhi", "Chennai", "Kolkata"]
+        variables.append(variable)
+    return variables
+
+def make_answers(variables: list) -> dict:
+    return {v["key"]: v["example"] for v in variables}
+
+def make_text(size_bytes: int, variables: list, placeholders: bool, seed: int = 0) -> str:
+    """
+    Build a document of roughly size_bytes
+    Each variable appears at least once, either as a {{placeholder}} or as its example value
+    """
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    i = 0
+    while size < size_bytes or i < len(variables):
+        sentence = rng.choice(CLAUSES)
+        if variables:
+            variable = variables[i % len(variables)]
+            value = f"{{{{ {variable['key']} }}}}" if placeholders else variable["example"]
+            sentence = f"{sentence} Reference: {value}."
+        parts.append(sentence)
+        size += len(sentence) + 1
+        i += 1
+        if i % 6 == 0:
+            parts.append("\n\n")
+    return " ".join(parts)
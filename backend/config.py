@@ -1,12 +1,82 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
-    gemini_api_key: str
+    gemini_api_key: str = ""  # Only needed once the Gemini backend makes its first call
     exa_api_key: str = ""
     database_url: str = "sqlite:///./legal_templates.db"
+    async_database_url: str = ""  # Derived from database_url when empty (aiosqlite / asyncpg)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: int = 30
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    
+    # SQLite tuning profile, applied to every connection
+    sqlite_tuning: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000  # Negative = KiB, so about 64 MB
+    sqlite_busy_timeout_ms: int = 5000
+    draft_write_batching: Optional[bool] = None  # Unset: on for SQLite, where each commit is an fsync; off otherwise
+    draft_write_batch_size: int = 100
+    draft_write_batch_delay_ms: int = 5
+    draft_session_cache_size: int = 1024  # Render states kept for incremental draft sessions
     max_file_size_mb: int = 10
+    parse_workers: int = 2
     allowed_file_types: str = "application/pdf,application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     frontend_url: str = "http://localhost:3000"
+    question_batch_mode: bool = True
+    
+    # LLM client
+    llm_backend: str = "gemini"  # "gemini" or "stub" (offline, for load testing)
+    llm_model: str = "gemini-1.5-flash"
+    llm_max_concurrency: int = 8
+    llm_timeout_seconds: float = 30.0
+    llm_max_retries: int = 2
+    llm_retry_backoff_seconds: float = 0.5
+    llm_stub_latency_ms: int = 0
+    
+    # LLM response cache (in-memory LRU backed by a SQLite table)
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./llm_cache.db"
+    llm_cache_memory_entries: int = 1024
+    llm_cache_max_entries: int = 50000
+    llm_cache_ttl_seconds: int = 7 * 24 * 3600
+    
+    # Variable extraction
+    extraction_chunk_size: int = 3000
+    extraction_parallelism: int = 4
+    
+    # Background ingestion (/documents/ingest)
+    ingest_workers: int = 2
+    ingest_storage_dir: str = "./ingest_uploads"
+    ingest_max_attempts: int = 3
+    ingest_retry_backoff_seconds: float = 5.0
+    ingest_job_timeout_seconds: float = 600.0
+    ingest_lease_margin_seconds: float = 60.0  # Lease = job timeout + margin
+    ingest_poll_interval_seconds: float = 1.0
+    ingest_events_poll_seconds: float = 15.0
+    
+    # Web search
+    web_search_backend: str = "exa"  # "exa" or "stub" (offline, deterministic results)
+    web_search_max_concurrency: int = 4
+    web_search_timeout_seconds: float = 20.0
+    web_search_cache_ttl_seconds: int = 3600
+    web_search_cache_entries: int = 256
+    web_search_stub_latency_ms: int = 0
+    
+    # Document embeddings (local hashing embeddings in a memory-mapped matrix)
+    embedding_dim: int = 512
+    embedding_index_dir: str = "./embedding_index"
+    
+    # Template matching
+    match_top_k: int = 10
+    match_lexical_confidence: float = 0.85  # Skip the LLM at or above this lexical confidence
+    
+    # Prefill: rule-extracted values at or above this confidence are not sent to the LLM
+    prefill_rule_min_confidence: float = 0.75
     
     class Config:
         env_file = ".env"
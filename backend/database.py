@@ -1,16 +1,103 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import time
 from config import settings
+from services import metrics
+
+IS_SQLITE = settings.database_url.startswith("sqlite")
+
+def _pool_options() -> dict:
+    """Connection pool settings for server databases (SQLite uses SQLAlchemy's defaults)"""
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+def _async_database_url(url: str) -> str:
+    """Swap the sync driver in database_url for its async counterpart"""
+    if settings.async_database_url:
+        return settings.async_database_url
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+def sqlite_pragmas() -> list:
+    """PRAGMAs for the tuned SQLite profile"""
+    return [
+        f"journal_mode={settings.sqlite_journal_mode}",
+        f"synchronous={settings.sqlite_synchronous}",
+        f"mmap_size={settings.sqlite_mmap_size}",
+        f"cache_size={settings.sqlite_cache_size}",
+        f"busy_timeout={settings.sqlite_busy_timeout_ms}",
+        "temp_store=MEMORY",
+    ]
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Connect hook: WAL lets readers run alongside a writer, NORMAL sync is safe under WAL"""
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas():
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
 
 engine = create_engine(
     settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **_pool_options()
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the async routers, so queries don't block the event loop
+async_engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    **_pool_options()
+)
+
+if IS_SQLITE and settings.sqlite_tuning:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+# The start time lives on the statement's execution context, so a statement that
+# fails (after_cursor_execute never fires) leaves nothing behind to mis-time the next one
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    operation = statement.lstrip()[:6].upper()
+    metrics.db_query_duration.observe(time.perf_counter() - start, operation)
+
+def _query_failed(exception_context):
+    # Failed statements are timed too
+    context = exception_context.execution_context
+    start = getattr(context, "_query_start", None)
+    if start is None or not exception_context.statement:
+        return
+    operation = exception_context.statement.lstrip()[:6].upper()
+    metrics.db_query_duration.observe(time.perf_counter() - start, operation)
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _query_started)
+    event.listen(_engine, "after_cursor_execute", _query_finished)
+    event.listen(_engine, "handle_error", _query_failed)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -18,6 +105,39 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def add_missing_columns(engine):
+    """
+    Add model columns that existing tables don't have yet, with their indexes
+    create_all only creates missing tables, and the project has no migrations,
+    so columns added to an existing model would otherwise break every query on
+    databases created before them. New columns are added as nullable.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in present]
+            for column in added:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"Added column {table.name}.{column.name}")
+            added_names = {column.name for column in added}
+            for index in table.indexes:
+                if added_names & {column.name for column in index.columns}:
+                    index.create(conn, checkfirst=True)
+
 def init_db():
     import models
+    from services.search_index import install_search_index
+    from services.embeddings import migrate_embedding_column
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    migrate_embedding_column(engine)
+    install_search_index(engine)
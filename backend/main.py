@@ -1,18 +1,151 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.exceptions import HTTPException
+from sqlalchemy import text
+import time
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
-from database import init_db
-from routers import documents, templates, chat, drafts
+from database import init_db, engine, async_engine
+from services.document_processor import shutdown_parse_pool
+from services.llm_cache import get_llm_cache
+from services.draft_writer import draft_writer
+from services.ingestion import ingestion_queue
+from services import metrics
+from routers import documents, templates, chat, drafts, search
 
-# Initialize database
-init_db()
+startup_state = {"ready": False, "startup_seconds": None}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation happens at startup, not import, so importing the app stays cheap
+    start = time.perf_counter()
+    await run_in_threadpool(init_db)
+    ingestion_queue.start()
+    startup_state["startup_seconds"] = round(time.perf_counter() - start, 4)
+    startup_state["ready"] = True
+    
+    yield
+    
+    startup_state["ready"] = False
+    await ingestion_queue.stop()
+    await draft_writer.close()
+    shutdown_parse_pool()
+    await async_engine.dispose()
+    engine.dispose()
 
 app = FastAPI(
     title="LexiDraft API",
     description="Legal Document Templating System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Full path template of each included route, keyed by (endpoint, path within its router)
+ROUTE_LABELS = {}
+
+def include_router(router, prefix: str, **kwargs):
+    """
+    Include a router and remember the full paths of its routes
+    Newer FastAPI puts the router's own route on the scope, whose path lacks the prefix
+    """
+    app.include_router(router, prefix=prefix, **kwargs)
+    for route in router.routes:
+        if hasattr(route, "endpoint"):
+            ROUTE_LABELS[(route.endpoint, route.path)] = prefix + route.path
+
+def route_label(route) -> str:
+    """Metric label for a matched route: its full path template"""
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    return ROUTE_LABELS.get((getattr(route, "endpoint", None), path), path)
+
+class TimingMiddleware:
+    """
+    Records per-route latency into the request histogram
+    Plain ASGI (no BaseHTTPMiddleware) so the hot path only adds two clock reads
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route on the scope; label by its full path template
+            metrics.http_request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                route_label(scope.get("route")),
+                str(status[0])
+            )
+
+# Endpoints that take a single document upload, capped at settings.max_file_size_mb
+UPLOAD_PATHS = ("/documents/upload", "/documents/ingest")
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized document uploads before the body is buffered
+    The multipart form is parsed before the endpoint runs, so the limit is
+    enforced here: on Content-Length up front, and on the bytes received for
+    chunked requests without one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in UPLOAD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = settings.max_file_size_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+        detail = f"File exceeds the {settings.max_file_size_mb} MB limit"
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail}, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Re-raised by FastAPI's body parsing, so the client gets a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware)
+app.add_middleware(TimingMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,13 +153,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
-app.include_router(documents.router, prefix="/documents", tags=["documents"])
-app.include_router(templates.router, prefix="/templates", tags=["templates"])
-app.include_router(chat.router, prefix="/chat", tags=["chat"])
-app.include_router(drafts.router, prefix="/drafts", tags=["drafts"])
+include_router(documents.router, prefix="/documents", tags=["documents"])
+include_router(templates.router, prefix="/templates", tags=["templates"])
+include_router(chat.router, prefix="/chat", tags=["chat"])
+include_router(drafts.router, prefix="/drafts", tags=["drafts"])
+include_router(search.router, prefix="/search", tags=["search"])
 
 @app.get("/")
 def root():
@@ -38,8 +173,34 @@ def root():
 
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: startup finished and the database answers"""
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "ready", "startup_seconds": startup_state["startup_seconds"]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, database, LLM and web search metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the LLM response cache"""
+    response_cache = get_llm_cache()
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
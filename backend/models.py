@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -42,9 +42,31 @@ class Document(Base):
     filename = Column(String)
     mime_type = Column(String)
     raw_text = Column(Text)
-    embedding = Column(JSON, nullable=True)  # Vector embedding
+    content_hash = Column(String(64), index=True)  # sha256 of the uploaded bytes
+    variables = Column(JSON, nullable=True)  # Variables extracted at upload time
+    embedding = Column(LargeBinary, nullable=True)  # Packed float32 vector, see services.embeddings
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String)
+    mime_type = Column(String)
+    content_hash = Column(String(64), index=True)  # Uploaded bytes are stored under this name
+    force_reextract = Column(Boolean, default=False)  # Skip cached LLM responses
+    status = Column(String, index=True, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text, nullable=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # A running job past this is claimed again
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
 class DraftInstance(Base):
     __tablename__ = "instances"
     
@@ -56,3 +78,31 @@ class DraftInstance(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     template = relationship("Template", back_populates="instances")
+
+class DraftSession(Base):
+    __tablename__ = "draft_sessions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(String, ForeignKey("templates.template_id"))
+    body_hash = Column(String(64))  # sha256 of the template body the draft was last rendered from
+    answers_json = Column(JSON)  # Current answers; history is in the revisions
+    revision = Column(Integer, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DraftRevision(Base):
+    __tablename__ = "draft_revisions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("draft_sessions.id"), index=True)
+    revision = Column(Integer)
+    changes_json = Column(JSON)  # Answer delta; a null value cleared the answer
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class VariableQuestion(Base):
+    __tablename__ = "variable_questions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True)  # Hash of label, description, dtype, example
+    question = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
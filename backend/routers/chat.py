@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from services.ai_service import match_template, generate_questions
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_async_db
+from services.ai_service import match_template, generate_questions, prefill_template_answers
 import schemas
 
 router = APIRouter()
 
 @router.post("/match-template", response_model=schemas.TemplateMatchResponse)
-async def find_matching_template(request: schemas.ChatRequest, db: Session = Depends(get_db)):
+async def find_matching_template(request: schemas.ChatRequest):
     """Find the best matching template for user query"""
     
-    result = await match_template(request.query, db)
+    result = await match_template(request.query)
     
     if not result:
         raise HTTPException(status_code=404, detail="No matching template found")
@@ -18,8 +19,23 @@ async def find_matching_template(request: schemas.ChatRequest, db: Session = Dep
     return result
 
 @router.post("/generate-questions")
-async def get_questions(template_id: str, answers: dict, db: Session = Depends(get_db)):
+async def get_questions(
+    template_id: str,
+    answers: dict,
+    batched: Optional[bool] = None
+):
     """Generate human-friendly questions for missing variables"""
     
-    questions = await generate_questions(template_id, answers, db)
+    questions = await generate_questions(template_id, answers, batched=batched)
     return {"questions": questions}
+
+@router.post("/prefill", response_model=schemas.PrefillResponse)
+async def prefill_answers(request: schemas.PrefillRequest, db: AsyncSession = Depends(get_async_db)):
+    """Pre-fill template variables from the user's query, with confidence scores"""
+    
+    answers = await prefill_template_answers(request.template_id, request.query, db)
+    
+    if answers is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    return {"template_id": request.template_id, "answers": answers}
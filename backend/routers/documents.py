@@ -1,8 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from services.document_processor import process_document
-from services.ai_service import extract_variables
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from services.document_processor import spool_upload, FileTooLargeError
+from services.embeddings import get_document_index
+from services.ai_service import VariableExtractionError
+from services.ingestion import ingest_document, find_extracted_document, ingestion_queue, job_to_dict
 import models
 import schemas
 
@@ -11,33 +17,148 @@ router = APIRouter()
 @router.post("/upload", response_model=schemas.DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    force_reextract: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Upload and process a legal document (DOCX/PDF)"""
+    """
+    Upload and process a legal document (DOCX/PDF)
+    Re-uploads of identical bytes return the stored result unless force_reextract is set
+    """
     
     # Validate file type
     if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are allowed")
     
-    # Process document
-    text_content = await process_document(file)
+    # Stream the upload (size-limited) and hash it
+    try:
+        upload, content_hash = await spool_upload(file)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    # Extract variables using Gemini
-    variables = await extract_variables(text_content)
+    # Same bytes seen before: skip parsing and extraction
+    if not force_reextract:
+        existing = await find_extracted_document(db, content_hash)
+        # End the read transaction so the connection isn't held through parsing and extraction
+        await db.commit()
+        
+        if existing:
+            upload.close()
+            return schemas.DocumentUploadResponse(
+                document_id=existing.id,
+                filename=existing.filename,
+                extracted_text=existing.raw_text[:500] + "...",  # Preview
+                variables=existing.variables,
+                cached=True
+            )
     
-    # Save document to database
-    document = models.Document(
-        filename=file.filename,
-        mime_type=file.content_type,
-        raw_text=text_content
-    )
-    db.add(document)
-    db.commit()
-    db.refresh(document)
+    with upload:
+        try:
+            document = await ingest_document(
+                db, file.filename, file.content_type, upload.path, content_hash, use_cache=not force_reextract
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except VariableExtractionError as e:
+            raise HTTPException(status_code=503, detail=f"{e}; please try again")
+        except BrokenProcessPool:
+            raise HTTPException(status_code=503, detail="Document parser restarted; please try again")
     
     return schemas.DocumentUploadResponse(
         document_id=document.id,
         filename=document.filename,
-        extracted_text=text_content[:500] + "...",  # Preview
-        variables=variables
+        extracted_text=document.raw_text[:500] + "...",  # Preview
+        variables=document.variables
+    )
+
+@router.post("/ingest", response_model=schemas.IngestionJobResponse, status_code=202)
+async def ingest_document_async(
+    file: UploadFile = File(...),
+    force_reextract: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Queue a legal document (DOCX/PDF) for background processing
+    Returns a job right away; poll /documents/jobs/{job_id} or subscribe to its events
+    """
+    
+    if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
+        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are allowed")
+    
+    try:
+        upload, content_hash = await spool_upload(file)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    if not force_reextract:
+        existing = await find_extracted_document(db, content_hash)
+        await db.commit()
+        if existing:
+            upload.close()
+            job = await ingestion_queue.record_done(db, file.filename, file.content_type, content_hash, existing.id)
+            return {**job_to_dict(job), "variables": existing.variables}
+    
+    job = await ingestion_queue.enqueue(
+        db, upload, file.filename, file.content_type, content_hash, force_reextract=force_reextract
+    )
+    return job_to_dict(job)
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestionJobResponse)
+async def get_ingestion_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Status of an ingestion job; includes the extracted variables once it succeeds"""
+    
+    job = await db.get(models.IngestionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    result = job_to_dict(job)
+    if job.document_id is not None:
+        result["variables"] = (await db.execute(
+            select(models.Document.variables).where(models.Document.id == job.document_id)
+        )).scalar()
+    return result
+
+@router.get("/jobs/{job_id}/events")
+async def ingestion_job_events(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Server-sent events with the job's status until it succeeds or fails"""
+    
+    if not await db.get(models.IngestionJob, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    await db.close()
+    
+    return StreamingResponse(
+        ingestion_queue.stream_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+@router.get("/{document_id}/similar", response_model=schemas.SimilarDocumentsResponse)
+async def similar_documents(
+    document_id: int,
+    k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Documents most similar to this one, by cosine similarity of their embeddings"""
+    
+    exists = (await db.execute(
+        select(models.Document.id).where(models.Document.id == document_id)
+    )).scalar()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    index = get_document_index()
+    await index.sync_async(db)
+    matches = await asyncio.to_thread(index.similar, document_id, k)
+    
+    filenames = dict((await db.execute(
+        select(models.Document.id, models.Document.filename).where(
+            models.Document.id.in_([doc_id for doc_id, _ in matches])
+        )
+    )).all()) if matches else {}
+    
+    return {
+        "document_id": document_id,
+        "results": [
+            {"document_id": doc_id, "filename": filenames.get(doc_id), "score": round(score, 4)}
+            for doc_id, score in matches
+        ]
+    }
@@ -1,40 +1,462 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from services.template_engine import generate_draft
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
+from typing import List, Optional
+from datetime import datetime
+import csv
+import io
+import json
+import tempfile
+import zipfile
+from database import get_async_db, SessionLocal
+from services.draft_writer import draft_writer, batching_enabled
+from services.template_engine import (
+    render_draft, compile_template, render_plan, get_template_validator, variable_to_dict
+)
+from services.streaming import request_chunks, spool_chunks, ZipStream
+from services.draft_sessions import draft_states, merge_answers, body_hash
 import models
 import schemas
 
 router = APIRouter()
 
 @router.post("/generate", response_model=schemas.DraftResponse)
-async def create_draft(request: schemas.GenerateDraftRequest, db: Session = Depends(get_db)):
-    """Generate a draft document from template and answers"""
+async def create_draft(
+    request: schemas.GenerateDraftRequest,
+    skip_validation: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate a draft document from template and answers
+    Given answers are checked with the template's validator first and invalid ones
+    return 422. Unanswered fields, required or not, are not an error: the draft is
+    rendered with them left open and listed in missing_variables.
+    """
     
     # Get template
-    template = db.query(models.Template).filter(
-        models.Template.template_id == request.template_id
-    ).first()
+    template = (await db.execute(
+        select(models.Template)
+        .options(selectinload(models.Template.variables))
+        .where(models.Template.template_id == request.template_id)
+    )).scalars().first()
     
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
+    # Validate answers before drafting
+    if not skip_validation:
+        validator = get_template_validator(
+            template.template_id, [variable_to_dict(v) for v in template.variables]
+        )
+        errors = validator.validate(request.answers, check_required=False)
+        if errors:
+            summary = "; ".join(errors.values())
+            return JSONResponse(
+                status_code=422,
+                content={"detail": f"Invalid answers: {summary}", "errors": errors}
+            )
+    
     # Generate draft
-    draft_md = generate_draft(template.body_md, request.answers)
+    rendered = render_draft(template.body_md, request.answers, template.template_id)
+    draft_md = rendered["draft_md"]
     
     # Save instance
-    instance = models.DraftInstance(
-        template_id=request.template_id,
-        user_query="",  # Store original query if available
-        answers_json=request.answers,
-        draft_md=draft_md
-    )
-    db.add(instance)
-    db.commit()
-    db.refresh(instance)
+    row = {
+        "template_id": request.template_id,
+        "user_query": "",  # Store original query if available
+        "answers_json": request.answers,
+        "draft_md": draft_md
+    }
+    if batching_enabled():
+        # Hand our read connection back first: the writer needs one from the same pool
+        await db.close()
+        # Shares a transaction with other drafts written at the same moment
+        instance_id = await draft_writer.submit(row)
+    else:
+        instance = models.DraftInstance(**row)
+        db.add(instance)
+        await db.commit()
+        instance_id = instance.id
     
     return schemas.DraftResponse(
         draft_md=draft_md,
         template_id=request.template_id,
-        instance_id=instance.id
+        instance_id=instance_id,
+        missing_variables=rendered["missing_variables"]
+    )
+
+def _get_batch_template(template_id: str):
+    """(body_md, variable dicts) of a template, or None"""
+    db = SessionLocal()
+    try:
+        template = db.query(models.Template).options(selectinload(models.Template.variables)).filter(
+            models.Template.template_id == template_id
+        ).first()
+        if template is None:
+            return None
+        return template.body_md, [variable_to_dict(v) for v in template.variables]
+    finally:
+        db.close()
+
+def _insert_instances(rows: list) -> list:
+    """Insert DraftInstance rows in one executemany and return their ids in order"""
+    if not rows:
+        return []
+    db = SessionLocal()
+    try:
+        ids = db.scalars(
+            insert(models.DraftInstance).returning(models.DraftInstance.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+def _iter_answer_rows(spooled, input_format: str):
+    """Yield (row_number, answers, user_query, error) from a spooled CSV or JSONL body"""
+    text = io.TextIOWrapper(spooled, encoding="utf-8-sig", newline="")
+    
+    if input_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            # Blank cells count as unanswered
+            answers = {k: v for k, v in row.items() if k and v not in (None, "")}
+            yield row_number, answers, "", None
+        return
+    
+    row_number = 0
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, "", f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "", "Each row must be a JSON object"
+        elif isinstance(row.get("answers"), dict):
+            yield row_number, row["answers"], str(row.get("user_query") or ""), None
+        else:
+            yield row_number, row, "", None
+
+def _render_batch(rows, template_id: str, plan, validator, batch_size: int, last_row: int) -> tuple:
+    """
+    Read, validate and render up to batch_size rows, then insert their drafts
+    Runs in a worker thread, so parsing and rendering stay off the event loop.
+    Returns (results, last_row, finished). Input that can't be read (bad UTF-8,
+    broken CSV) ends the batch with an error record for the row it stopped at.
+    """
+    results = []
+    finished = False
+    while len(results) < batch_size:
+        try:
+            row_number, answers, user_query, error = next(rows)
+        except StopIteration:
+            finished = True
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            results.append({"row": last_row + 1, "error": f"Could not read input after row {last_row}: {e}"})
+            finished = True
+            break
+        last_row = row_number
+        
+        if error:
+            results.append({"row": row_number, "error": error})
+            continue
+        if validator is not None:
+            errors = validator.validate(answers, check_required=False)
+            if errors:
+                summary = "; ".join(errors.values())
+                results.append({"row": row_number, "error": f"Invalid answers: {summary}", "errors": errors})
+                continue
+        
+        draft_md, missing = render_plan(plan, answers)
+        results.append({
+            "row": row_number,
+            "draft_md": draft_md,
+            "missing_variables": missing,
+            "_answers": answers,
+            "_user_query": user_query
+        })
+    
+    valid = [r for r in results if "draft_md" in r]
+    ids = _insert_instances([
+        {
+            "template_id": template_id,
+            "user_query": r.pop("_user_query"),
+            "answers_json": r.pop("_answers"),
+            "draft_md": r["draft_md"]
+        }
+        for r in valid
+    ])
+    for r, instance_id in zip(valid, ids):
+        r["instance_id"] = instance_id
+    return results, last_row, finished
+
+async def _render_batches(template_id: str, plan, validator, spooled, input_format: str, batch_size: int):
+    """
+    Render rows against one compiled plan and insert them batch by batch
+    Yields one result dict per input row; only a single batch is held in memory
+    """
+    with spooled:
+        rows = _iter_answer_rows(spooled, input_format)
+        last_row = 0
+        finished = False
+        while not finished:
+            results, last_row, finished = await run_in_threadpool(
+                _render_batch, rows, template_id, plan, validator, batch_size, last_row
+            )
+            for result in results:
+                yield result
+
+async def _ndjson_stream(results):
+    async for result in results:
+        yield json.dumps(result) + "\n"
+
+def _zip_entry(archive, stream, name: str, text: str) -> bytes:
+    """Compress one draft into the archive and return the bytes written so far"""
+    archive.writestr(name, text)
+    return stream.drain()
+
+def _zip_finish(archive, stream, manifest) -> bytes:
+    """Add the manifest, close the archive and return its remaining bytes"""
+    manifest.seek(0)
+    with manifest, archive.open("manifest.ndjson", mode="w") as entry:
+        for chunk in iter(lambda: manifest.read(64 * 1024), b""):
+            entry.write(chunk)
+    archive.close()
+    return stream.drain()
+
+async def _zip_stream(results):
+    """
+    Stream drafts as draft_<row>.md entries plus a manifest.ndjson of ids and errors
+    Compression runs in a worker thread, like rendering, so it doesn't stall the loop
+    """
+    stream = ZipStream()
+    manifest = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+b")
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED)
+    async for result in results:
+        draft_md = result.pop("draft_md", None)
+        if draft_md is not None:
+            result["file"] = f"draft_{result['row']:06d}.md"
+            yield await run_in_threadpool(_zip_entry, archive, stream, result["file"], draft_md)
+        manifest.write((json.dumps(result) + "\n").encode("utf-8"))
+    yield await run_in_threadpool(_zip_finish, archive, stream, manifest)
+
+@router.post("/batch")
+async def create_drafts_batch(
+    request: Request,
+    template_id: str,
+    output: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    input_format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    batch_size: int = Query(200, ge=1, le=5000),
+    skip_validation: bool = False
+):
+    """
+    Generate many drafts of one template from a CSV or JSONL body of answer sets
+    CSV: header row of variable keys, one answer set per row. JSONL: one object per
+    line, either the answers themselves or {"answers": {...}, "user_query": "..."}.
+    The template is parsed once, instances are bulk-inserted every batch_size rows,
+    and results stream back as NDJSON or a ZIP of Markdown files. Rows with invalid
+    answers are reported with their errors, as /drafts/generate would reject them.
+    """
+    
+    template = await run_in_threadpool(_get_batch_template, template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    template_body, variables = template
+    plan = compile_template(template_body, template_id)
+    validator = None if skip_validation else get_template_validator(template_id, variables)
+    
+    if input_format is None:
+        input_format = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    
+    # Spool the body first so the response can stream while rows are read from disk
+    spooled = await spool_chunks(request_chunks(request))
+    results = _render_batches(template_id, plan, validator, spooled, input_format, batch_size)
+    
+    if output == "zip":
+        return StreamingResponse(
+            _zip_stream(results),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{template_id}_drafts.zip"'}
+        )
+    return StreamingResponse(_ndjson_stream(results), media_type="application/x-ndjson")
+
+async def _load_template(db: AsyncSession, template_id: str):
+    return (await db.execute(
+        select(models.Template)
+        .options(selectinload(models.Template.variables))
+        .where(models.Template.template_id == template_id)
+    )).scalars().first()
+
+def _answer_errors(template, answers: dict, changed: dict) -> dict:
+    """Validation errors for the changed answers only; other fields may still be in progress"""
+    validator = get_template_validator(
+        template.template_id, [variable_to_dict(v) for v in template.variables]
+    )
+    changed_keys = {str(k).strip().lower() for k, v in changed.items() if v is not None}
+    return {
+        key: message
+        for key, message in validator.validate(answers).items()
+        if str(key).strip().lower() in changed_keys
+    }
+
+def _invalid_answers(errors: dict) -> JSONResponse:
+    summary = "; ".join(errors.values())
+    return JSONResponse(status_code=422, content={"detail": f"Invalid answers: {summary}", "errors": errors})
+
+@router.post("/sessions", response_model=schemas.DraftSessionResponse, status_code=201)
+async def create_draft_session(
+    request: schemas.DraftSessionCreate,
+    skip_validation: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Start an incremental draft
+    Later answer changes go to PATCH /drafts/sessions/{session_id}, which returns edits instead of the whole draft
+    """
+    
+    template = await _load_template(db, request.template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    if not skip_validation:
+        errors = _answer_errors(template, request.answers, request.answers)
+        if errors:
+            return _invalid_answers(errors)
+    
+    answers = merge_answers({}, request.answers)
+    digest = body_hash(template.body_md)
+    session = models.DraftSession(
+        template_id=template.template_id,
+        body_hash=digest,
+        answers_json=answers,
+        revision=1
     )
+    db.add(session)
+    await db.flush()
+    db.add(models.DraftRevision(session_id=session.id, revision=1, changes_json=request.answers))
+    await db.commit()
+    
+    state = draft_states.get(session.id, template.template_id, template.body_md, answers, 1, digest)
+    return {
+        "session_id": session.id,
+        "template_id": template.template_id,
+        "revision": 1,
+        "answers": answers,
+        "draft_md": state.render(),
+        "missing_variables": state.missing
+    }
+
+async def _load_session(db: AsyncSession, session_id: int):
+    """The session and its template (with variables) in one query"""
+    row = (await db.execute(
+        select(models.DraftSession, models.Template)
+        .outerjoin(models.Template, models.Template.template_id == models.DraftSession.template_id)
+        .options(joinedload(models.Template.variables))
+        .where(models.DraftSession.id == session_id)
+    )).unique().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Draft session not found")
+    session, template = row
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return session, template
+
+@router.get("/sessions/{session_id}", response_model=schemas.DraftSessionResponse)
+async def get_draft_session(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Current answers and full draft of a session"""
+    
+    session, template = await _load_session(db, session_id)
+    
+    state = draft_states.get(session.id, session.template_id, template.body_md, session.answers_json, session.revision)
+    return {
+        "session_id": session.id,
+        "template_id": session.template_id,
+        "revision": session.revision,
+        "answers": session.answers_json,
+        "draft_md": state.render(),
+        "missing_variables": state.missing
+    }
+
+@router.patch("/sessions/{session_id}", response_model=schemas.DraftSessionPatchResponse)
+async def update_draft_session(
+    session_id: int,
+    request: schemas.DraftSessionPatch,
+    skip_validation: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Change some answers and get back only what changed in the draft
+    edits are (start, end, text) replacements against the previous revision's draft,
+    in document order. A stale base_revision, or a concurrent update, returns 409.
+    """
+    
+    session, template = await _load_session(db, session_id)
+    if request.base_revision is not None and request.base_revision != session.revision:
+        raise HTTPException(status_code=409, detail=f"Draft is at revision {session.revision}")
+    
+    answers = merge_answers(session.answers_json or {}, request.answers)
+    if not skip_validation:
+        errors = _answer_errors(template, answers, request.answers)
+        if errors:
+            return _invalid_answers(errors)
+    
+    # Build (or reuse) the state for the revision being changed, before the update
+    digest = body_hash(template.body_md)
+    reset = digest != session.body_hash
+    state = draft_states.get(
+        session.id, template.template_id, template.body_md, session.answers_json or {}, session.revision, digest
+    )
+    
+    revision = session.revision + 1
+    updated = await db.execute(
+        update(models.DraftSession)
+        .where(models.DraftSession.id == session_id, models.DraftSession.revision == session.revision)
+        .values(answers_json=answers, revision=revision, body_hash=digest, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if updated.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Draft was changed by another request")
+    db.add(models.DraftRevision(session_id=session_id, revision=revision, changes_json=request.answers))
+    await db.commit()
+    
+    edits = state.apply(request.answers)
+    state.revision = revision
+    
+    response = {
+        "session_id": session_id,
+        "revision": revision,
+        "edits": [] if reset else edits,
+        "missing_variables": state.missing,
+        "draft_length": len(state),
+        "reset": reset
+    }
+    if reset:
+        response["draft_md"] = state.render()
+    return response
+
+@router.get("/sessions/{session_id}/revisions", response_model=List[schemas.DraftRevisionResponse])
+async def list_draft_revisions(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Answer deltas of a session, oldest first; replaying them gives the answers at any revision"""
+    
+    if not await db.get(models.DraftSession, session_id):
+        raise HTTPException(status_code=404, detail="Draft session not found")
+    
+    revisions = (await db.execute(
+        select(models.DraftRevision)
+        .where(models.DraftRevision.session_id == session_id)
+        .order_by(models.DraftRevision.revision)
+    )).scalars()
+    return [
+        {"revision": r.revision, "changes": r.changes_json, "created_at": r.created_at}
+        for r in revisions
+    ]
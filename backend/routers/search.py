@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_async_db
+from services.search_index import search, search_backend, SOURCES
+import schemas
+
+router = APIRouter()
+
+@router.get("/", response_model=schemas.SearchResponse)
+async def search_all(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Full-text search over documents, templates and drafts
+    types is a comma-separated subset of documents,templates,drafts (default: all).
+    Results are ranked best first with HTML-escaped, highlighted snippets; use offset to page.
+    Scores are relative to the best match of the same type (1.0), so types rank side by side.
+    """
+    
+    if not search_backend():
+        raise HTTPException(status_code=501, detail="Full-text search is not supported for this database")
+    
+    names = [t.strip() for t in types.split(",") if t.strip()] if types else list(SOURCES)
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+    
+    found = await search(db, q, names, limit=limit, offset=offset)
+    return {"query": q, "limit": limit, "offset": offset, **found}
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload, load_only
+from typing import List, Optional
+from pydantic import ValidationError
+from database import get_db, SessionLocal
+from services.template_index import template_index
+from services.llm_cache import get_llm_cache
+from services.streaming import request_chunks, iter_lines
+from services.template_engine import get_template_validator, invalidate_template_validator, variable_to_dict
 import models
 import schemas
 
@@ -42,13 +50,239 @@ def create_template(template: schemas.TemplateCreate, db: Session = Depends(get_
     db.commit()
     db.refresh(db_template)
     
+    # Make the new template matchable right away
+    catalog_changed([db_template])
+    
     return db_template
 
+def catalog_changed(templates: list):
+    """Refresh derived state after templates are created or updated"""
+    for t in templates:
+        template_index.add(t)
+        invalidate_template_validator(t.template_id)
+    response_cache = get_llm_cache()
+    if response_cache is not None:
+        response_cache.invalidate("match_template")
+
+def _variable_rows(variables: list) -> list:
+    return [
+        models.TemplateVariable(
+            key=var.key,
+            label=var.label,
+            description=var.description,
+            example=var.example,
+            required=var.required,
+            dtype=var.dtype,
+            regex=var.regex,
+            enum=var.enum
+        )
+        for var in variables
+    ]
+
+def _apply_template(db_template, template: schemas.TemplateCreate):
+    db_template.title = template.title
+    db_template.description = template.description
+    db_template.doc_type = template.doc_type
+    db_template.jurisdiction = template.jurisdiction
+    db_template.similarity_tags = template.similarity_tags
+    db_template.body_md = template.body_md
+    db_template.variables = _variable_rows(template.variables)
+
+def _write_template_batch(rows: list, upsert: bool) -> dict:
+    """
+    Write one batch of (line_number, TemplateCreate) rows in a single transaction
+    If the batch transaction fails, rows are retried one by one so a bad row
+    only fails itself
+    """
+    result = {"created": 0, "updated": 0, "errors": [], "templates": []}
+    # Keep attributes loaded after commit so indexing doesn't re-query every row
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        # Later rows for the same template_id win within a batch
+        latest = {}
+        for line_number, template in rows:
+            if template.template_id in latest:
+                result["errors"].append(schemas.BulkImportError(
+                    line=latest[template.template_id][0],
+                    template_id=template.template_id,
+                    error="Superseded by a later row with the same template_id"
+                ))
+            latest[template.template_id] = (line_number, template)
+        
+        existing = {
+            t.template_id: t
+            for t in db.query(models.Template)
+            .options(selectinload(models.Template.variables))
+            .filter(models.Template.template_id.in_(list(latest)))
+        }
+        
+        pending = []
+        for template_id, (line_number, template) in latest.items():
+            db_template = existing.get(template_id)
+            if db_template is not None and not upsert:
+                result["errors"].append(schemas.BulkImportError(
+                    line=line_number, template_id=template_id, error="Template already exists"
+                ))
+                continue
+            if db_template is None:
+                db_template = models.Template(template_id=template_id)
+                db.add(db_template)
+            _apply_template(db_template, template)
+            pending.append((line_number, template, db_template, template_id in existing))
+        
+        try:
+            db.commit()
+            committed = pending
+        except Exception:
+            db.rollback()
+            committed = []
+            for line_number, template, _, was_existing in pending:
+                try:
+                    db_template = db.query(models.Template).filter(
+                        models.Template.template_id == template.template_id
+                    ).first()
+                    if db_template is None:
+                        db_template = models.Template(template_id=template.template_id)
+                        db.add(db_template)
+                    elif not upsert:
+                        raise ValueError("Template already exists")
+                    _apply_template(db_template, template)
+                    db.commit()
+                    committed.append((line_number, template, db_template, was_existing))
+                except Exception as e:
+                    db.rollback()
+                    result["errors"].append(schemas.BulkImportError(
+                        line=line_number, template_id=template.template_id, error=str(e)
+                    ))
+        
+        for _, _, db_template, was_existing in committed:
+            result["updated" if was_existing else "created"] += 1
+            result["templates"].append(db_template)
+        catalog_changed(result["templates"])
+        return result
+    finally:
+        db.close()
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+@router.post("/bulk-import", response_model=schemas.BulkImportResponse)
+async def bulk_import_templates(
+    request: Request,
+    batch_size: int = Query(500, ge=1, le=5000),
+    upsert: bool = False
+):
+    """
+    Import templates from NDJSON/JSONL, one TemplateCreate object per line
+    Send the lines as the request body or as a multipart file upload. Rows are validated
+    as they stream in and written in transactions of batch_size; invalid rows are
+    reported by line number without aborting the import. With upsert=true, existing
+    template_ids are updated (variables replaced) instead of rejected.
+    """
+    created = updated = 0
+    errors = []
+    batch = []
+    
+    async def flush():
+        nonlocal created, updated
+        result = await run_in_threadpool(_write_template_batch, batch, upsert)
+        created += result["created"]
+        updated += result["updated"]
+        errors.extend(result["errors"])
+        batch.clear()
+    
+    async for line_number, line, error in iter_lines(request_chunks(request)):
+        if error:
+            errors.append(schemas.BulkImportError(line=line_number, error=error))
+            continue
+        try:
+            batch.append((line_number, schemas.TemplateCreate.model_validate_json(line)))
+        except ValidationError as e:
+            errors.append(schemas.BulkImportError(line=line_number, error=_validation_message(e)))
+            continue
+        if len(batch) >= batch_size:
+            await flush()
+    
+    if batch:
+        await flush()
+    
+    errors.sort(key=lambda e: e.line)
+    return schemas.BulkImportResponse(
+        created=created,
+        updated=updated,
+        failed=len(errors),
+        errors=errors
+    )
+
+TEMPLATE_COLUMNS = [
+    "id", "template_id", "title", "description", "doc_type",
+    "jurisdiction", "similarity_tags", "body_md", "created_at"
+]
+
 @router.get("/", response_model=List[schemas.Template])
-def get_templates(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all templates"""
-    templates = db.query(models.Template).offset(skip).limit(limit).all()
-    return templates
+def get_templates(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    after_id: Optional[int] = None,
+    include_variables: bool = True,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get all templates, ordered by id
+    Pass after_id (from the X-Next-Cursor header) for keyset pagination; skip still works but
+    gets slower the deeper you page. fields=id,title,... or include_variables=false returns
+    only the requested columns.
+    """
+    
+    # Resolve the projection
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(requested) - set(TEMPLATE_COLUMNS) - {"variables"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    else:
+        requested = TEMPLATE_COLUMNS + ["variables"]
+    if not include_variables:
+        requested = [f for f in requested if f != "variables"]
+    with_variables = "variables" in requested
+    columns = [f for f in requested if f != "variables"]
+    
+    query = db.query(models.Template).order_by(models.Template.id)
+    if with_variables:
+        # One batched query for all variables instead of one per template
+        query = query.options(selectinload(models.Template.variables))
+    if columns != TEMPLATE_COLUMNS:
+        query = query.options(load_only(
+            *(getattr(models.Template, c) for c in set(columns) | {"id"})
+        ))
+    
+    if after_id is not None:
+        query = query.filter(models.Template.id > after_id)
+    else:
+        query = query.offset(skip)
+    templates = query.limit(limit).all()
+    
+    if len(templates) == limit:
+        response.headers["X-Next-Cursor"] = str(templates[-1].id)
+    
+    if requested == TEMPLATE_COLUMNS + ["variables"]:
+        return templates
+    
+    # Projected rows don't fit schemas.Template, so serialize them directly
+    rows = []
+    for t in templates:
+        row = {c: getattr(t, c) for c in columns}
+        if with_variables:
+            row["variables"] = [
+                schemas.TemplateVariable.model_validate(v).model_dump() for v in t.variables
+            ]
+        rows.append(row)
+    return JSONResponse(content=jsonable_encoder(rows), headers=dict(response.headers))
 
 @router.get("/{template_id}", response_model=schemas.Template)
 def get_template(template_id: str, db: Session = Depends(get_db)):
@@ -57,3 +291,38 @@ def get_template(template_id: str, db: Session = Depends(get_db)):
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     return template
+
+@router.post("/{template_id}/validate", response_model=schemas.ValidateAnswersResponse)
+def validate_template_answers(
+    template_id: str,
+    request: schemas.ValidateAnswersRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Validate one answer set (answers) or many (answer_sets) against a template's variables
+    Uses the template's compiled validator, so large batches only pay per-value checks
+    """
+    template = db.query(models.Template).filter(models.Template.template_id == template_id).first()
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    answer_sets = list(request.answer_sets or [])
+    if request.answers is not None:
+        answer_sets.insert(0, request.answers)
+    if not answer_sets:
+        raise HTTPException(status_code=400, detail="Provide answers or answer_sets")
+    
+    validator = get_template_validator(
+        template_id, [variable_to_dict(v) for v in template.variables]
+    )
+    results = [
+        schemas.ValidationResult(index=i, valid=not errors, errors=errors)
+        for i, errors in enumerate(validator.validate_many(answer_sets))
+    ]
+    invalid_count = sum(1 for r in results if not r.valid)
+    
+    return schemas.ValidateAnswersResponse(
+        valid=invalid_count == 0,
+        invalid_count=invalid_count,
+        results=results
+    )
@@ -47,6 +47,28 @@ class DocumentUploadResponse(BaseModel):
     filename: str
     extracted_text: str
     variables: List[TemplateVariableCreate]
+    cached: bool = False
+
+class IngestionJobResponse(BaseModel):
+    job_id: int
+    status: str
+    filename: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    document_id: Optional[int] = None
+    variables: Optional[List[TemplateVariableCreate]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class SimilarDocument(BaseModel):
+    document_id: int
+    filename: Optional[str] = None
+    score: float
+
+class SimilarDocumentsResponse(BaseModel):
+    document_id: int
+    results: List[SimilarDocument]
 
 class TemplateMatchResponse(BaseModel):
     template: Template
@@ -56,6 +78,19 @@ class TemplateMatchResponse(BaseModel):
 class ChatRequest(BaseModel):
     query: str
 
+class PrefillRequest(BaseModel):
+    template_id: str
+    query: str
+
+class PrefilledValue(BaseModel):
+    value: Any
+    confidence: Optional[float] = None
+    source: str
+
+class PrefillResponse(BaseModel):
+    template_id: str
+    answers: Dict[str, PrefilledValue]
+
 class GenerateDraftRequest(BaseModel):
     template_id: str
     answers: Dict[str, Any]
@@ -64,3 +99,78 @@ class DraftResponse(BaseModel):
     draft_md: str
     template_id: str
     instance_id: int
+    missing_variables: List[str] = []
+
+class DraftSessionCreate(BaseModel):
+    template_id: str
+    answers: Dict[str, Any] = {}
+
+class DraftSessionPatch(BaseModel):
+    answers: Dict[str, Any]  # Changed answers only; null clears one
+    base_revision: Optional[int] = None
+
+class DraftEdit(BaseModel):
+    start: int
+    end: int
+    text: str
+
+class DraftSessionResponse(BaseModel):
+    session_id: int
+    template_id: str
+    revision: int
+    answers: Dict[str, Any]
+    draft_md: str
+    missing_variables: List[str] = []
+
+class DraftSessionPatchResponse(BaseModel):
+    session_id: int
+    revision: int
+    edits: List[DraftEdit]
+    missing_variables: List[str] = []
+    draft_length: int
+    reset: bool = False  # The template changed: draft_md holds the full draft instead of edits
+    draft_md: Optional[str] = None
+
+class DraftRevisionResponse(BaseModel):
+    revision: int
+    changes: Dict[str, Any]
+    created_at: datetime
+
+class BulkImportError(BaseModel):
+    line: int
+    template_id: Optional[str] = None
+    error: str
+
+class BulkImportResponse(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    errors: List[BulkImportError]
+
+class ValidateAnswersRequest(BaseModel):
+    answers: Optional[Dict[str, Any]] = None
+    answer_sets: Optional[List[Dict[str, Any]]] = None
+
+class ValidationResult(BaseModel):
+    index: int
+    valid: bool
+    errors: Dict[str, str]
+
+class ValidateAnswersResponse(BaseModel):
+    valid: bool
+    invalid_count: int
+    results: List[ValidationResult]
+
+class SearchResult(BaseModel):
+    type: str
+    id: int
+    title: Optional[str] = None
+    snippet: str
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    limit: int
+    offset: int
+    has_more: bool
@@ -1,20 +1,51 @@
-import google.generativeai as genai
 from config import settings
 import json
 import re
-from sqlalchemy.orm import Session
+import hashlib
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import asyncio
 import models
+from services.llm_client import get_llm_client
+from services import metrics
+from services.template_index import template_index, tokenize
+from services.document_processor import chunk_text
+from services.singleflight import SingleFlight
+from database import AsyncSessionLocal
+from services.rule_extractor import extract_from_query
+from services.template_engine import variable_to_dict
 
-# Configure Gemini
-genai.configure(api_key=settings.gemini_api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
+JSON_OBJECT_PATTERN = re.compile(r'\{[\s\S]*\}')
 
-async def extract_variables(text: str, existing_variables: list = None) -> list:
+def parse_json_response(response_text: str, call_site: str):
+    """Pull the JSON object out of an LLM response (handles markdown code blocks); None if absent"""
+    with metrics.llm_parse_duration.time(call_site):
+        json_match = JSON_OBJECT_PATTERN.search(response_text)
+        if not json_match:
+            return None
+        return json.loads(json_match.group())
+
+class VariableExtractionError(Exception):
     """
-    Extract variables from legal document text using Gemini
-    Pro tip: For long documents, pass existing_variables from previous chunks
-    to maintain consistency and avoid duplicates
+    Raised when variables could not be extracted from every chunk of a document
+    Partial or placeholder results are never stored as a document's variables
     """
+    pass
+
+FALLBACK_VARIABLES = [
+    {
+        "key": "party_name",
+        "label": "Party Name",
+        "description": "Name of the party",
+        "example": "John Doe",
+        "required": True,
+        "dtype": "string"
+    }
+]
+
+async def _extract_chunk_variables(text: str, existing_variables: list = None, use_cache: bool = True) -> list:
+    """Run the extraction prompt on one piece of text; raises on LLM errors"""
     
     existing_vars_context = ""
     if existing_variables:
@@ -31,7 +62,7 @@ CRITICAL RULES:
 6. Favor domain-generic names over document-specific names{existing_vars_context}
 
 Document text:
-{text[:3000]}
+{text}
 
 Return JSON in this EXACT format:
 {{
@@ -48,41 +79,161 @@ Return JSON in this EXACT format:
   "similarity_tags": ["insurance", "notice", "india"]
 }}"""
 
-    try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Extract JSON from response (handle markdown code blocks)
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        if json_match:
-            result = json.loads(json_match.group())
-            return result.get("variables", [])
-        
+    response_text = (await get_llm_client().generate(prompt, task="extract_variables", cache=use_cache)).strip()
+    
+    # Extract JSON from response (handle markdown code blocks)
+    result = parse_json_response(response_text, "extract_variables")
+    if isinstance(result, dict):
+        return clean_variables(result.get("variables"))
+    
+    return []
+
+def clean_variables(variables) -> list:
+    """Keep only well-formed variables from an LLM response: dicts with a non-empty string key"""
+    if not isinstance(variables, list):
         return []
+    return [
+        variable for variable in variables
+        if isinstance(variable, dict) and isinstance(variable.get("key"), str) and variable["key"].strip()
+    ]
+
+async def extract_variables(text: str, existing_variables: list = None) -> list:
+    """
+    Extract variables from legal document text using Gemini
+    Pro tip: For long documents, pass existing_variables from previous chunks
+    to maintain consistency and avoid duplicates
+    """
+    try:
+        return await _extract_chunk_variables(text[:3000], existing_variables)
     except Exception as e:
         print(f"Error extracting variables: {e}")
         # Fallback: return basic variables
-        return [
-            {
-                "key": "party_name",
-                "label": "Party Name",
-                "description": "Name of the party",
-                "example": "John Doe",
-                "required": True,
-                "dtype": "string"
-            }
-        ]
+        return [dict(v) for v in FALLBACK_VARIABLES]
+
+def merge_variables(merged: dict, variables: list):
+    """
+    Merge newly found variables into merged (key -> variable), deduplicating by key
+    The first definition wins; later chunks only fill gaps and can mark a field required
+    """
+    for variable in variables:
+        key = str(variable.get("key") or "").strip().lower()
+        if not key:
+            continue
+        
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = {**variable, "key": key}
+            continue
+        
+        for field, value in variable.items():
+            if value and not existing.get(field):
+                existing[field] = value
+        if variable.get("required"):
+            existing["required"] = True
 
-async def match_template(query: str, db: Session):
+async def extract_variables_from_document(
+    text: str, chunk_size: int = None, parallelism: int = None, use_cache: bool = True
+) -> list:
+    """
+    Extract variables from the whole document, not just the first page
+    Chunks run concurrently (bounded by parallelism), so wall-clock time tracks the
+    slowest chunk. Each chunk is shown the keys discovered so far, and results are
+    merged in document order.
+    Raises VariableExtractionError if any chunk fails, rather than returning a
+    partial list that would be stored as the document's variables.
+    use_cache=False asks the LLM again instead of reusing cached responses.
+    """
+    chunks = chunk_text(text, chunk_size or settings.extraction_chunk_size)
+    if not chunks:
+        return []
+    
+    semaphore = asyncio.Semaphore(parallelism or settings.extraction_parallelism)
+    discovered = {}
+    
+    async def extract_chunk(chunk: str):
+        async with semaphore:
+            try:
+                found = await _extract_chunk_variables(chunk, list(discovered.values()), use_cache)
+                merge_variables(discovered, found)
+            except Exception as e:
+                print(f"Error extracting variables from chunk: {e}")
+                return None
+        return found
+    
+    results = await asyncio.gather(*(extract_chunk(chunk) for chunk in chunks))
+    
+    failed = sum(result is None for result in results)
+    if failed:
+        raise VariableExtractionError(f"Variable extraction failed for {failed} of {len(chunks)} chunks")
+    
+    merged = {}
+    for found in results:
+        merge_variables(merged, found)
+    return list(merged.values())
+
+
+# In-flight deduplication for the chat endpoints
+_match_flight = SingleFlight("match_template")
+_questions_flight = SingleFlight("generate_questions")
+
+def _templates_with_variables():
+    return select(models.Template).options(selectinload(models.Template.variables))
+
+async def _in_new_session(fn, *args):
+    # Coalesced work outlives the request that started it, so it gets its own session
+    async with AsyncSessionLocal() as db:
+        return await fn(*args, db)
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+async def match_template(query: str):
     """
     Find the best matching template for user query using Gemini
+    Concurrent calls with the same normalized query against the same catalog
+    version share one computation, run in its own session so callers hold no
+    connection while they wait
+    """
+    
+    key = (normalize_query(query), template_index.version)
+    return await _match_flight.do(key, lambda: _in_new_session(_match_template, query))
+
+async def _match_template(query: str, db: AsyncSession):
+    """
     Uses classification + confidence scoring
+    Candidates are prefiltered with the local BM25 index; only the top-k reach
+    the LLM, and a clear lexical winner skips the LLM entirely
     """
     
-    # Get all templates
-    templates = db.query(models.Template).all()
+    await template_index.sync_async(db)
+    if not len(template_index):
+        return None
+    
+    candidates = template_index.search(query, settings.match_top_k)
     
-    if not templates:
+    # Lexical shortcut: the query is fully covered by one template that clearly beats the rest
+    confidence = template_index.lexical_confidence(query, candidates)
+    if len(tokenize(query)) >= 2 and confidence >= settings.match_lexical_confidence:
+        template = (await db.execute(
+            _templates_with_variables().where(models.Template.template_id == candidates[0][0])
+        )).scalars().first()
+        if template:
+            return {
+                "template": template,
+                "confidence_score": confidence,
+                "reasoning": "Query terms match this template's title, type, jurisdiction and tags."
+            }
+    
+    candidate_ids = [template_id for template_id, _ in candidates]
+    if candidate_ids:
+        templates = list((await db.execute(
+            _templates_with_variables().where(models.Template.template_id.in_(candidate_ids))
+        )).scalars())
+        templates.sort(key=lambda t: candidate_ids.index(t.template_id))
+    elif len(template_index) <= settings.match_top_k:
+        # No lexical overlap, but the catalog is small enough to let the LLM judge it
+        templates = list((await db.execute(_templates_with_variables())).scalars())
+    else:
         return None
     
     # Build template context
@@ -102,7 +253,7 @@ async def match_template(query: str, db: Session):
 User request: "{query}"
 
 Available templates:
-{json.dumps(template_context, indent=2)}
+{json.dumps(template_context, separators=(",", ":"))}
 
 TASK:
 1. Analyze the user's intent (document type, jurisdiction, subject matter)
@@ -125,21 +276,19 @@ OR if no good match:
 }}"""
 
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text = (await get_llm_client().generate(prompt, task="match_template")).strip()
         
         # Extract JSON
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        if json_match:
-            result = json.loads(json_match.group())
-            
+        result = parse_json_response(response_text, "match_template")
+        if result:
             if result.get("template_id") == "none" or result.get("confidence", 0) < 0.6:
                 return None
             
-            # Get the template
-            template = db.query(models.Template).filter(
-                models.Template.template_id == result["template_id"]
-            ).first()
+            # Only accept templates that were offered as candidates
+            template = next(
+                (t for t in templates if t.template_id == result["template_id"]),
+                None
+            )
             
             if template:
                 return {
@@ -153,28 +302,18 @@ OR if no good match:
         print(f"Error matching template: {e}")
         return None
 
-async def generate_questions(template_id: str, existing_answers: dict, db: Session) -> list:
-    """
-    Generate human-friendly questions for missing template variables
-    Transforms technical variable names into clear, polite questions
-    """
-    
-    # Get template variables
-    template = db.query(models.Template).filter(
-        models.Template.template_id == template_id
-    ).first()
-    
-    if not template:
-        return []
-    
-    questions = []
-    for variable in template.variables:
-        # Skip if already answered
-        if variable.key in existing_answers:
-            continue
-        
-        # Generate human-friendly question
-        prompt = f"""Transform this variable into a clear, polite question for a user filling out a legal document.
+def question_cache_key(variable) -> str:
+    """Stable key for a variable's question, based on the fields the prompt uses"""
+    payload = json.dumps(
+        [variable.label, variable.description, variable.dtype, variable.example]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _fallback_question(variable) -> str:
+    return f"Please provide {variable.label.lower()}"
+
+def _single_question_prompt(variable) -> str:
+    return f"""Transform this variable into a clear, polite question for a user filling out a legal document.
 
 Variable details:
 - Key: {variable.key}
@@ -195,36 +334,158 @@ GOOD: "What is the insurance policy number exactly as it appears on your policy
 
 Return ONLY the question text, nothing else."""
 
-        try:
-            response = model.generate_content(prompt)
-            question_text = response.text.strip().strip('"')
-            
-            questions.append({
-                "key": variable.key,
-                "question": question_text,
-                "example": variable.example,
-                "required": variable.required,
-                "dtype": variable.dtype
-            })
-        except Exception as e:
-            # Fallback to basic question
-            questions.append({
-                "key": variable.key,
-                "question": f"Please provide {variable.label.lower()}",
-                "example": variable.example,
-                "required": variable.required,
-                "dtype": variable.dtype
-            })
+def _batch_question_prompt(variables: list) -> str:
+    variable_details = [
+        {
+            "key": v.key,
+            "label": v.label,
+            "description": v.description,
+            "example": v.example,
+            "required": v.required,
+            "type": v.dtype
+        }
+        for v in variables
+    ]
+
+    return f"""Transform each of these variables into a clear, polite question for a user filling out a legal document.
+
+Variables:
+{json.dumps(variable_details, indent=2)}
+
+Rules:
+1. Ask clearly and professionally
+2. Include format hints (e.g., "in DD/MM/YYYY format")
+3. Be specific and unambiguous
+4. Don't use the technical variable name
+5. Write exactly one question per variable key
+
+BAD: "policy_number?"
+GOOD: "What is the insurance policy number exactly as it appears on your policy schedule?"
+
+Return ONLY valid JSON in this format:
+{{
+  "questions": {{
+    "policy_number": "What is the insurance policy number exactly as it appears on your policy schedule?"
+  }}
+}}"""
+
+async def _generate_question(variable):
+    try:
+        response_text = await get_llm_client().generate(
+            _single_question_prompt(variable), task="generate_questions"
+        )
+        return response_text.strip().strip('"')
+    except Exception as e:
+        print(f"Error generating question for {variable.key}: {e}")
+        return None
+
+async def _generate_questions_one_by_one(variables: list) -> dict:
+    """One LLM call per variable, run concurrently; returns key -> question for the ones that succeeded"""
+    results = await asyncio.gather(*(_generate_question(v) for v in variables))
+    return {v.key: q for v, q in zip(variables, results) if q}
+
+async def _generate_questions_batched(variables: list) -> dict:
+    """One LLM call for all variables; returns key -> question for the ones answered"""
+    try:
+        response_text = (await get_llm_client().generate(
+            _batch_question_prompt(variables), task="generate_questions_batch"
+        )).strip()
+
+        result = parse_json_response(response_text, "generate_questions_batch")
+        if not result:
+            return {}
+
+        result = result.get("questions", {})
+        wanted = {v.key for v in variables}
+        return {
+            k: str(q).strip().strip('"')
+            for k, q in result.items()
+            if k in wanted and q
+        }
+    except Exception as e:
+        print(f"Error generating questions: {e}")
+        return {}
+
+async def generate_questions(template_id: str, existing_answers: dict, batched: bool = None) -> list:
+    """
+    Generate human-friendly questions for missing template variables
+    Concurrent calls for the same template and set of answered keys share one computation
+    """
     
-    return questions
+    if batched is None:
+        batched = settings.question_batch_mode
+    
+    answered = tuple(sorted(str(k) for k in existing_answers))
+    key = (template_id, answered, batched)
+    return await _questions_flight.do(
+        key, lambda: _in_new_session(_generate_questions, template_id, set(answered), batched)
+    )
 
-async def prefill_variables_from_query(query: str, variables: list) -> dict:
+async def _generate_questions(template_id: str, existing_answers: set, batched: bool, db: AsyncSession) -> list:
     """
-    Use Gemini to extract variable values from the user's original query
-    This pre-fills what we can infer before asking questions
+    Transforms technical variable names into clear, polite questions
+    Questions are stored per variable, so repeat visits skip the LLM
     """
     
-    variable_keys = [v["key"] for v in variables]
+    # Get template variables
+    template = (await db.execute(
+        _templates_with_variables().where(models.Template.template_id == template_id)
+    )).scalars().first()
+    
+    if not template:
+        return []
+    
+    # Skip variables that are already answered
+    missing = [v for v in template.variables if v.key not in existing_answers]
+    if not missing:
+        return []
+    
+    # Reuse questions generated on earlier visits
+    cache_keys = {v.key: question_cache_key(v) for v in missing}
+    stored = {
+        row.cache_key: row.question
+        for row in (await db.execute(
+            select(models.VariableQuestion).where(
+                models.VariableQuestion.cache_key.in_(set(cache_keys.values()))
+            )
+        )).scalars()
+    }
+    
+    to_generate = [v for v in missing if cache_keys[v.key] not in stored]
+    if to_generate:
+        if batched:
+            generated = await _generate_questions_batched(to_generate)
+        else:
+            generated = await _generate_questions_one_by_one(to_generate)
+        
+        # Persist new questions; fallbacks are not stored so they get retried
+        for variable in to_generate:
+            question_text = generated.get(variable.key)
+            cache_key = cache_keys[variable.key]
+            if question_text and cache_key not in stored:
+                stored[cache_key] = question_text
+                db.add(models.VariableQuestion(cache_key=cache_key, question=question_text))
+        try:
+            await db.commit()
+        except Exception as e:
+            # A concurrent request stored the same question first
+            await db.rollback()
+            print(f"Error storing questions: {e}")
+    
+    questions = []
+    for variable in missing:
+        questions.append({
+            "key": variable.key,
+            "question": stored.get(cache_keys[variable.key]) or _fallback_question(variable),
+            "example": variable.example,
+            "required": variable.required,
+            "dtype": variable.dtype
+        })
+    
+    return questions
+
+async def _prefill_with_llm(query: str, variables: list) -> dict:
+    """Ask the LLM for the variables the rule-based pass could not fill"""
     
     prompt = f"""Extract any information from the user query that matches these variables.
 
@@ -243,16 +504,63 @@ Return JSON with extracted values (use null for unknown):
 Return ONLY the JSON object."""
 
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text = (await get_llm_client().generate(prompt, task="prefill_variables")).strip()
         
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        if json_match:
-            result = json.loads(json_match.group())
-            # Filter out null values
-            return {k: v for k, v in result.items() if v is not None}
+        result = parse_json_response(response_text, "prefill_variables")
+        if result:
+            # Filter out null values and keys we did not ask for
+            wanted = {v["key"] for v in variables}
+            return {k: v for k, v in result.items() if v is not None and k in wanted}
         
         return {}
     except Exception as e:
         print(f"Error prefilling variables: {e}")
         return {}
+
+async def prefill_variables_with_confidence(query: str, variables: list) -> dict:
+    """
+    Pre-fill variables from the user's original query
+    Dates, amounts, emails, regex and enum values are extracted by rules first;
+    the LLM only sees the variables left over, and is skipped when none are.
+    Returns key -> {"value", "confidence", "source"}; LLM values have no confidence score.
+    """
+    
+    filled = {
+        key: {**found, "source": "rule"}
+        for key, found in extract_from_query(query, variables).items()
+        if found["confidence"] >= settings.prefill_rule_min_confidence
+    }
+    
+    remaining = [v for v in variables if v["key"] not in filled]
+    metrics.prefill_variables.inc("rule", amount=len(filled))
+    if not remaining:
+        return filled
+    
+    llm_values = await _prefill_with_llm(query, remaining)
+    metrics.prefill_variables.inc("llm", amount=len(llm_values))
+    for key, value in llm_values.items():
+        filled[key] = {"value": value, "confidence": None, "source": "llm"}
+    return filled
+
+async def prefill_variables_from_query(query: str, variables: list) -> dict:
+    """
+    Extract variable values from the user's original query
+    This pre-fills what we can infer before asking questions
+    """
+    
+    filled = await prefill_variables_with_confidence(query, variables)
+    return {k: v["value"] for k, v in filled.items()}
+
+async def prefill_template_answers(template_id: str, query: str, db: AsyncSession):
+    """Pre-fill a template's variables from a query; None if the template does not exist"""
+    
+    template = (await db.execute(
+        _templates_with_variables().where(models.Template.template_id == template_id)
+    )).scalars().first()
+    
+    if not template:
+        return None
+    
+    return await prefill_variables_with_confidence(
+        query, [variable_to_dict(v) for v in template.variables]
+    )
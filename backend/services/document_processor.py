@@ -1,40 +1,140 @@
 from fastapi import UploadFile
-import PyPDF2
-from docx import Document as DocxDocument
-import io
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import os
+import tempfile
+from config import settings
+
+PDF_MIME_TYPE = "application/pdf"
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+UPLOAD_READ_SIZE = 1024 * 1024
+
+class FileTooLargeError(ValueError):
+    """Raised when an upload exceeds settings.max_file_size_mb"""
+    pass
+
+# Parsing is CPU-bound, so it runs in worker processes instead of on the event loop
+_parse_pool = None
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=settings.parse_workers)
+    return _parse_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """A worker died (e.g. killed for memory); the next parse gets a fresh pool"""
+    global _parse_pool
+    if _parse_pool is pool:
+        _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+class TempUpload:
+    """
+    An upload spooled to a temp file on disk
+    Parsers read it by path, so its bytes are never held in the API process.
+    Closing it (or leaving its with block) deletes the file unless it was moved.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+async def spool_upload(file: UploadFile, max_bytes: int = None):
+    """
+    Stream an upload into a temp file, enforcing the size limit as bytes arrive
+    Returns (TempUpload, sha256_hexdigest)
+    """
+    if max_bytes is None:
+        max_bytes = settings.max_file_size_mb * 1024 * 1024
+
+    fd, path = tempfile.mkstemp(prefix="upload_")
+    upload = TempUpload(path, 0)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_READ_SIZE)
+                if not chunk:
+                    break
+                upload.size += len(chunk)
+                if upload.size > max_bytes:
+                    raise FileTooLargeError(f"File exceeds the {settings.max_file_size_mb} MB limit")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        upload.close()
+        raise
+
+    return upload, digest.hexdigest()
+
+async def extract_text(path: str, content_type: str) -> str:
+    """Parse a document file in the process pool; workers read it from disk themselves"""
+    if content_type == PDF_MIME_TYPE:
+        parser = extract_text_from_pdf
+    elif content_type == DOCX_MIME_TYPE:
+        parser = extract_text_from_docx
+    else:
+        raise ValueError("Unsupported file type")
+
+    loop = asyncio.get_running_loop()
+    pool = get_parse_pool()
+    try:
+        return await loop.run_in_executor(pool, parser, path)
+    except BrokenProcessPool:
+        _discard_broken_pool(pool)
+        raise
 
 async def process_document(file: UploadFile) -> str:
     """
     Extract text from DOCX or PDF files
     """
-    content = await file.read()
-    
-    if file.content_type == "application/pdf":
-        return extract_text_from_pdf(content)
-    elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        return extract_text_from_docx(content)
-    else:
+    if file.content_type not in (PDF_MIME_TYPE, DOCX_MIME_TYPE):
         raise ValueError("Unsupported file type")
 
-def extract_text_from_pdf(content: bytes) -> str:
-    """Extract text from PDF"""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-    text = ""
-    
+    upload, _ = await spool_upload(file)
+    with upload:
+        return await extract_text(upload.path, file.content_type)
+
+def extract_text_from_pdf(path: str) -> str:
+    """Extract text from PDF, page by page"""
+    # Parser libraries load in the worker processes, not at API import
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(path)
+    pages = []
+
     for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    
-    return text.strip()
+        pages.append(page.extract_text() or "")
 
-def extract_text_from_docx(content: bytes) -> str:
+    return "\n".join(pages).strip()
+
+def extract_text_from_docx(path: str) -> str:
     """Extract text from DOCX"""
-    doc = DocxDocument(io.BytesIO(content))
-    text = ""
-    
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    
-    return text.strip()
+    from docx import Document as DocxDocument
+    doc = DocxDocument(path)
+
+    return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
 
 def chunk_text(text: str, chunk_size: int = 3000) -> list[str]:
     """
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from config import settings
+from services.template_engine import compile_template, DraftRenderState
+
+def body_hash(template_body: str) -> str:
+    return hashlib.sha256(template_body.encode("utf-8")).hexdigest()
+
+def merge_answers(answers: dict, changes: dict) -> dict:
+    """
+    Answers after applying changes; a None value removes the answer
+    Keys are matched case-insensitively, as when rendering
+    """
+    merged = dict(answers)
+    for key, value in changes.items():
+        lookup_key = str(key).strip().lower()
+        for existing in [k for k in merged if str(k).strip().lower() == lookup_key]:
+            del merged[existing]
+        if value is not None:
+            merged[key] = value
+    return merged
+
+class DraftStateCache:
+    """
+    LRU of render states for active draft sessions
+    An entry is only used when it is at the session's current revision and
+    template body; otherwise it is rebuilt from the stored answers, so any
+    worker can serve any session.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._states = OrderedDict()  # session id -> (body hash, DraftRenderState)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: int, template_id: str, template_body: str, answers: dict, revision: int,
+            digest: str = None) -> DraftRenderState:
+        """The state at this revision; pass digest (see body_hash) if the caller already has it"""
+        digest = digest or body_hash(template_body)
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is not None and entry[0] == digest and entry[1].revision == revision:
+                self._states.move_to_end(session_id)
+                return entry[1]
+
+        state = DraftRenderState(compile_template(template_body, template_id, digest), answers, revision)
+        self.put(session_id, digest, state)
+        return state
+
+    def put(self, session_id: int, digest: str, state: DraftRenderState):
+        with self._lock:
+            self._states[session_id] = (digest, state)
+            self._states.move_to_end(session_id)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+draft_states = DraftStateCache(settings.draft_session_cache_size)
+
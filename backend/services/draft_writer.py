@@ -0,0 +1,102 @@
+import asyncio
+from sqlalchemy import insert
+from config import settings
+from database import AsyncSessionLocal, IS_SQLITE
+import models
+
+def batching_enabled() -> bool:
+    """settings.draft_write_batching, defaulting to on for SQLite only"""
+    if settings.draft_write_batching is None:
+        return IS_SQLITE
+    return settings.draft_write_batching
+
+class DraftWriteBatcher:
+    """
+    Groups concurrent DraftInstance inserts into one transaction
+    Callers await submit() and get their row id back. A batch is written once
+    max_batch rows are queued or max_delay has passed since the first one, so
+    SQLite pays one commit per batch instead of one per draft. If the batch
+    insert fails, its rows are retried one by one, so a bad row only fails
+    its own caller.
+    """
+
+    def __init__(self, max_batch: int = 100, max_delay_ms: int = 5, session_factory=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._queue = None
+        self._task = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, row: dict) -> int:
+        """Queue one instances row (column -> value) and wait for its id"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _insert(self, rows: list) -> list:
+        async with self.session_factory() as db:
+            ids = (await db.scalars(
+                insert(models.DraftInstance).returning(models.DraftInstance.id, sort_by_parameter_order=True),
+                rows
+            )).all()
+            await db.commit()
+        return ids
+
+    async def _write(self, batch: list):
+        try:
+            ids = await self._insert([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Find the rows at fault: each one is retried in its own transaction
+            for item in batch:
+                await self._write([item])
+            return
+
+        for (_, future), instance_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(instance_id)
+
+    async def close(self):
+        """Stop the writer after writing anything already queued"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+draft_writer = DraftWriteBatcher(settings.draft_write_batch_size, settings.draft_write_batch_delay_ms)
@@ -0,0 +1,237 @@
+import asyncio
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from sqlalchemy import select, update, text, inspect, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from services.template_index import tokenize
+import models
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; appends are then only guarded within the process
+    fcntl = None
+
+# Documents stored without an embedding are embedded and written back this many at a time
+BACKFILL_BATCH_SIZE = 500
+
+def _np():
+    # Imported on first use so importing the app stays cheap
+    import numpy
+    return numpy
+
+def _features(text: str) -> Counter:
+    """Unigrams and bigrams of the document's word tokens"""
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+def embed_text(text: str, dim: int = None):
+    """
+    Local hashing-trick embedding: no model download, no network
+    Each feature hashes to a signed bucket weighted by 1 + log(tf); the result
+    is L2-normalized float32, so a dot product is the cosine similarity.
+    """
+    np = _np()
+    dim = dim or settings.embedding_dim
+    vector = np.zeros(dim, dtype=np.float32)
+    features = _features(text)
+    if not features:
+        return vector
+
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter((1.0 + math.log(tf) for tf in features.values()), dtype=np.float32, count=len(features))
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dim, signs * weights)
+
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+def to_blob(vector) -> bytes:
+    """Packed little-endian float32, as stored in Document.embedding"""
+    return vector.astype("<f4").tobytes()
+
+def from_blob(blob: bytes):
+    return _np().frombuffer(blob, dtype="<f4")
+
+def migrate_embedding_column(engine):
+    """
+    Drop embeddings stored before Document.embedding became a float32 blob
+    They were JSON lists; sync_async re-embeds documents without a usable blob.
+    SQLite keeps the old column and only needs the values cleared; Postgres
+    needs the json column changed to bytea.
+    """
+    with engine.begin() as conn:
+        if "documents" not in inspect(conn).get_table_names():
+            return
+        if conn.dialect.name == "sqlite":
+            conn.execute(text(
+                "UPDATE documents SET embedding = NULL WHERE embedding IS NOT NULL AND typeof(embedding) != 'blob'"
+            ))
+        elif conn.dialect.name == "postgresql":
+            column_type = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'documents' AND column_name = 'embedding'"
+            )).scalar()
+            if column_type in ("json", "jsonb"):
+                conn.execute(text("ALTER TABLE documents ALTER COLUMN embedding TYPE bytea USING NULL"))
+
+class DocumentEmbeddingIndex:
+    """
+    Document embeddings as one contiguous, memory-mapped float32 matrix
+    Rows are appended to a file on disk alongside an id file, so the corpus
+    lives in the page cache rather than the Python heap and a similarity query
+    is a single matrix-vector product. The database stays the source of truth:
+    sync_async() appends every document the index doesn't have yet.
+    File I/O blocks, so async callers run append() in a thread.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self.vectors_path = os.path.join(directory, f"vectors_{dim}.f32")
+        self.ids_path = os.path.join(directory, f"ids_{dim}.i64")
+        self.lock_path = os.path.join(directory, "index.lock")
+        self.directory = directory
+        self.ids = []
+        self.positions = {}  # document id -> row
+        self.max_row_id = 0
+        self._matrix = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.ids)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._refresh()
+            self._loaded = True
+
+    def _refresh(self):
+        """Pick up rows on disk, including ones appended by other workers"""
+        np = _np()
+        ids = np.fromfile(self.ids_path, dtype="<i8") if os.path.exists(self.ids_path) else np.empty(0, dtype="<i8")
+        vector_rows = os.path.getsize(self.vectors_path) // self.row_bytes if os.path.exists(self.vectors_path) else 0
+        # A crash between the two writes can leave one file a row ahead; ignore the extra
+        count = min(len(ids), vector_rows)
+        if count == len(self.ids):
+            return
+        self.ids = ids[:count].tolist()
+        self.positions = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.max_row_id = max(self.ids, default=0)
+        self._matrix = None
+
+    def _matrix_view(self):
+        if self._matrix is None or len(self._matrix) != len(self.ids):
+            np = _np()
+            self._matrix = np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(len(self.ids), self.dim)) if self.ids else None
+        return self._matrix
+
+    def append(self, rows: list):
+        """Append (document id, vector) pairs"""
+        self._ensure_loaded()
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            rows = [(doc_id, vector) for doc_id, vector in rows if doc_id not in self.positions]
+            if not rows:
+                return
+            np = _np()
+            with open(self.vectors_path, "ab") as f:
+                for _, vector in rows:
+                    f.write(to_blob(vector))
+            with open(self.ids_path, "ab") as f:
+                f.write(np.array([doc_id for doc_id, _ in rows], dtype="<i8").tobytes())
+            for doc_id, _ in rows:
+                self.positions[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.max_row_id = max(self.max_row_id, doc_id)
+
+    def _indexed_ids(self) -> tuple:
+        self._ensure_loaded()
+        with self._lock:
+            self._refresh()
+            return set(self.positions), self.max_row_id
+
+    async def sync_async(self, db: AsyncSession):
+        """
+        Index documents the index doesn't have yet: ones added since the newest
+        indexed row (including by other workers), and ones still stored without
+        an embedding, such as those stored before it existed.
+        Those, and ones stored with an embedding of another size, are embedded
+        now and written back.
+        """
+        indexed, max_row_id = await asyncio.to_thread(self._indexed_ids)
+        result = await db.execute(
+            select(models.Document.id, models.Document.embedding).where(
+                or_(models.Document.id > max_row_id, models.Document.embedding.is_(None))
+            ).order_by(models.Document.id)
+        )
+        rows = {}
+        missing = []
+        for doc_id, blob in result.all():
+            if doc_id in indexed:
+                continue
+            if isinstance(blob, bytes) and len(blob) == self.row_bytes:
+                rows[doc_id] = from_blob(blob)
+            else:
+                missing.append(doc_id)
+
+        for start in range(0, len(missing), BACKFILL_BATCH_SIZE):
+            batch = missing[start:start + BACKFILL_BATCH_SIZE]
+            texts = (await db.execute(
+                select(models.Document.id, models.Document.raw_text).where(models.Document.id.in_(batch))
+            )).all()
+            vectors = await asyncio.to_thread(
+                lambda: [(doc_id, embed_text(raw_text or "", self.dim)) for doc_id, raw_text in texts]
+            )
+            await db.execute(
+                update(models.Document),
+                [{"id": doc_id, "embedding": to_blob(vector)} for doc_id, vector in vectors]
+            )
+            await db.commit()
+            rows.update(vectors)
+
+        if rows:
+            await asyncio.to_thread(self.append, sorted(rows.items()))
+
+    def similar(self, document_id: int, k: int = 10) -> list:
+        """Top-k (document id, cosine similarity) pairs for an indexed document, best first"""
+        self._ensure_loaded()
+        np = _np()
+        with self._lock:
+            row = self.positions.get(document_id)
+            matrix = self._matrix_view()
+            ids = self.ids
+        if row is None or matrix is None or len(ids) < 2:
+            return []
+
+        scores = matrix @ matrix[row]
+        scores[row] = -np.inf
+        k = min(k, len(ids) - 1)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(ids[i], float(scores[i])) for i in top]
+
+_index = None
+
+def get_document_index() -> DocumentEmbeddingIndex:
+    """Get the shared embedding index, creating it on first use"""
+    global _index
+    if _index is None:
+        _index = DocumentEmbeddingIndex(settings.embedding_index_dir, settings.embedding_dim)
+    return _index
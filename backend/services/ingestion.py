@@ -0,0 +1,406 @@
+import asyncio
+import json
+import os
+import shutil
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import AsyncSessionLocal
+from services.document_processor import extract_text
+from services.ai_service import extract_variables_from_document
+from services.embeddings import embed_text, to_blob, get_document_index
+import models
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+async def prepare_document(filename: str, mime_type: str, path: str, content_hash: str, use_cache: bool = True):
+    """
+    Parse, extract variables from and embed a document without saving it
+    Returns (unsaved Document, embedding). Raises ValueError if the file cannot
+    be parsed, and VariableExtractionError or BrokenProcessPool (both worth
+    retrying) if the LLM or the parser workers failed. use_cache=False
+    re-extracts instead of reusing cached LLM responses
+    """
+
+    # Parse document off the event loop; the worker process reads the file itself
+    try:
+        text_content = await extract_text(path, mime_type)
+    except (ValueError, BrokenProcessPool):
+        raise
+    except Exception as e:
+        raise ValueError(f"Could not parse document: {e}") from e
+
+    # Extract variables from every chunk of the document using Gemini,
+    # and embed it locally for similarity search meanwhile
+    variables, embedding = await asyncio.gather(
+        extract_variables_from_document(text_content, use_cache=use_cache),
+        asyncio.to_thread(embed_text, text_content)
+    )
+
+    document = models.Document(
+        filename=filename,
+        mime_type=mime_type,
+        raw_text=text_content,
+        content_hash=content_hash,
+        variables=variables,
+        embedding=to_blob(embedding)
+    )
+    return document, embedding
+
+async def ingest_document(
+    db: AsyncSession, filename: str, mime_type: str, path: str, content_hash: str, use_cache: bool = True
+):
+    """
+    Parse, extract variables from and embed a document, then save it
+    Used by the synchronous upload; raises like prepare_document, and nothing is saved then
+    """
+    document, embedding = await prepare_document(filename, mime_type, path, content_hash, use_cache)
+    db.add(document)
+    await db.commit()
+    await asyncio.to_thread(get_document_index().append, [(document.id, embedding)])
+    return document
+
+async def find_extracted_document(db: AsyncSession, content_hash: str):
+    """Latest document with these bytes whose variables were already extracted, or None"""
+    return (await db.execute(
+        select(models.Document).where(
+            models.Document.content_hash == content_hash,
+            models.Document.variables.isnot(None)
+        ).order_by(models.Document.id.desc()).limit(1)
+    )).scalars().first()
+
+def job_to_dict(job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "document_id": job.document_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+class JobEvents:
+    """In-process fan-out of job status changes to SSE subscribers"""
+
+    def __init__(self):
+        self._subscribers = {}  # job id -> set of queues
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[job_id]
+
+    def publish(self, job_id: int, payload: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(payload)
+
+class IngestionQueue:
+    """
+    Database-backed queue of document ingestion jobs
+    Uploaded bytes are stored on disk and each job is a row, so queued work
+    survives restarts. Workers claim a job by taking a lease that outlasts
+    job_timeout by lease_margin; a job whose worker died is picked up again
+    once its lease expires, and jobs still running at a clean shutdown are
+    handed back to the queue. A job's document and its success are committed
+    together, so a job is never handed back after its document was saved.
+    Failed attempts are retried with exponential backoff up to max_attempts.
+    """
+
+    def __init__(
+        self,
+        storage_dir: str,
+        workers: int = 2,
+        max_attempts: int = 3,
+        backoff: float = 5.0,
+        job_timeout: float = 600.0,
+        poll_interval: float = 1.0,
+        lease_margin: float = 60.0,
+        session_factory=None
+    ):
+        self.storage_dir = storage_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.lease_margin = lease_margin
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.events = JobEvents()
+        self._wakeup = None
+        self._tasks = []
+        self._running_jobs = set()
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.storage_dir, content_hash)
+
+    async def enqueue(
+        self, db: AsyncSession, upload, filename: str, mime_type: str, content_hash: str, force_reextract: bool = False
+    ):
+        """Move the spooled upload (a TempUpload) into storage and queue a job for it"""
+        await asyncio.to_thread(self._store, upload, content_hash)
+        now = datetime.utcnow()
+        job = models.IngestionJob(
+            filename=filename,
+            mime_type=mime_type,
+            content_hash=content_hash,
+            force_reextract=force_reextract,
+            status=QUEUED,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            next_attempt_at=now,
+            created_at=now,
+            updated_at=now
+        )
+        db.add(job)
+        await db.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def _store(self, upload, content_hash: str):
+        os.makedirs(self.storage_dir, exist_ok=True)
+        path = self._path(content_hash)
+        with upload:
+            if not os.path.exists(path):
+                # Move, not copy; across filesystems go through a partial file so readers never see half of it
+                partial = f"{path}.{os.getpid()}.part"
+                shutil.move(upload.path, partial)
+                os.replace(partial, path)
+
+    async def record_done(self, db: AsyncSession, filename: str, mime_type: str, content_hash: str, document_id: int):
+        """A job that finished without running, e.g. when the bytes were already extracted"""
+        now = datetime.utcnow()
+        job = models.IngestionJob(
+            filename=filename,
+            mime_type=mime_type,
+            content_hash=content_hash,
+            status=SUCCEEDED,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            document_id=document_id,
+            created_at=now,
+            updated_at=now,
+            finished_at=now
+        )
+        db.add(job)
+        await db.commit()
+        return job
+
+    def start(self):
+        """Start the worker tasks; called from the app lifespan"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers and put their unfinished jobs back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running_jobs:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(models.IngestionJob)
+                    .where(models.IngestionJob.id.in_(self._running_jobs), models.IngestionJob.status == RUNNING)
+                    .values(
+                        status=QUEUED,
+                        attempts=models.IngestionJob.attempts - 1,
+                        next_attempt_at=datetime.utcnow(),
+                        lease_expires_at=None
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            self._running_jobs.clear()
+
+    def lease_expiry(self, now: datetime) -> datetime:
+        """
+        A job is cut off after job_timeout; the margin covers saving its result,
+        so another worker never claims a job that is still being finished
+        """
+        return now + timedelta(seconds=self.job_timeout + self.lease_margin)
+
+    def _claimable(self, now: datetime):
+        job = models.IngestionJob
+        return or_(
+            and_(job.status == QUEUED, job.next_attempt_at <= now),
+            and_(job.status == RUNNING, job.lease_expires_at < now)
+        )
+
+    async def _claim(self):
+        """Lease the oldest runnable job; the status check in the UPDATE makes racing claims miss, not collide"""
+        now = datetime.utcnow()
+        job = models.IngestionJob
+        candidate = select(job.id).where(self._claimable(now)).order_by(job.id).limit(1).scalar_subquery()
+        async with self.session_factory() as db:
+            claimed = (await db.execute(
+                update(job)
+                .where(job.id == candidate, self._claimable(now))
+                .values(
+                    status=RUNNING,
+                    attempts=job.attempts + 1,
+                    started_at=now,
+                    updated_at=now,
+                    lease_expires_at=self.lease_expiry(now)
+                )
+                .returning(job.id)
+                .execution_options(synchronize_session=False)
+            )).scalar()
+            await db.commit()
+            if claimed is None:
+                return None
+            self._running_jobs.add(claimed)
+            return await db.get(job, claimed)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error claiming ingestion job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.events.publish(job.id, job_to_dict(job))
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The lease expires and the job is claimed again
+                print(f"Error finishing ingestion job {job.id}: {e}")
+            self._running_jobs.discard(job.id)
+
+    async def _process(self, job):
+        path = self._path(job.content_hash)
+        indexed = None
+        async with self.session_factory() as db:
+            try:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Stored upload is missing: {job.content_hash}")
+                document, embedding = await asyncio.wait_for(
+                    prepare_document(
+                        job.filename, job.mime_type, path, job.content_hash, use_cache=not job.force_reextract
+                    ),
+                    self.job_timeout
+                )
+                # Committed below together with the job's success
+                db.add(document)
+                await db.flush()
+                indexed = (document.id, embedding)
+                values = {"status": SUCCEEDED, "document_id": document.id, "error": None}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await db.rollback()
+                indexed = None
+                # Unreadable or unsupported files fail the same way every time
+                permanent = isinstance(e, (ValueError, FileNotFoundError))
+                if permanent or job.attempts >= job.max_attempts:
+                    values = {"status": FAILED, "error": str(e) or type(e).__name__}
+                else:
+                    delay = self.backoff * (2 ** (job.attempts - 1))
+                    values = {
+                        "status": QUEUED,
+                        "error": str(e) or type(e).__name__,
+                        "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+                    }
+
+            now = datetime.utcnow()
+            values.update(updated_at=now, lease_expires_at=None)
+            if values["status"] in TERMINAL_STATUSES:
+                values["finished_at"] = now
+            await db.execute(
+                update(models.IngestionJob)
+                .where(models.IngestionJob.id == job.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if indexed is not None:
+                await asyncio.to_thread(get_document_index().append, [indexed])
+            updated = await db.get(models.IngestionJob, job.id, populate_existing=True)
+
+            # Keep the stored bytes while another job for the same file is pending
+            pending = None
+            if updated.status in TERMINAL_STATUSES:
+                pending = (await db.execute(
+                    select(models.IngestionJob.id).where(
+                        models.IngestionJob.content_hash == updated.content_hash,
+                        models.IngestionJob.status.in_((QUEUED, RUNNING))
+                    ).limit(1)
+                )).scalar()
+
+        if updated.status in TERMINAL_STATUSES and pending is None:
+            await asyncio.to_thread(self._discard_upload, updated.content_hash)
+        self.events.publish(job.id, job_to_dict(updated))
+
+    def _discard_upload(self, content_hash: str):
+        try:
+            os.remove(self._path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    async def stream_events(self, job_id: int):
+        """
+        Server-sent events for one job until it finishes
+        Updates from this process arrive as they happen; the database is polled
+        as well, so jobs run by another worker process are still reported.
+        """
+        queue = self.events.subscribe(job_id)
+        last = None
+        try:
+            while True:
+                async with self.session_factory() as db:
+                    job = await db.get(models.IngestionJob, job_id)
+                payload = job_to_dict(job) if job else None
+                if payload is None:
+                    return
+                if payload != last:
+                    last = payload
+                    yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+                if payload["status"] in TERMINAL_STATUSES:
+                    return
+                try:
+                    await asyncio.wait_for(queue.get(), settings.ingest_events_poll_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.events.unsubscribe(job_id, queue)
+
+ingestion_queue = IngestionQueue(
+    settings.ingest_storage_dir,
+    workers=settings.ingest_workers,
+    max_attempts=settings.ingest_max_attempts,
+    backoff=settings.ingest_retry_backoff_seconds,
+    job_timeout=settings.ingest_job_timeout_seconds,
+    poll_interval=settings.ingest_poll_interval_seconds,
+    lease_margin=settings.ingest_lease_margin_seconds
+)
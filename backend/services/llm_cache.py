@@ -0,0 +1,176 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Run disk eviction once every this many writes rather than on each one
+EVICTION_INTERVAL = 100
+
+def normalize_prompt(prompt: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", prompt).strip()
+
+def cache_key(model_name: str, prompt: str) -> str:
+    payload = f"{model_name}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    Two-tier cache for LLM responses
+    An in-memory LRU sits in front of a SQLite table; both honour the TTL,
+    and the table is trimmed to max_entries by least recent access.
+    Entries are grouped by namespace (the LLM task) so a whole task can be invalidated.
+    """
+
+    def __init__(self, path: str, memory_entries: int = 1024, max_entries: int = 50000, ttl_seconds: int = 604800):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._memory = OrderedDict()  # key -> (response, created_at, namespace)
+        # Separate locks, so a memory lookup on the event loop never waits behind SQLite I/O
+        self._memory_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats_counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_namespace ON llm_cache (namespace)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    def _remember(self, key: str, response: str, created_at: float, namespace: str):
+        with self._memory_lock:
+            self._memory[key] = (response, created_at, namespace)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, namespace: str, model_name: str, prompt: str):
+        """Return the cached response, or None"""
+        response = self.get_from_memory(namespace, model_name, prompt)
+        if response is not None:
+            return response
+        return self.get_from_disk(namespace, model_name, prompt)
+
+    def get_from_memory(self, namespace: str, model_name: str, prompt: str):
+        """
+        The in-memory tier only: no I/O, safe to call on the event loop
+        A miss here is not counted; get_from_disk records the final outcome
+        """
+        key = cache_key(model_name, prompt)
+        now = time.time()
+
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats_counters["memory_hits"] += 1
+                return entry[0]
+            del self._memory[key]
+            return None
+
+    def get_from_disk(self, namespace: str, model_name: str, prompt: str):
+        """The SQLite tier; blocking, so async callers run it in a thread"""
+        key = cache_key(model_name, prompt)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.stats_counters["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats_counters["disk_hits"] += 1
+        self._remember(key, row[0], row[1], namespace)
+        return row[0]
+
+    def set(self, namespace: str, model_name: str, prompt: str, response: str):
+        key = cache_key(model_name, prompt)
+        now = time.time()
+
+        self._remember(key, response, now, namespace)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, namespace, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, model_name, response, now, now)
+            )
+            self._conn.commit()
+            self.stats_counters["writes"] += 1
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the least recently used rows beyond max_entries"""
+        removed = self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,)
+        ).rowcount
+        removed += self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        self._conn.commit()
+        self.stats_counters["evictions"] += removed
+
+    def invalidate(self, namespace: str):
+        """Drop every cached response for one namespace"""
+        with self._memory_lock:
+            for key in [k for k, v in self._memory.items() if v[2] == namespace]:
+                del self._memory[key]
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._memory_lock:
+            self._memory.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._memory_lock:
+            stats = dict(self.stats_counters)
+            stats["memory_entries"] = len(self._memory)
+        with self._lock:
+            stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+_cache = None
+
+def get_llm_cache():
+    """Get the shared response cache, or None when caching is disabled"""
+    global _cache
+    if _cache is None and settings.llm_cache_enabled:
+        _cache = LLMResponseCache(
+            settings.llm_cache_path,
+            memory_entries=settings.llm_cache_memory_entries,
+            max_entries=settings.llm_cache_max_entries,
+            ttl_seconds=settings.llm_cache_ttl_seconds
+        )
+    return _cache
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import random
+import re
+import time
+from config import settings
+from services.llm_cache import get_llm_cache
+from services import metrics
+
+class LLMError(Exception):
+    """Raised when an LLM call fails after all retries"""
+    pass
+
+# HTTP statuses worth retrying: rate limited, or a server-side failure
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Timeouts, rate limits, 5xx and dropped connections are retried
+    Anything else (missing API key, bad request, permission denied) fails at once
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, LLMError):
+        return False
+    # google.api_core errors carry the HTTP status as .code; other SDKs use .status_code
+    for attribute in ("code", "status_code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int) and not isinstance(status, bool):
+            return status in RETRYABLE_STATUS_CODES
+    return False
+
+class LLMBackend:
+    """
+    Base class for LLM backends
+    Backends only need to turn a prompt into text; the client handles
+    concurrency, timeouts and retries
+    """
+
+    model_name = ""
+
+    async def generate(self, prompt: str, task: str) -> str:
+        raise NotImplementedError
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via the native async API"""
+
+    def __init__(self, model_name: str, api_key: str):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            if not self._api_key:
+                raise LLMError("GEMINI_API_KEY is not set")
+            # Imported on first use; the SDK is slow to import
+            import google.generativeai as genai
+            genai.configure(api_key=self._api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, prompt: str, task: str) -> str:
+        response = await self._get_model().generate_content_async(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.llm_tokens.inc(task, "prompt", amount=getattr(usage, "prompt_token_count", 0) or 0)
+            metrics.llm_tokens.inc(task, "response", amount=getattr(usage, "candidates_token_count", 0) or 0)
+        return response.text
+
+class StubBackend(LLMBackend):
+    """
+    Offline backend with canned, well-formed responses for each task
+    Used for load testing and local development without network access
+    """
+
+    model_name = "stub"
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency = latency_ms / 1000
+
+    async def generate(self, prompt: str, task: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if task == "extract_variables":
+            return json.dumps({
+                "variables": [
+                    {
+                        "key": "party_name",
+                        "label": "Party Name",
+                        "description": "Name of the party",
+                        "example": "John Doe",
+                        "required": True,
+                        "dtype": "string"
+                    }
+                ],
+                "similarity_tags": []
+            })
+
+        if task == "match_template":
+            # Pick the first candidate listed in the prompt
+            candidates = prompt.split("Available templates:", 1)[-1]
+            match = re.search(r'"template_id":\s*"([^"]+)"', candidates)
+            if match:
+                return json.dumps({
+                    "template_id": match.group(1),
+                    "confidence": 0.9,
+                    "reasoning": "Stub backend selected the first candidate."
+                })
+            return json.dumps({"template_id": "none", "confidence": 0.0, "reasoning": ""})
+
+        if task == "generate_questions":
+            return "Please provide the requested information."
+
+        # Batched questions and prefill fall back to an empty object
+        return "{}"
+
+def _build_backend() -> LLMBackend:
+    if settings.llm_backend == "stub":
+        return StubBackend(settings.llm_stub_latency_ms)
+    if settings.llm_backend == "gemini":
+        return GeminiBackend(settings.llm_model, settings.gemini_api_key)
+    raise ValueError(f"Unknown LLM backend: {settings.llm_backend}")
+
+class LLMClient:
+    """
+    Shared async client for all LLM calls
+    Caps concurrent calls, applies a per-call timeout and retries transient
+    failures (see is_retryable) with exponential backoff. Successful responses go through the response cache,
+    namespaced by task.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    async def generate(self, prompt: str, task: str = "generic", cache: bool = True) -> str:
+        """Run a prompt and return the response text"""
+        response_cache = get_llm_cache() if cache else None
+        if response_cache is not None:
+            # Memory hits stay on the loop; only the SQLite lookup goes to a thread
+            cached = response_cache.get_from_memory(task, self.model_name, prompt)
+            if cached is None:
+                cached = await asyncio.to_thread(response_cache.get_from_disk, task, self.model_name, prompt)
+            metrics.llm_cache_lookups.inc(task, "miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        response = await self._generate_with_retries(prompt, task)
+
+        if response_cache is not None:
+            await asyncio.to_thread(response_cache.set, task, self.model_name, prompt, response)
+        return response
+
+    async def _generate_with_retries(self, prompt: str, task: str) -> str:
+        last_error = None
+
+        service = f"llm_{self.model_name}"
+        metrics.outbound_request_chars.observe(len(prompt), service, task)
+
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        self.backend.generate(prompt, task),
+                        timeout=self.timeout
+                    )
+                    metrics.outbound_call_duration.observe(time.perf_counter() - start, service, task)
+                    metrics.outbound_response_chars.observe(len(response or ""), service, task)
+                    return response
+                except asyncio.TimeoutError:
+                    last_error = TimeoutError(f"LLM call timed out after {self.timeout}s")
+                except Exception as e:
+                    last_error = e
+                metrics.outbound_call_duration.observe(time.perf_counter() - start, service, task)
+                metrics.outbound_call_errors.inc(service, task)
+
+            if not is_retryable(last_error):
+                break
+
+            # Back off outside the semaphore so waiting calls can proceed
+            if attempt < self.max_retries:
+                delay = self.backoff * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+        raise LLMError(f"{task} failed after {attempt + 1} attempts: {last_error}") from last_error
+
+_client = None
+
+def get_llm_client() -> LLMClient:
+    """Get the shared LLM client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = LLMClient(
+            _build_backend(),
+            max_concurrency=settings.llm_max_concurrency,
+            timeout=settings.llm_timeout_seconds,
+            max_retries=settings.llm_max_retries,
+            backoff=settings.llm_retry_backoff_seconds
+        )
+    return _client
+
+def set_llm_backend(backend: LLMBackend) -> LLMClient:
+    """Swap the backend of the shared client (e.g. a stub for load tests)"""
+    client = get_llm_client()
+    client.backend = backend
+    return client
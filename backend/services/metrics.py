@@ -0,0 +1,141 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from fast DB reads up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Size buckets for prompt/response character counts
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect plus two adds under a lock"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# HTTP
+http_request_duration = register(Histogram(
+    "lexi_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+
+# Outbound calls (LLM, web search)
+outbound_call_duration = register(Histogram(
+    "lexi_outbound_call_duration_seconds", "Latency of outbound calls", ("service", "call_site")
+))
+outbound_call_errors = register(Counter(
+    "lexi_outbound_call_errors_total", "Failed outbound calls", ("service", "call_site")
+))
+outbound_request_chars = register(Histogram(
+    "lexi_outbound_request_chars", "Characters sent per outbound call", ("service", "call_site"), SIZE_BUCKETS
+))
+outbound_response_chars = register(Histogram(
+    "lexi_outbound_response_chars", "Characters received per outbound call", ("service", "call_site"), SIZE_BUCKETS
+))
+llm_tokens = register(Counter(
+    "lexi_llm_tokens_total", "LLM tokens reported by the backend", ("call_site", "direction")
+))
+llm_cache_lookups = register(Counter(
+    "lexi_llm_cache_lookups_total", "LLM response cache lookups", ("call_site", "result")
+))
+llm_parse_duration = register(Histogram(
+    "lexi_llm_parse_duration_seconds", "Time spent extracting JSON from LLM responses", ("call_site",),
+    (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+))
+coalesced_calls = register(Counter(
+    "lexi_coalesced_calls_total", "Calls that started (leader) or joined (follower) an in-flight computation", ("operation", "role")
+))
+web_search_cache_lookups = register(Counter(
+    "lexi_web_search_cache_lookups_total", "Web search result cache lookups", ("result",)
+))
+prefill_variables = register(Counter(
+    "lexi_prefill_variables_total", "Variables pre-filled from the user query", ("source",)
+))
+
+# Database
+db_query_duration = register(Histogram(
+    "lexi_db_query_duration_seconds", "Database statement latency", ("operation",)
+))
@@ -0,0 +1,108 @@
+import re
+from collections import OrderedDict
+
+# Matchers, keyed by the (key, example) pairs they were built from
+_MATCHER_CACHE_SIZE = 128
+_matcher_cache = OrderedDict()
+
+_END = ""  # Trie key marking the end of a pattern
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+class MultiPatternMatcher:
+    """
+    Finds many literal patterns in one pass over the text
+    The patterns are merged into a trie, which is compiled into a single
+    regex with shared prefixes; longer continuations are tried first, so
+    each match is the longest pattern starting at that position, and matches
+    never overlap. Patterns only match on word boundaries, so "10" does not
+    match inside "2010".
+    """
+
+    def __init__(self, patterns: dict):
+        # patterns maps literal text -> the key it stands for
+        self.patterns = {text: key for text, key in patterns.items() if text}
+        self.regex = self._compile() if self.patterns else None
+
+    def _compile(self):
+        trie = {}
+        for text in self.patterns:
+            node = trie
+            for char in text:
+                node = node.setdefault(char, {})
+            node[_END] = text
+        return re.compile(self._node_regex(trie, top=True))
+
+    def _node_regex(self, node: dict, top: bool = False, last_char: str = "") -> str:
+        branches = []
+        for char in sorted(c for c in node if c != _END):
+            # Collapse single-child chains into one literal run
+            run, child = char, node[char]
+            while len(child) == 1 and _END not in child:
+                next_char = next(iter(child))
+                run += next_char
+                child = child[next_char]
+            branch = re.escape(run)
+            if top and _is_word_char(char):
+                # Boundary check after the first character, so the regex still starts
+                # with a literal and the engine can skip ahead to candidate positions
+                branch = re.escape(char) + r"(?<!\w.)" + re.escape(run[1:])
+            branches.append(branch + self._node_regex(child, last_char=run[-1]))
+
+        end = ""
+        if _END in node:
+            end = r"(?!\w)" if _is_word_char(last_char) else ""
+
+        if top:
+            return "|".join(branches)
+        if not branches:
+            return end
+        # Greedy: the longer continuations come first, the end of this pattern last
+        alternatives = "|".join(branches)
+        if _END in node:
+            return f"(?:{alternatives}|{end})" if end else f"(?:{alternatives})?"
+        return f"(?:{alternatives})" if len(branches) > 1 else alternatives
+
+    def finditer(self, text: str):
+        """Yield (key, start, end) for each non-overlapping longest match"""
+        if self.regex is None:
+            return
+        for match in self.regex.finditer(text):
+            yield self.patterns[match.group()], match.start(), match.end()
+
+    def substitute(self, text: str, replacement) -> tuple:
+        """
+        Replace every match with replacement(key) in a single pass
+        Returns (new_text, matches) where matches maps key -> list of (start, end)
+        spans in the original text
+        """
+        matches = {}
+        if self.regex is None:
+            return text, matches
+
+        def replace(match):
+            key = self.patterns[match.group()]
+            matches.setdefault(key, []).append((match.start(), match.end()))
+            return replacement(key)
+
+        return self.regex.sub(replace, text), matches
+
+def get_matcher(pairs: tuple) -> MultiPatternMatcher:
+    """
+    Get the cached matcher for a tuple of (key, text) pairs, building it on first use
+    When several keys share the same text, the first one wins
+    """
+    matcher = _matcher_cache.get(pairs)
+    if matcher is not None:
+        _matcher_cache.move_to_end(pairs)
+        return matcher
+
+    patterns = {}
+    for key, text in pairs:
+        patterns.setdefault(text, key)
+    matcher = MultiPatternMatcher(patterns)
+    _matcher_cache[pairs] = matcher
+    if len(_matcher_cache) > _MATCHER_CACHE_SIZE:
+        _matcher_cache.popitem(last=False)
+    return matcher
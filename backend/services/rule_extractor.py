@@ -0,0 +1,233 @@
+import re
+from datetime import date
+
+MONTHS = {
+    name: i + 1
+    for i, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ])
+    for name in names
+}
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+ISO_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_DATE_PATTERN = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b")
+DAY_MONTH_DATE_PATTERN = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({MONTH_NAMES})\.?,?\s+(\d{{4}})\b", re.IGNORECASE)
+MONTH_DAY_DATE_PATTERN = re.compile(rf"\b({MONTH_NAMES})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b", re.IGNORECASE)
+
+EMAIL_PATTERN = re.compile(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b")
+
+CURRENCY_SYMBOLS = r"₹|rs\.?|inr|\$|usd|€|eur|£|gbp"
+MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "lakh": 100_000, "lakhs": 100_000, "crore": 10_000_000, "crores": 10_000_000, "million": 1_000_000}
+MULTIPLIER_NAMES = "|".join(sorted(MULTIPLIERS, key=len, reverse=True))
+AMOUNT = rf"(\d[\d,]*(?:\.\d+)?)(?:\s*({MULTIPLIER_NAMES})\b)?"
+CURRENCY_PATTERN = re.compile(
+    rf"(?:(?:{CURRENCY_SYMBOLS})\s*{AMOUNT})|(?:\b{AMOUNT}\s*(?:rupees|dollars|euros|pounds|{CURRENCY_SYMBOLS})\b)",
+    re.IGNORECASE
+)
+NUMBER_PATTERN = re.compile(r"(?<![\w.-])\d[\d,]*(?:\.\d+)?(?![\w-])")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+CONTEXT_STOPWORDS = {"the", "of", "on", "a", "an", "and", "is", "was", "my", "our", "for", "to", "in", "at", "date", "number", "name"}
+
+# Confidence levels; values below settings.prefill_rule_min_confidence are left to the LLM
+CONFIDENCE_REGEX = 0.95
+CONFIDENCE_ENUM = 0.9
+CONFIDENCE_SOLE_CANDIDATE = 0.9
+CONFIDENCE_CONTEXT = 0.8
+AMBIGUOUS_DATE_PENALTY = 0.15
+
+DATE_DTYPES = {"date"}
+NUMBER_DTYPES = {"number", "integer", "float", "currency", "amount", "money"}
+EMAIL_DTYPES = {"email"}
+
+class Candidate:
+    __slots__ = ("value", "start", "end", "confidence", "needs_context")
+
+    def __init__(self, value, start: int, end: int, confidence: float = 1.0, needs_context: bool = False):
+        self.value = value
+        self.start = start
+        self.end = end
+        self.confidence = confidence
+        # Only assigned when words before it name the variable (e.g. a bare number)
+        self.needs_context = needs_context
+
+def _iso(year: int, month: int, day: int):
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+def find_dates(text: str) -> list:
+    """Dates in the text, normalized to YYYY-MM-DD"""
+    found = []
+    for m in ISO_DATE_PATTERN.finditer(text):
+        value = _iso(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        if value:
+            found.append(Candidate(value, m.start(), m.end()))
+    for m in NUMERIC_DATE_PATTERN.finditer(text):
+        first, second, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if first > 12 or second > 12:
+            day, month = (first, second) if first > 12 else (second, first)
+            confidence = 1.0
+        else:
+            # Ambiguous: assume DD/MM (the format our questions ask for), with less confidence
+            day, month = first, second
+            confidence = 1.0 - AMBIGUOUS_DATE_PENALTY
+        value = _iso(year, month, day)
+        if value:
+            found.append(Candidate(value, m.start(), m.end(), confidence))
+    for m in DAY_MONTH_DATE_PATTERN.finditer(text):
+        value = _iso(int(m.group(3)), MONTHS[m.group(2).lower()], int(m.group(1)))
+        if value:
+            found.append(Candidate(value, m.start(), m.end()))
+    for m in MONTH_DAY_DATE_PATTERN.finditer(text):
+        value = _iso(int(m.group(3)), MONTHS[m.group(1).lower()], int(m.group(2)))
+        if value:
+            found.append(Candidate(value, m.start(), m.end()))
+    return found
+
+def _amount(number: str, multiplier: str):
+    value = float(number.replace(",", ""))
+    if multiplier:
+        value *= MULTIPLIERS[multiplier.lower()]
+    return int(value) if value.is_integer() else value
+
+def find_amounts(text: str, dates: list) -> list:
+    """
+    Currency amounts first; bare numbers that are not part of a date as a fallback
+    A bare number could be a policy number, a flat number, anything, so it is
+    only used when the words before it name the variable
+    """
+    found = []
+    for m in CURRENCY_PATTERN.finditer(text):
+        number, multiplier = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        found.append(Candidate(_amount(number, multiplier), m.start(), m.end()))
+    if found:
+        return found
+
+    taken = [(d.start, d.end) for d in dates]
+    for m in NUMBER_PATTERN.finditer(text):
+        if any(start <= m.start() < end for start, end in taken):
+            continue
+        found.append(Candidate(_amount(m.group(), None), m.start(), m.end(), needs_context=True))
+    return found
+
+def find_emails(text: str) -> list:
+    return [Candidate(m.group(), m.start(), m.end()) for m in EMAIL_PATTERN.finditer(text)]
+
+def _variable_terms(variable: dict) -> set:
+    text = f"{variable.get('key', '').replace('_', ' ')} {variable.get('label') or ''}"
+    return {t for t in TOKEN_PATTERN.findall(text.lower()) if t not in CONTEXT_STOPWORDS}
+
+def _context_terms(text: str, candidate: Candidate, window: int = 40) -> set:
+    before = text[max(0, candidate.start - window):candidate.start].lower()
+    return set(TOKEN_PATTERN.findall(before))
+
+def _compile_value_pattern(pattern: str):
+    try:
+        return re.compile(pattern)
+    except (re.error, TypeError):
+        return None
+
+def _match_regex(text: str, pattern) -> list:
+    """Distinct substrings of text that fully match the variable's regex"""
+    values = []
+    for m in re.finditer(r"\S+", text):
+        token = m.group().strip(".,;:!?()[]{}\"'")
+        if token and pattern.fullmatch(token) and token not in values:
+            values.append(token)
+    return values
+
+def _match_enum(text: str, options: list) -> list:
+    lowered = text.lower()
+    return [
+        option for option in options
+        if isinstance(option, str) and re.search(rf"(?<!\w){re.escape(option.lower())}(?!\w)", lowered)
+    ]
+
+def _assign(text: str, candidates: list, variables: list, results: dict):
+    """
+    Give candidates of one type to the variables of that type
+    A single candidate for a single variable is taken as is; otherwise each
+    variable takes the candidate whose preceding words overlap its key/label.
+    Candidates that need context are never taken as is.
+    """
+    if not candidates or not variables:
+        return
+
+    distinct = {c.value for c in candidates}
+    needs_context = any(c.needs_context for c in candidates)
+    if len(variables) == 1 and len(distinct) == 1 and not needs_context:
+        candidate = max(candidates, key=lambda c: c.confidence)
+        results[variables[0]["key"]] = (candidate.value, CONFIDENCE_SOLE_CANDIDATE * candidate.confidence)
+        return
+
+    used = set()
+    for variable in variables:
+        terms = _variable_terms(variable)
+        if not terms:
+            continue
+        scored = sorted(
+            ((len(terms & _context_terms(text, c)), i, c) for i, c in enumerate(candidates) if i not in used),
+            key=lambda item: item[0],
+            reverse=True
+        )
+        if not scored or scored[0][0] == 0:
+            continue
+        # Skip ties; the LLM is better at those
+        if len(scored) > 1 and scored[1][0] == scored[0][0] and scored[1][2].value != scored[0][2].value:
+            continue
+        _, index, candidate = scored[0]
+        used.add(index)
+        results[variable["key"]] = (candidate.value, CONFIDENCE_CONTEXT * candidate.confidence)
+
+def extract_from_query(query: str, variables: list) -> dict:
+    """
+    Deterministically fill what the query plainly contains
+    variables are dicts with key, label, dtype, regex and enum.
+    Returns key -> {"value", "confidence"} for the variables it could fill
+    """
+    results = {}
+    by_type = {"date": [], "number": [], "email": []}
+
+    for variable in variables:
+        key = variable.get("key")
+        if not key:
+            continue
+
+        pattern = _compile_value_pattern(variable.get("regex")) if variable.get("regex") else None
+        if pattern is not None:
+            values = _match_regex(query, pattern)
+            if len(values) == 1:
+                results[key] = (values[0], CONFIDENCE_REGEX)
+            continue
+
+        options = variable.get("enum")
+        if options:
+            values = _match_enum(query, options)
+            if len(values) == 1:
+                results[key] = (values[0], CONFIDENCE_ENUM)
+            continue
+
+        dtype = (variable.get("dtype") or "string").lower()
+        if dtype in DATE_DTYPES:
+            by_type["date"].append(variable)
+        elif dtype in NUMBER_DTYPES:
+            by_type["number"].append(variable)
+        elif dtype in EMAIL_DTYPES:
+            by_type["email"].append(variable)
+
+    dates = find_dates(query) if by_type["date"] or by_type["number"] else []
+    _assign(query, dates, by_type["date"], results)
+    if by_type["number"]:
+        _assign(query, find_amounts(query, dates), by_type["number"], results)
+    if by_type["email"]:
+        _assign(query, find_emails(query), by_type["email"], results)
+
+    return {
+        key: {"value": value, "confidence": round(confidence, 3)}
+        for key, (value, confidence) in results.items()
+    }
@@ -0,0 +1,233 @@
+import html
+import re
+from sqlalchemy import text, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+
+# Snippet markers around matched terms
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_WORDS = 16
+
+# Private-use characters the database puts around matches, swapped for the
+# markers only after the snippet text has been escaped
+_SENTINEL_START = "\ue000"
+_SENTINEL_END = "\ue001"
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+class SearchSource:
+    """
+    A table covered by the full-text index
+    columns are indexed in order, most important first; weights apply per column
+    """
+
+    def __init__(self, name: str, table: str, columns: tuple, weights: tuple, title_column: str):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.weights = weights
+        self.title_column = title_column
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table}_fts"
+
+SOURCES = {
+    "documents": SearchSource("documents", "documents", ("filename", "raw_text"), (4.0, 1.0), "filename"),
+    "templates": SearchSource("templates", "templates", ("title", "description", "body_md"), (8.0, 3.0, 1.0), "title"),
+    "drafts": SearchSource("drafts", "instances", ("user_query", "draft_md"), (2.0, 1.0), "template_id"),
+}
+
+# Postgres tsvector weight classes, in column order
+PG_WEIGHT_CLASSES = ("A", "B", "C", "D")
+
+def search_backend() -> str:
+    """Full-text backend for database_url: sqlite (FTS5), postgres (tsvector), or empty if unsupported"""
+    url = settings.database_url
+    if url.startswith("sqlite"):
+        return "sqlite"
+    if url.startswith("postgres"):
+        return "postgres"
+    return ""
+
+# Installation
+
+def _sqlite_statements(source: SearchSource) -> list:
+    columns = ", ".join(source.columns)
+    new_values = ", ".join(f"new.{c}" for c in source.columns)
+    old_values = ", ".join(f"old.{c}" for c in source.columns)
+    fts = source.fts_table
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, content='{source.table}', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source.table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {source.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    ]
+
+def _postgres_statements(source: SearchSource) -> list:
+    vector = " || ".join(
+        f"setweight(to_tsvector('english', coalesce({column}, '')), '{weight}')"
+        for column, weight in zip(source.columns, PG_WEIGHT_CLASSES)
+    )
+    return [
+        f"ALTER TABLE {source.table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{source.table}_search_vector ON {source.table} USING GIN (search_vector)",
+    ]
+
+def install_search_index(engine):
+    """
+    Create the full-text index and what keeps it current
+    SQLite: external-content FTS5 tables kept in sync by triggers, backfilled when first created.
+    Postgres: a stored generated tsvector column with a GIN index.
+    Triggers and generated columns live in the database, so bulk and Core inserts are covered too.
+    """
+    backend = search_backend()
+    if not backend:
+        return
+
+    with engine.begin() as conn:
+        for source in SOURCES.values():
+            if backend == "postgres":
+                for statement in _postgres_statements(source):
+                    conn.execute(text(statement))
+                continue
+
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": source.fts_table}
+            ).first()
+            for statement in _sqlite_statements(source):
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows written before the index existed
+                conn.execute(text(f"INSERT INTO {source.fts_table}({source.fts_table}) VALUES ('rebuild')"))
+
+# Querying
+
+def query_terms(query: str) -> list:
+    return TERM_PATTERN.findall(query.lower())
+
+def _fts5_query(terms: list) -> str:
+    """Quote each term so user input can't use FTS5 syntax; terms are ANDed"""
+    return " ".join(f'"{term}"' for term in terms)
+
+def _sqlite_rank_sql(source: SearchSource) -> str:
+    weights = ", ".join(str(w) for w in source.weights)
+    return (
+        f"SELECT '{source.name}' AS type, rowid AS id, -bm25({source.fts_table}, {weights}) AS score "
+        f"FROM {source.fts_table} WHERE {source.fts_table} MATCH :query "
+        f"ORDER BY score DESC, id DESC LIMIT :limit"
+    )
+
+def _postgres_rank_sql(source: SearchSource) -> str:
+    return (
+        f"SELECT '{source.name}' AS type, id, ts_rank_cd(search_vector, websearch_to_tsquery('english', :query)) AS score "
+        f"FROM {source.table} WHERE search_vector @@ websearch_to_tsquery('english', :query) "
+        f"ORDER BY score DESC, id DESC LIMIT :limit"
+    )
+
+def _sqlite_snippet_sql(source: SearchSource) -> str:
+    return (
+        f"SELECT f.rowid AS id, t.{source.title_column} AS title, "
+        f"snippet({source.fts_table}, -1, '{_SENTINEL_START}', '{_SENTINEL_END}', '…', {SNIPPET_WORDS}) AS snippet "
+        f"FROM {source.fts_table} f JOIN {source.table} t ON t.id = f.rowid "
+        f"WHERE {source.fts_table} MATCH :query AND f.rowid IN :ids"
+    )
+
+def _postgres_snippet_sql(source: SearchSource) -> str:
+    options = f"StartSel={_SENTINEL_START}, StopSel={_SENTINEL_END}, MaxWords={SNIPPET_WORDS}, MinWords=5"
+    return (
+        f"SELECT id, {source.title_column} AS title, "
+        f"ts_headline('english', coalesce({source.columns[-1]}, ''), websearch_to_tsquery('english', :query), '{options}') AS snippet "
+        f"FROM {source.table} WHERE id IN :ids"
+    )
+
+def highlight(snippet) -> str:
+    """Escape snippet text as HTML, then mark the matched terms"""
+    if not snippet:
+        return ""
+    return (
+        html.escape(snippet)
+        .replace(_SENTINEL_START, SNIPPET_START)
+        .replace(_SENTINEL_END, SNIPPET_END)
+    )
+
+def merge_ranked(ranked_by_source: dict, limit: int, offset: int) -> list:
+    """
+    Merge per-source rankings into one page of (type, id, score)
+    bm25 and ts_rank_cd scores are only comparable within one table, so each
+    source's scores are divided by its best score first. Each list must hold
+    that source's top offset + limit rows in rank order.
+    """
+    merged = []
+    for name, rows in ranked_by_source.items():
+        if not rows:
+            continue
+        best = float(rows[0].score)
+        for row in rows:
+            score = float(row.score) / best if best > 0 else 0.0
+            merged.append((name, row.id, score))
+    merged.sort(key=lambda item: (item[2], item[1], item[0]), reverse=True)
+    return merged[offset:offset + limit]
+
+async def search(db: AsyncSession, query: str, types: list, limit: int = 20, offset: int = 0) -> dict:
+    """
+    Ranked full-text search across documents, templates and drafts
+    Ranks each source, merges the normalized scores, then builds snippets
+    only for the page being returned. Fetches one extra row to report
+    whether there is a next page.
+    """
+    backend = search_backend()
+    terms = query_terms(query)
+    if not terms:
+        return {"results": [], "has_more": False}
+
+    sources = [SOURCES[name] for name in types]
+    if backend == "sqlite":
+        match_query = _fts5_query(terms)
+        rank_sql, snippet_sql = _sqlite_rank_sql, _sqlite_snippet_sql
+    else:
+        match_query = " ".join(terms)
+        rank_sql, snippet_sql = _postgres_rank_sql, _postgres_snippet_sql
+
+    ranked_by_source = {}
+    for source in sources:
+        ranked_by_source[source.name] = (await db.execute(
+            text(rank_sql(source)),
+            {"query": match_query, "limit": offset + limit + 1}
+        )).all()
+    ranked = merge_ranked(ranked_by_source, limit + 1, offset)
+
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    details = {}
+    for source in sources:
+        ids = [id for name, id, _ in ranked if name == source.name]
+        if not ids:
+            continue
+        rows = await db.execute(
+            text(snippet_sql(source)).bindparams(bindparam("ids", expanding=True)),
+            {"query": match_query, "ids": ids}
+        )
+        for row in rows:
+            details[(source.name, row.id)] = row
+
+    results = []
+    for name, id, score in ranked:
+        detail = details.get((name, id))
+        results.append({
+            "type": name,
+            "id": id,
+            "title": detail.title if detail else None,
+            "snippet": highlight(detail.snippet) if detail else "",
+            "score": round(score, 6),
+        })
+    return {"results": results, "has_more": has_more}
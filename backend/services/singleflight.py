@@ -0,0 +1,37 @@
+import asyncio
+from services import metrics
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one computation
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task. Nothing is cached: once the task finishes
+    the key is released and the next call runs fresh. The task is shielded,
+    so a caller that disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}  # key -> task
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, fn):
+        """Run fn() (a coroutine function) for key, or join the run already in flight"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+            metrics.coalesced_calls.inc(self.name, "leader")
+        else:
+            metrics.coalesced_calls.inc(self.name, "follower")
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,128 @@
+from fastapi import Request, UploadFile
+import tempfile
+
+READ_SIZE = 64 * 1024
+
+# Longest line iter_lines accepts; longer ones are reported as errors and skipped
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+async def upload_chunks(file: UploadFile, size: int = READ_SIZE):
+    """Yield an uploaded file in fixed-size byte chunks"""
+    while True:
+        chunk = await file.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+async def request_chunks(request: Request):
+    """
+    Yield the raw request body, or the first uploaded file for multipart requests
+    Lets bulk endpoints accept either a streamed body or a file upload
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        for value in form.values():
+            if hasattr(value, "read"):
+                async for chunk in upload_chunks(value):
+                    yield chunk
+                return
+        return
+
+    async for chunk in request.stream():
+        yield chunk
+
+async def spool_chunks(chunks, memory_bytes: int = 1024 * 1024):
+    """
+    Copy a byte stream into a spooled temp file and rewind it
+    Keeps memory flat for large bodies that need to be read after the response starts
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=memory_bytes)
+    try:
+        async for chunk in chunks:
+            spooled.write(chunk)
+    except Exception:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+class ZipStream:
+    """
+    Write-only file object for streaming a zipfile.ZipFile
+    zipfile treats it as unseekable and writes data descriptors; call drain()
+    after each entry to take the bytes written so far
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def _decode_line(line: bytes, line_number: int):
+    """(line_number, text, error) for one raw line, or None if it is blank"""
+    try:
+        text = line.decode("utf-8-sig" if line_number == 1 else "utf-8").strip()
+    except UnicodeDecodeError as e:
+        return line_number, None, f"Invalid UTF-8 at byte {e.start}"
+    if not text:
+        return None
+    return line_number, text, None
+
+async def iter_lines(chunks, max_line_bytes: int = MAX_LINE_BYTES):
+    """
+    Split a stream of byte chunks into (line_number, text, error) triples without buffering the whole body
+    A line that isn't valid UTF-8 or is longer than max_line_bytes comes back with
+    text None and an error, so callers can report it and carry on. The pieces of a
+    line are joined once, when its newline arrives, and an overlong line is
+    discarded as it streams. Blank lines are skipped but still counted.
+    """
+    pending = []  # Pieces of the current line
+    pending_size = 0
+    too_long = False
+    line_number = 0
+
+    def finish_line():
+        if too_long:
+            return line_number, None, f"Line is longer than {max_line_bytes} bytes"
+        return _decode_line(b"".join(pending), line_number)
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            piece = chunk[start:] if newline == -1 else chunk[start:newline]
+            if not too_long:
+                pending_size += len(piece)
+                if pending_size > max_line_bytes:
+                    too_long = True
+                    pending.clear()
+                else:
+                    pending.append(piece)
+            if newline == -1:
+                break
+
+            line_number += 1
+            result = finish_line()
+            if result is not None:
+                yield result
+            pending.clear()
+            pending_size = 0
+            too_long = False
+            start = newline + 1
+
+    if pending_size:
+        line_number += 1
+        result = finish_line()
+        if result is not None:
+            yield result
@@ -1,99 +1,380 @@
 import re
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
+from services.pattern_matcher import get_matcher
 
-def generate_draft(template_body: str, answers: dict) -> str:
+# Matches {{ key }} placeholders; whitespace inside the braces is ignored
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*([^{}]*?)\s*\}\}')
+
+# Parsed templates, keyed by (template_id, body hash)
+_PLAN_CACHE_SIZE = 256
+_plan_cache = OrderedDict()
+
+class RenderPlan:
     """
-    Replace all {{variable}} placeholders with actual values
-    Strict replacement - no AI rewriting
+    A template body parsed once into literal segments and placeholder slots
+    literals[i] comes before slots[i]; literals has one more entry than slots
     """
-    
-    draft = template_body
-    
-    # Replace all {{variable}} with values from answers
+
+    def __init__(self, literals: list, slots: list, raw_slots: list):
+        self.literals = literals
+        self.slots = slots  # Lowercased placeholder keys
+        self.raw_slots = raw_slots  # Original placeholder text, kept for unanswered slots
+        self.slot_index = {}
+        for i, key in enumerate(slots):
+            self.slot_index.setdefault(key, []).append(i)
+
+    @property
+    def keys(self) -> list:
+        """Distinct placeholder keys in order of first appearance"""
+        return list(self.slot_index)
+
+def _body_hash(template_body: str) -> str:
+    return hashlib.sha256(template_body.encode("utf-8")).hexdigest()
+
+def parse_template(template_body: str) -> RenderPlan:
+    """Split a template body into literal segments and placeholder slots"""
+    literals, slots, raw_slots = [], [], []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(template_body):
+        literals.append(template_body[position:match.start()])
+        slots.append(match.group(1).lower())
+        raw_slots.append(match.group(0))
+        position = match.end()
+    literals.append(template_body[position:])
+    return RenderPlan(literals, slots, raw_slots)
+
+def compile_template(template_body: str, template_id: str = None, digest: str = None) -> RenderPlan:
+    """
+    Get the cached render plan for a template body, parsing it on first use
+    The body hash is part of the key, so edited templates are re-parsed;
+    pass digest (the body's sha256 hex) if it is already known
+    """
+    cache_key = (template_id, digest or _body_hash(template_body))
+    plan = _plan_cache.get(cache_key)
+    if plan is not None:
+        _plan_cache.move_to_end(cache_key)
+        return plan
+
+    plan = parse_template(template_body)
+    _plan_cache[cache_key] = plan
+    if len(_plan_cache) > _PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
+
+def answer_value(value):
+    """The plain value of an answer; prefill returns answers as {"value": ...} dicts"""
+    if isinstance(value, dict) and 'value' in value:
+        return value['value']
+    return value
+
+def format_answer(key: str, value) -> str:
+    """Format a single answer value for insertion into a draft"""
+    value = answer_value(value)
+
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if value is None:
+        return f"[MISSING: {key}]"
+    return str(value)
+
+def normalize_answers(answers: dict) -> dict:
+    """
+    Map lowercased answer keys to formatted values
+    Keys that differ only by case resolve to the first one given
+    """
+    values = {}
     for key, value in answers.items():
-        # Handle different data types
-        if isinstance(value, dict) and 'value' in value:
-            value = value['value']
-        
-        # Format based on type
-        if isinstance(value, datetime):
-            value = value.strftime('%Y-%m-%d')
-        elif value is None:
-            value = f"[MISSING: {key}]"
+        lookup_key = str(key).strip().lower()
+        if lookup_key not in values:
+            values[lookup_key] = (format_answer(key, value), value is None)
+    return values
+
+def render_plan(plan: RenderPlan, answers: dict) -> tuple:
+    """
+    Render a compiled plan in a single pass
+    Returns (draft, missing) where missing lists unanswered placeholder keys
+    """
+    values = normalize_answers(answers)
+    parts = [plan.literals[0]]
+    missing = []
+    missing_seen = set()
+
+    for i, key in enumerate(plan.slots):
+        answer = values.get(key)
+        if answer is None:
+            parts.append(plan.raw_slots[i])
         else:
-            value = str(value)
-        
-        # Replace with case-insensitive matching
-        pattern = r'\{\{\s*' + re.escape(key) + r'\s*\}\}'
-        draft = re.sub(pattern, value, draft, flags=re.IGNORECASE)
-    
-    return draft
+            parts.append(answer[0])
+        if (answer is None or answer[1]) and key not in missing_seen:
+            missing_seen.add(key)
+            missing.append(key)
+        parts.append(plan.literals[i + 1])
+
+    return "".join(parts), missing
+
+class DraftRenderState:
+    """
+    Segment-level render state of one draft, for incremental re-rendering
+    Holds the rendered text of every slot; apply() re-renders only the slots
+    of changed keys and returns the edits in terms of the previous draft.
+    """
+
+    def __init__(self, plan: RenderPlan, answers: dict, revision: int = 0):
+        self.plan = plan
+        self.revision = revision
+        self.values = normalize_answers(answers)
+        self.parts = [self._slot_text(i, key) for i, key in enumerate(plan.slots)]
+
+    def _slot_text(self, i: int, key: str) -> str:
+        answer = self.values.get(key)
+        return self.plan.raw_slots[i] if answer is None else answer[0]
+
+    def render(self) -> str:
+        pieces = [self.plan.literals[0]]
+        for part, literal in zip(self.parts, self.plan.literals[1:]):
+            pieces.append(part)
+            pieces.append(literal)
+        return "".join(pieces)
+
+    def __len__(self):
+        return sum(map(len, self.plan.literals)) + sum(map(len, self.parts))
+
+    @property
+    def missing(self) -> list:
+        """Placeholder keys without an answer, or answered with None"""
+        return [
+            key for key in self.plan.keys
+            if self.values.get(key) is None or self.values[key][1]
+        ]
+
+    def apply(self, changes: dict) -> list:
+        """
+        Apply answer changes (a None value clears the answer)
+        Returns edits as {"start", "end", "text"} against the previous draft,
+        in document order; apply them from last to first.
+        """
+        changed_slots = set()
+        for key, value in changes.items():
+            lookup_key = str(key).strip().lower()
+            if value is None:
+                self.values.pop(lookup_key, None)
+            else:
+                self.values[lookup_key] = (format_answer(key, value), False)
+            changed_slots.update(self.plan.slot_index.get(lookup_key, ()))
+        if not changed_slots:
+            return []
+
+        edits = []
+        last = max(changed_slots)
+        offset = 0
+        for i in range(last + 1):
+            offset += len(self.plan.literals[i])
+            old_text = self.parts[i]
+            if i in changed_slots:
+                new_text = self._slot_text(i, self.plan.slots[i])
+                if new_text != old_text:
+                    edits.append({"start": offset, "end": offset + len(old_text), "text": new_text})
+                    self.parts[i] = new_text
+            offset += len(old_text)
+        return edits
+
+def render_draft(template_body: str, answers: dict, template_id: str = None) -> dict:
+    """
+    Render a draft and report placeholders that had no answer
+    """
+    plan = compile_template(template_body, template_id)
+    draft, missing = render_plan(plan, answers)
+    return {"draft_md": draft, "missing_variables": missing}
+
+def generate_draft(template_body: str, answers: dict, template_id: str = None) -> str:
+    """
+    Replace all {{variable}} placeholders with actual values
+    Strict replacement - no AI rewriting
+    """
+    return render_draft(template_body, answers, template_id)["draft_md"]
+
+def _example_matcher(variables: list):
+    pairs = tuple(
+        (variable['key'], str(variable['example']))
+        for variable in variables
+        if variable.get('example')
+    )
+    return get_matcher(pairs)
+
+def _placeholder(key: str) -> str:
+    return f"{{{{{key}}}}}"
+
+def create_template_with_matches(text: str, variables: list) -> dict:
+    """
+    Convert plain text into a template and report where each variable was found
+    Example values are matched in one pass, longest first, so "Rajesh Kumar"
+    is not split by a shorter "Rajesh". Positions are (start, end) spans in the
+    original text.
+    """
+    template, spans = _example_matcher(variables).substitute(text, _placeholder)
+    return {
+        "template_md": template,
+        "matches": {
+            key: {"count": len(positions), "positions": positions}
+            for key, positions in spans.items()
+        }
+    }
 
 def create_template_from_text(text: str, variables: list) -> str:
     """
     Convert plain text document into template with {{variable}} syntax
     Replaces detected variable values with placeholder syntax
     """
-    
-    template = text
-    
-    for variable in variables:
-        # If we have an example value, try to replace it
-        if variable.get('example'):
-            # Replace exact matches and similar patterns
-            template = template.replace(variable['example'], f"{{{{{variable['key']}}}}}")
-    
+    template, _ = _example_matcher(variables).substitute(text, _placeholder)
     return template
 
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+VARIABLE_FIELDS = ('key', 'label', 'description', 'example', 'required', 'dtype', 'regex', 'enum')
+
+def variable_to_dict(variable) -> dict:
+    """Plain dict for a TemplateVariable row or schema"""
+    return {field: getattr(variable, field, None) for field in VARIABLE_FIELDS}
+
+class _Rule:
+    __slots__ = ('key', 'label', 'required', 'dtype', 'regex', 'regex_source', 'enum', 'enum_set', 'enum_message')
+
+    def __init__(self, variable: dict):
+        self.key = variable.get('key')
+        self.label = variable.get('label')
+        self.required = variable.get('required', False)
+        self.dtype = variable.get('dtype', 'string')
+
+        self.regex_source = variable.get('regex')
+        self.regex = None
+        if self.regex_source:
+            try:
+                self.regex = re.compile(self.regex_source)
+            except re.error as e:
+                print(f"Ignoring invalid regex for {self.key}: {e}")
+
+        self.enum = variable.get('enum') or None
+        self.enum_set = None
+        self.enum_message = None
+        if self.enum:
+            self.enum_message = f"Must be one of: {', '.join(self.enum)}"
+            try:
+                self.enum_set = frozenset(self.enum)
+            except TypeError:
+                pass
+
+class AnswerValidator:
+    """
+    Validation rules for one set of variables, compiled once
+    Regexes are precompiled and enums become sets, so validating
+    many answer sets only pays the per-value checks
+    """
+
+    def __init__(self, variables: list):
+        self.rules = [_Rule(v) for v in variables]
+        self._keys = {str(rule.key).strip().lower(): rule.key for rule in self.rules if rule.key is not None}
+
+    def match_keys(self, answers: dict) -> dict:
+        """
+        Answers keyed by the variable keys they match case-insensitively, as when rendering
+        Keys that differ only by case resolve to the first one given, as in normalize_answers
+        """
+        matched = {}
+        for key, value in answers.items():
+            matched.setdefault(self._keys.get(str(key).strip().lower(), key), value)
+        return matched
+
+    def validate(self, answers: dict, check_required: bool = True) -> dict:
+        """
+        Returns dict with errors for invalid values
+        Answers are read the way the renderer reads them: keys match
+        case-insensitively and {"value": ...} dicts are unwrapped.
+        With check_required=False, unanswered required fields are not errors;
+        only the values that were given are checked (type, regex, enum)
+        """
+        errors = {}
+        answers = self.match_keys(answers)
+
+        for rule in self.rules:
+            key = rule.key
+            value = answer_value(answers.get(key))
+
+            # Check required fields
+            if check_required and rule.required and not value:
+                errors[key] = f"{rule.label} is required"
+                continue
+
+            if not value:
+                continue
+
+            # Validate data type
+            if rule.dtype == 'date':
+                if not DATE_PATTERN.match(str(value)):
+                    errors[key] = "Date must be in YYYY-MM-DD format"
+
+            elif rule.dtype == 'number':
+                try:
+                    float(value)
+                except (TypeError, ValueError):
+                    errors[key] = "Must be a valid number"
+
+            elif rule.dtype == 'email':
+                if not EMAIL_PATTERN.match(str(value)):
+                    errors[key] = "Must be a valid email address"
+
+            # Validate regex if provided
+            if rule.regex is not None and not rule.regex.match(str(value)):
+                errors[key] = f"Must match pattern: {rule.regex_source}"
+
+            # Validate enum if provided
+            if rule.enum:
+                try:
+                    allowed = value in rule.enum_set if rule.enum_set is not None else value in rule.enum
+                except TypeError:
+                    allowed = value in rule.enum
+                if not allowed:
+                    errors[key] = rule.enum_message
+
+        return errors
+
+    def validate_many(self, answer_sets: list, check_required: bool = True) -> list:
+        return [self.validate(answers, check_required) for answers in answer_sets]
+
+# Compiled validators per template, with a fingerprint of the rules they were built from
+_validator_cache = {}
+
+def _variables_fingerprint(variables: list) -> int:
+    return hash(tuple(
+        (v.get('key'), v.get('label'), v.get('required'), v.get('dtype'), v.get('regex'), tuple(v.get('enum') or ()))
+        for v in variables
+    ))
+
+def get_template_validator(template_id: str, variables: list) -> AnswerValidator:
+    """
+    Get the compiled validator for a template, rebuilding it only when the variables change
+    variables is a list of dicts (see variable_to_dict)
+    """
+    fingerprint = _variables_fingerprint(variables)
+    cached = _validator_cache.get(template_id)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    validator = AnswerValidator(variables)
+    _validator_cache[template_id] = (fingerprint, validator)
+    return validator
+
+def invalidate_template_validator(template_id: str):
+    _validator_cache.pop(template_id, None)
+
 def validate_answers(variables: list, answers: dict) -> dict:
     """
     Validate user answers against variable constraints
     Returns dict with errors for invalid values
     """
-    
-    errors = {}
-    
-    for variable in variables:
-        key = variable.get('key')
-        value = answers.get(key)
-        
-        # Check required fields
-        if variable.get('required', False) and not value:
-            errors[key] = f"{variable.get('label')} is required"
-            continue
-        
-        if not value:
-            continue
-        
-        # Validate data type
-        dtype = variable.get('dtype', 'string')
-        
-        if dtype == 'date':
-            # Validate ISO date format
-            if not re.match(r'^\d{4}-\d{2}-\d{2}$', str(value)):
-                errors[key] = "Date must be in YYYY-MM-DD format"
-        
-        elif dtype == 'number':
-            try:
-                float(value)
-            except ValueError:
-                errors[key] = "Must be a valid number"
-        
-        elif dtype == 'email':
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', str(value)):
-                errors[key] = "Must be a valid email address"
-        
-        # Validate regex if provided
-        if variable.get('regex'):
-            if not re.match(variable['regex'], str(value)):
-                errors[key] = f"Must match pattern: {variable['regex']}"
-        
-        # Validate enum if provided
-        if variable.get('enum'):
-            if value not in variable['enum']:
-                errors[key] = f"Must be one of: {', '.join(variable['enum'])}"
-    
-    return errors
+    return AnswerValidator(variables).validate(answers)
 
 def generate_template_id(title: str) -> str:
     """
@@ -0,0 +1,154 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in",
+    "is", "it", "me", "my", "need", "of", "on", "or", "our", "please", "the",
+    "this", "to", "want", "we", "with", "write", "draft", "create", "make"
+}
+
+# Repeat tokens from the more specific fields so they weigh more in BM25
+FIELD_WEIGHTS = {
+    "title": 3,
+    "doc_type": 2,
+    "jurisdiction": 2,
+    "similarity_tags": 2,
+    "description": 1,
+}
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+def _template_terms(template) -> Counter:
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(template, field, None)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        for token in tokenize(value):
+            terms[token] += weight
+    return terms
+
+class TemplateIndex:
+    """
+    In-memory BM25 index over template metadata
+    Used to prefilter match_template candidates before the LLM sees them
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = {}  # template_id -> Counter
+        self.doc_lengths = {}
+        self.postings = defaultdict(dict)  # term -> {template_id: tf}
+        self.total_length = 0
+        self.max_row_id = 0
+        self.version = 0  # Bumped on every catalog change
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, template):
+        """Add or replace a template in the index"""
+        terms = _template_terms(template)
+        with self._lock:
+            self._remove(template.template_id)
+            self.doc_terms[template.template_id] = terms
+            self.doc_lengths[template.template_id] = sum(terms.values())
+            self.total_length += self.doc_lengths[template.template_id]
+            for term, tf in terms.items():
+                self.postings[term][template.template_id] = tf
+            if template.id and template.id > self.max_row_id:
+                self.max_row_id = template.id
+            self.version += 1
+
+    def remove(self, template_id: str):
+        with self._lock:
+            if self._remove(template_id):
+                self.version += 1
+
+    def _remove(self, template_id: str) -> bool:
+        terms = self.doc_terms.pop(template_id, None)
+        if terms is None:
+            return False
+        self.total_length -= self.doc_lengths.pop(template_id)
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(template_id, None)
+                if not docs:
+                    del self.postings[term]
+        return True
+
+    def _new_rows_statement(self):
+        return select(
+            models.Template.id,
+            models.Template.template_id,
+            models.Template.title,
+            models.Template.description,
+            models.Template.doc_type,
+            models.Template.jurisdiction,
+            models.Template.similarity_tags
+        ).where(models.Template.id > self.max_row_id).order_by(models.Template.id)
+
+    def sync(self, db: Session):
+        """Index templates added since the last sync (including by other workers)"""
+        for row in db.execute(self._new_rows_statement()).all():
+            self.add(row)
+
+    async def sync_async(self, db: AsyncSession):
+        """sync() for an AsyncSession"""
+        for row in (await db.execute(self._new_rows_statement())).all():
+            self.add(row)
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Return up to k (template_id, score) pairs, best first"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.doc_terms)
+            if not n or not query_terms:
+                return []
+            avg_length = self.total_length / n
+
+            scores = defaultdict(float)
+            for term in query_terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for template_id, tf in docs.items():
+                    length = self.doc_lengths[template_id]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[template_id] += idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def lexical_confidence(self, query: str, results: list) -> float:
+        """
+        Confidence that the top result is the right one without asking the LLM
+        Combines query term coverage of the top template with its margin over the runner-up
+        """
+        query_terms = set(tokenize(query))
+        if not results or not query_terms:
+            return 0.0
+
+        top_id, top_score = results[0]
+        with self._lock:
+            top_terms = self.doc_terms.get(top_id, {})
+            coverage = sum(1 for t in query_terms if t in top_terms) / len(query_terms)
+
+        runner_up = results[1][1] / top_score if len(results) > 1 and top_score else 0.0
+        return round(coverage * (1 - runner_up / 2), 3)
+
+template_index = TemplateIndex()
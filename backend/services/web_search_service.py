@@ -1,69 +1,275 @@
-from exa_py import Exa
 from config import settings
+import asyncio
+import hashlib
 import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from services import metrics
 
-# Initialize Exa client (only if API key is provided)
-exa_client = None
-if settings.exa_api_key:
-    exa_client = Exa(api_key=settings.exa_api_key)
+# Max characters of text kept per result
+RESULT_TEXT_CHARS = 2000
 
-async def search_web_for_templates(query: str, num_results: int = 5) -> list:
+# One pass over the text: each alternative is handled by _clean_match
+CLEAN_PATTERN = re.compile(
+    r"(?P<block></?(?:p|div|br|li|tr|h[1-6])\b[^>]*>)"
+    r"|(?P<tag><[^>]+>)"
+    r"|(?P<newline>[^\S\n]*\n\s*)"
+    r"|(?P<space>[^\S\n]+)",
+    re.IGNORECASE
+)
+
+# Whole lines of site chrome; only lines that start with one of these words,
+# so legal text that merely mentions them ("The Subscriber agrees...") is kept
+NOISE_LINE_PATTERN = re.compile(
+    r"^[^\S\n]*(?:cookie policy|privacy policy|terms of service|subscribe|sign up)\b[^\n]*$\n?",
+    re.IGNORECASE | re.MULTILINE
+)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Query parameters that only track the click, dropped when comparing URLs
+TRACKING_PARAMS = ("utm_", "ref", "fbclid", "gclid")
+
+def _clean_match(match) -> str:
+    kind = match.lastgroup
+    if kind == "block":
+        return "\n"
+    if kind == "newline":
+        # Keep paragraph breaks, drop the indentation and blank runs around them
+        return "\n\n" if match.group().count("\n") > 1 else "\n"
+    if kind == "space":
+        return " "
+    return ""
+
+def clean_web_content(html_text: str) -> str:
     """
-    Use Exa.ai to search the web for similar legal documents
-    Returns list of documents with content
+    Clean fetched web content to extract only the legal document text
+    Remove navigation, ads, headers, footers, etc.
+    Tags and whitespace are handled in a single regex pass that keeps line
+    breaks; then lines that are only site chrome (cookie/privacy notices,
+    sign-up prompts) are dropped whole.
     """
-    
-    if not exa_client:
-        return []
-    
-    try:
-        # Enhance query for legal document search
-        search_query = f"legal template {query} format example"
-        
-        # Search with Exa
-        results = exa_client.search_and_contents(
-            search_query,
+    text = CLEAN_PATTERN.sub(_clean_match, html_text or "")
+    text = NOISE_LINE_PATTERN.sub("", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for de-duplication"""
+    parts = urlsplit((url or "").strip())
+    query = urlencode([
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+def content_hash(text: str) -> str:
+    normalized = WHITESPACE_PATTERN.sub(" ", (text or "").lower()).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def dedupe_results(documents: list) -> list:
+    """Drop results whose URL or content was already seen, keeping the first (best ranked)"""
+    seen_urls, seen_hashes = set(), set()
+    unique = []
+    for document in documents:
+        url = normalize_url(document.get("url"))
+        digest = content_hash(document.get("text"))
+        if url in seen_urls or digest in seen_hashes:
+            continue
+        seen_urls.add(url)
+        seen_hashes.add(digest)
+        unique.append(document)
+    return unique
+
+class SearchBackend:
+    """
+    Base class for web search backends
+    Backends return raw results as dicts with title, url, text and published_date;
+    the client handles concurrency, timeouts, caching and cleanup
+    """
+
+    name = ""
+
+    async def search(self, query: str, num_results: int) -> list:
+        raise NotImplementedError
+
+class ExaBackend(SearchBackend):
+    """Exa.ai neural search; the SDK is synchronous, so calls run in a worker thread"""
+
+    name = "exa"
+
+    def __init__(self, api_key: str):
+        self._api_key = api_key
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            # Imported on first use, only when a key is configured
+            from exa_py import Exa
+            self._client = Exa(api_key=self._api_key)
+        return self._client
+
+    def _search(self, query: str, num_results: int) -> list:
+        results = self._get_client().search_and_contents(
+            query,
             type="neural",
             num_results=num_results,
             text=True
         )
-        
-        documents = []
-        for result in results.results:
-            documents.append({
+        return [
+            {
                 "title": result.title,
                 "url": result.url,
-                "text": result.text[:2000],  # Limit text length
-                "published_date": result.published_date if hasattr(result, 'published_date') else None
-            })
-        
+                "text": result.text or "",
+                "published_date": getattr(result, "published_date", None)
+            }
+            for result in results.results
+        ]
+
+    async def search(self, query: str, num_results: int) -> list:
+        if not self._api_key:
+            return []
+        return await asyncio.to_thread(self._search, query, num_results)
+
+class StubSearchBackend(SearchBackend):
+    """
+    Offline backend with deterministic results for each query
+    Used for load testing and local development without network access
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency = latency_ms / 1000
+
+    async def search(self, query: str, num_results: int) -> list:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+        return [
+            {
+                "title": f"Sample template {i + 1}",
+                "url": f"https://example.com/templates/{slug}/{i + 1}",
+                "text": f"<h1>Sample template {i + 1}</h1>\n<p>This agreement is made between {{{{party_a}}}} "
+                        f"and {{{{party_b}}}} for: {query}.</p>\nPrivacy Policy | Terms of Service",
+                "published_date": None
+            }
+            for i in range(num_results)
+        ]
+
+def _build_backend() -> SearchBackend:
+    if settings.web_search_backend == "stub":
+        return StubSearchBackend(settings.web_search_stub_latency_ms)
+    if settings.web_search_backend == "exa":
+        return ExaBackend(settings.exa_api_key)
+    raise ValueError(f"Unknown web search backend: {settings.web_search_backend}")
+
+class WebSearchClient:
+    """
+    Shared client for web searches
+    Caps concurrent searches, applies a timeout and caches cleaned, de-duplicated
+    results per query for ttl_seconds. Failed searches are not cached.
+    """
+
+    def __init__(
+        self,
+        backend: SearchBackend,
+        max_concurrency: int = 4,
+        timeout: float = 20.0,
+        ttl_seconds: int = 3600,
+        cache_entries: int = 256
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.ttl = ttl_seconds
+        self.cache_entries = cache_entries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache = OrderedDict()  # (query, num_results) -> (documents, created_at)
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: tuple):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] >= self.ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _cache_set(self, key: tuple, documents: list):
+        with self._lock:
+            self._cache[key] = (documents, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    async def search(self, query: str, num_results: int = 5) -> list:
+        """Cleaned, de-duplicated results; an empty list if the search fails"""
+        key = (WHITESPACE_PATTERN.sub(" ", query.lower()).strip(), num_results)
+        cached = self._cache_get(key)
+        metrics.web_search_cache_lookups.inc("miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        service = self.backend.name
+        metrics.outbound_request_chars.observe(len(query), service, "search_web_for_templates")
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                raw = await asyncio.wait_for(self.backend.search(query, num_results), timeout=self.timeout)
+            except Exception as e:
+                metrics.outbound_call_errors.inc(service, "search_web_for_templates")
+                print(f"Error searching web: {e}")
+                return []
+            finally:
+                metrics.outbound_call_duration.observe(time.perf_counter() - start, service, "search_web_for_templates")
+
+        documents = dedupe_results([
+            {**result, "text": clean_web_content(result.get("text"))[:RESULT_TEXT_CHARS]}
+            for result in raw
+        ])
+        metrics.outbound_response_chars.observe(
+            sum(len(d["text"]) for d in documents), service, "search_web_for_templates"
+        )
+        self._cache_set(key, documents)
         return documents
-    except Exception as e:
-        print(f"Error searching web: {e}")
-        return []
 
-def clean_web_content(html_text: str) -> str:
+_client = None
+
+def get_web_search_client() -> WebSearchClient:
+    """Get the shared web search client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = WebSearchClient(
+            _build_backend(),
+            max_concurrency=settings.web_search_max_concurrency,
+            timeout=settings.web_search_timeout_seconds,
+            ttl_seconds=settings.web_search_cache_ttl_seconds,
+            cache_entries=settings.web_search_cache_entries
+        )
+    return _client
+
+def set_search_backend(backend: SearchBackend) -> WebSearchClient:
+    """Swap the backend of the shared client (e.g. a stub for tests)"""
+    client = get_web_search_client()
+    client.backend = backend
+    client.clear_cache()
+    return client
+
+async def search_web_for_templates(query: str, num_results: int = 5) -> list:
     """
-    Clean fetched web content to extract only the legal document text
-    Remove navigation, ads, headers, footers, etc.
+    Use Exa.ai to search the web for similar legal documents
+    Returns list of documents with content
     """
-    
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', html_text)
-    
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Remove common web noise
-    noise_patterns = [
-        r'Cookie Policy.*?(?=\n|$)',
-        r'Privacy Policy.*?(?=\n|$)',
-        r'Terms of Service.*?(?=\n|$)',
-        r'Subscribe.*?(?=\n|$)',
-        r'Sign up.*?(?=\n|$)',
-    ]
-    
-    for pattern in noise_patterns:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-    
-    return text
+
+    # Enhance query for legal document search
+    search_query = f"legal template {query} format example"
+    return await get_web_search_client().search(search_query, num_results)
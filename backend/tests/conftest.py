@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Settings are read at import time, so point everything at a scratch directory
+# and the offline backends before any app module is imported
+_scratch = tempfile.mkdtemp(prefix="legal_templates_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch}/test.db")
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("WEB_SEARCH_BACKEND", "stub")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_RETRY_BACKOFF_SECONDS", "0")
+os.environ.setdefault("LLM_CACHE_PATH", f"{_scratch}/llm_cache.db")
+os.environ.setdefault("EMBEDDING_INDEX_DIR", f"{_scratch}/embedding_index")
+os.environ.setdefault("INGEST_STORAGE_DIR", f"{_scratch}/ingest_uploads")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its lifespan (schema, workers) running, against the scratch database"""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def counting_llm():
+    """The stub LLM backend, counting calls per task"""
+    from collections import Counter
+    from services.llm_client import StubBackend, get_llm_client
+
+    class CountingBackend(StubBackend):
+        def __init__(self):
+            super().__init__()
+            self.calls = Counter()
+
+        async def generate(self, prompt: str, task: str) -> str:
+            self.calls[task] += 1
+            return await super().generate(prompt, task)
+
+    llm = get_llm_client()
+    original = llm.backend
+    llm.backend = CountingBackend()
+    yield llm.backend
+    llm.backend = original
+
+@pytest.fixture
+def response_cache(tmp_path, monkeypatch):
+    """An empty LLM response cache, enabled for this test"""
+    from config import settings
+    from services import llm_cache
+    cache = llm_cache.LLMResponseCache(str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    return cache
@@ -0,0 +1,87 @@
+import asyncio
+import io
+import os
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from starlette.datastructures import UploadFile
+from services import document_processor
+from services.document_processor import spool_upload, extract_text, FileTooLargeError, DOCX_MIME_TYPE
+
+def _docx_path(tmp_path, text: str) -> str:
+    from docx import Document
+    path = str(tmp_path / "sample.docx")
+    document = Document()
+    document.add_paragraph(text)
+    document.save(path)
+    return path
+
+def test_spool_upload_writes_a_temp_file_and_hashes_it():
+    upload, digest = asyncio.run(spool_upload(UploadFile(io.BytesIO(b"abc" * 1000), filename="a.pdf")))
+    with upload:
+        with open(upload.path, "rb") as f:
+            assert f.read() == b"abc" * 1000
+        assert upload.size == 3000
+    assert not os.path.exists(upload.path)
+    assert len(digest) == 64
+
+def test_spool_upload_enforces_the_limit_and_cleans_up(monkeypatch):
+    created = []
+    real_mkstemp = document_processor.tempfile.mkstemp
+
+    def mkstemp(**kwargs):
+        fd, path = real_mkstemp(**kwargs)
+        created.append(path)
+        return fd, path
+
+    monkeypatch.setattr(document_processor.tempfile, "mkstemp", mkstemp)
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(spool_upload(UploadFile(io.BytesIO(b"x" * 2048), filename="a.pdf"), max_bytes=1024))
+    assert created and not os.path.exists(created[0])
+
+def test_extract_text_parses_by_path_in_the_pool(tmp_path):
+    path = _docx_path(tmp_path, "Notice to the insurer")
+    try:
+        assert asyncio.run(extract_text(path, DOCX_MIME_TYPE)) == "Notice to the insurer"
+    finally:
+        document_processor.shutdown_parse_pool()
+
+class BrokenPool:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, **kwargs):
+        pass
+
+def test_broken_parse_pool_is_replaced(monkeypatch, tmp_path):
+    broken = BrokenPool()
+    monkeypatch.setattr(document_processor, "_parse_pool", broken)
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(extract_text(_docx_path(tmp_path, "x"), DOCX_MIME_TYPE))
+    assert document_processor._parse_pool is None
+
+def test_oversized_upload_is_rejected_from_content_length(client, monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, "max_file_size_mb", 1)
+    response = client.post(
+        "/documents/upload",
+        files={"file": ("big.pdf", b"x" * (2 * 1024 * 1024), "application/pdf")}
+    )
+    assert response.status_code == 413
+
+def test_oversized_chunked_upload_is_rejected_while_streaming(client, monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, "max_file_size_mb", 1)
+    boundary = "b0undary"
+
+    def body():
+        yield f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\nContent-Type: application/pdf\r\n\r\n".encode()
+        for _ in range(40):
+            yield b"x" * 64 * 1024
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/documents/upload",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
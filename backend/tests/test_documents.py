@@ -0,0 +1,130 @@
+import time
+import pytest
+from docx import Document as DocxDocument
+from sqlalchemy import create_engine, inspect, text
+from database import add_missing_columns, async_engine, SessionLocal
+from services.llm_client import LLMBackend, StubBackend, get_llm_client
+import models
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+class DownBackend(LLMBackend):
+    model_name = "down"
+
+    async def generate(self, prompt: str, task: str) -> str:
+        raise TimeoutError("LLM unavailable")
+
+@pytest.fixture
+def llm_down():
+    client = get_llm_client()
+    original = client.backend
+    client.backend = DownBackend()
+    yield
+    client.backend = original
+
+def _docx_bytes(tmp_path, text: str) -> bytes:
+    path = tmp_path / "upload.docx"
+    document = DocxDocument()
+    document.add_paragraph(text)
+    document.save(str(path))
+    return path.read_bytes()
+
+def _upload(client, content: bytes, endpoint: str = "/documents/upload", **params):
+    return client.post(endpoint, params=params, files={"file": ("notice.docx", content, DOCX_MIME_TYPE)})
+
+def test_upload_after_failed_extraction_extracts_again(client, tmp_path):
+    content = _docx_bytes(tmp_path, "Notice of claim under policy 3344 after an outage")
+    llm = get_llm_client()
+    original = llm.backend
+    llm.backend = DownBackend()
+    try:
+        assert _upload(client, content).status_code == 503
+    finally:
+        llm.backend = original
+
+    with SessionLocal() as db:
+        assert db.query(models.Document).filter(models.Document.raw_text.contains("3344")).count() == 0
+
+    response = _upload(client, content)
+    assert response.status_code == 200
+    assert response.json()["cached"] is False
+    assert _upload(client, content).json()["cached"] is True
+
+def test_ingestion_job_is_retried_when_extraction_fails(client, tmp_path, llm_down):
+    content = _docx_bytes(tmp_path, "Notice of claim under policy 5566 for the queue")
+    job = _upload(client, content, "/documents/ingest").json()
+    for _ in range(100):
+        job = client.get(f"/documents/jobs/{job['job_id']}").json()
+        if job["attempts"] and job["error"]:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "queued"
+    assert job["document_id"] is None
+    assert "chunks" in job["error"]
+
+def test_add_missing_columns_upgrades_an_existing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE documents (id INTEGER PRIMARY KEY, filename VARCHAR, mime_type VARCHAR, "
+            "raw_text TEXT, embedding JSON, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO documents (filename) VALUES ('old.pdf')"))
+
+    add_missing_columns(engine)
+    add_missing_columns(engine)  # Idempotent
+
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("documents")}
+    assert {"content_hash", "variables"} <= columns
+    assert "ix_documents_content_hash" in {index["name"] for index in inspector.get_indexes("documents")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT filename, content_hash FROM documents")).all() == [("old.pdf", None)]
+
+def test_force_reextract_asks_the_llm_again(client, tmp_path, counting_llm, response_cache):
+    content = _docx_bytes(tmp_path, "Notice of claim under policy 7788 to re-extract")
+    assert _upload(client, content).status_code == 200
+    assert counting_llm.calls["extract_variables"] == 1
+
+    # Same bytes: the stored document, no LLM call
+    assert _upload(client, content).json()["cached"] is True
+    assert counting_llm.calls["extract_variables"] == 1
+
+    response = _upload(client, content, force_reextract=True)
+    assert response.status_code == 200
+    assert response.json()["cached"] is False
+    assert counting_llm.calls["extract_variables"] == 2
+
+def test_forced_ingestion_job_skips_the_response_cache(client, tmp_path, counting_llm, response_cache):
+    content = _docx_bytes(tmp_path, "Notice of claim under policy 9900 for a forced job")
+    assert _upload(client, content).status_code == 200
+    job = _upload(client, content, "/documents/ingest", force_reextract=True).json()
+    for _ in range(100):
+        job = client.get(f"/documents/jobs/{job['job_id']}").json()
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded"
+    assert counting_llm.calls["extract_variables"] == 2
+
+class PoolWatchingBackend(StubBackend):
+    """Records how many pooled connections are checked out while the LLM works"""
+
+    def __init__(self):
+        super().__init__()
+        self.checked_out = []
+
+    async def generate(self, prompt: str, task: str) -> str:
+        self.checked_out.append(async_engine.pool.checkedout())
+        return await super().generate(prompt, task)
+
+def test_upload_holds_no_connection_during_extraction(client, tmp_path):
+    content = _docx_bytes(tmp_path, "Notice of claim under policy 4455 while the pool is watched")
+    llm = get_llm_client()
+    original = llm.backend
+    llm.backend = backend = PoolWatchingBackend()
+    try:
+        assert _upload(client, content).status_code == 200
+    finally:
+        llm.backend = original
+    assert backend.checked_out == [0]
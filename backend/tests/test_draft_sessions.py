@@ -0,0 +1,76 @@
+from services.draft_sessions import merge_answers
+from services.template_engine import AnswerValidator, DraftRenderState, parse_template
+
+BODY = "Dear {{name}}, your claim of {{Claim_Amount}} under {{policy}} for {{name}}."
+
+def _apply_edits(text: str, edits: list) -> str:
+    for edit in reversed(edits):
+        text = text[:edit["start"]] + edit["text"] + text[edit["end"]:]
+    return text
+
+def test_apply_returns_edits_against_the_previous_draft():
+    state = DraftRenderState(parse_template(BODY), {"name": "Asha", "claim_amount": 5000})
+    before = state.render()
+    assert before == "Dear Asha, your claim of 5000 under {{policy}} for Asha."
+
+    edits = state.apply({"NAME": "Ravi Kumar", "policy": "POL-1"})
+    assert edits == [
+        {"start": 5, "end": 9, "text": "Ravi Kumar"},
+        {"start": 36, "end": 46, "text": "POL-1"},
+        {"start": 51, "end": 55, "text": "Ravi Kumar"},
+    ]
+    assert _apply_edits(before, edits) == state.render()
+    assert len(state) == len(state.render())
+    assert state.missing == []
+
+def test_apply_clears_answers_and_skips_unchanged_slots():
+    state = DraftRenderState(parse_template(BODY), {"name": "Asha", "claim_amount": 5000})
+    before = state.render()
+    assert state.apply({"name": "Asha", "unknown": "x"}) == []
+
+    edits = state.apply({"Claim_Amount": None})
+    assert edits == [{"start": 25, "end": 29, "text": "{{Claim_Amount}}"}]
+    assert _apply_edits(before, edits) == state.render()
+    assert state.missing == ["claim_amount", "policy"]
+
+def test_merge_answers_replaces_keys_case_insensitively():
+    assert merge_answers({"Name": "Asha", "city": "Pune"}, {"NAME": "Ravi", "city": None}) == {"NAME": "Ravi"}
+
+def test_validator_matches_keys_case_insensitively():
+    validator = AnswerValidator([{"key": "claim_amount", "label": "Claim amount", "required": True, "dtype": "number"}])
+    answers = validator.match_keys({"Claim_Amount": "abc", "other": 1})
+    assert answers == {"claim_amount": "abc", "other": 1}
+    assert validator.validate(answers) == {"claim_amount": "Must be a valid number"}
+
+def _variable(key: str, **values) -> dict:
+    return {"key": key, "label": key.replace("_", " ").title(), "description": "", "example": "", **values}
+
+def test_patch_accepts_answer_keys_in_any_case(client):
+    response = client.post("/templates/", json={
+        "template_id": "tpl_session_keys",
+        "title": "Claim notice",
+        "description": "",
+        "doc_type": "notice",
+        "jurisdiction": "IN",
+        "similarity_tags": [],
+        "body_md": "Claim of {{claim_amount}} by {{name}}",
+        "variables": [_variable("claim_amount", required=True, dtype="number"), _variable("name", required=True)],
+    })
+    assert response.status_code == 200
+
+    session = client.post("/drafts/sessions", json={"template_id": "tpl_session_keys", "answers": {"name": "Asha"}})
+    assert session.status_code == 201
+    session_id = session.json()["session_id"]
+
+    response = client.patch(f"/drafts/sessions/{session_id}", json={"answers": {"Claim_Amount": "5000"}})
+    assert response.status_code == 200
+    assert response.json()["edits"] == [{"start": 9, "end": 25, "text": "5000"}]
+
+    response = client.patch(f"/drafts/sessions/{session_id}", json={"answers": {"CLAIM_AMOUNT": "lots"}})
+    assert response.status_code == 422
+    assert response.json()["errors"] == {"claim_amount": "Must be a valid number"}
+
+    response = client.get(f"/drafts/sessions/{session_id}")
+    assert response.json()["draft_md"] == "Claim of 5000 by Asha"
+    assert response.json()["revision"] == 2
+    assert client.get("/drafts/sessions/999999").status_code == 404
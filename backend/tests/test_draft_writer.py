@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from config import settings
+from database import Base
+from services import draft_writer as draft_writer_module
+from services.draft_writer import DraftWriteBatcher, batching_enabled
+import models
+
+def _row(i: int, **extra) -> dict:
+    return {"template_id": None, "user_query": "", "answers_json": {"i": i}, "draft_md": f"draft {i}", **extra}
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "writer.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return path
+
+def _run(db_path, rows: list, max_batch: int = 100):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        batcher = DraftWriteBatcher(
+            max_batch=max_batch,
+            max_delay_ms=20,
+            session_factory=async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        )
+        results = await asyncio.gather(*(batcher.submit(row) for row in rows), return_exceptions=True)
+        await batcher.close()
+        async with engine.connect() as conn:
+            count = (await conn.execute(select(func.count(models.DraftInstance.id)))).scalar()
+        await engine.dispose()
+        return results, count
+    return asyncio.run(run())
+
+def test_concurrent_submits_share_transactions_and_get_their_ids(db_path):
+    results, count = _run(db_path, [_row(i) for i in range(25)], max_batch=10)
+    assert count == 25
+    assert sorted(results) == list(range(1, 26))
+    assert results == sorted(results)
+
+def test_a_failing_row_only_fails_its_own_caller(db_path):
+    rows = [_row(0), {**_row(1), "answers_json": {"not json": {1, 2}}}, _row(2)]
+    results, count = _run(db_path, rows)
+    assert isinstance(results[1], Exception)
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    assert count == 2
+
+def test_batching_defaults_to_sqlite_only(monkeypatch):
+    monkeypatch.setattr(settings, "draft_write_batching", None)
+    monkeypatch.setattr(draft_writer_module, "IS_SQLITE", False)
+    assert batching_enabled() is False
+    monkeypatch.setattr(draft_writer_module, "IS_SQLITE", True)
+    assert batching_enabled() is True
+    monkeypatch.setattr(settings, "draft_write_batching", False)
+    assert batching_enabled() is False
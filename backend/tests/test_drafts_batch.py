@@ -0,0 +1,104 @@
+import asyncio
+import io
+import json
+import zipfile
+import pytest
+from routers import drafts
+
+@pytest.fixture(scope="module")
+def batch_template(client):
+    response = client.post("/templates/", json={
+        "template_id": "tpl_batch", "title": "Batch notice", "description": "d", "jurisdiction": "IN",
+        "doc_type": "notice", "similarity_tags": [], "body_md": "{{name}} in {{forum}}",
+        "variables": [
+            {"key": "name", "label": "Name", "description": "d", "example": "Asha", "required": True},
+            {"key": "forum", "label": "Forum", "description": "d", "example": "state", "enum": ["district", "state"]},
+        ]
+    })
+    assert response.status_code == 200, response.text
+    return "tpl_batch"
+
+def _results(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_jsonl_rows_are_rendered_validated_and_reported(client, batch_template):
+    body = "\n".join([
+        json.dumps({"name": "Asha", "forum": "state"}),
+        json.dumps({"answers": {"forum": "district"}, "user_query": "q"}),
+        json.dumps({"name": "Ravi", "forum": "supreme"}),
+        "{not json}",
+        "[1, 2]",
+    ])
+    response = client.post("/drafts/batch", params={"template_id": batch_template, "batch_size": 2}, content=body)
+    results = _results(response)
+    assert [r["row"] for r in results] == [1, 2, 3, 4, 5]
+    assert results[0]["draft_md"] == "Asha in state" and results[0]["instance_id"]
+    assert results[1]["draft_md"] == "{{name}} in district" and results[1]["missing_variables"] == ["name"]
+    assert results[2]["errors"] == {"forum": "Must be one of: district, state"}
+    assert results[3]["error"].startswith("Invalid JSON")
+    assert results[4]["error"] == "Each row must be a JSON object"
+
+def test_skip_validation_renders_invalid_rows(client, batch_template):
+    body = json.dumps({"name": "Ravi", "forum": "supreme"})
+    response = client.post("/drafts/batch", params={"template_id": batch_template, "skip_validation": True}, content=body)
+    assert _results(response)[0]["draft_md"] == "Ravi in supreme"
+
+def test_unreadable_csv_ends_with_an_error_record(client, batch_template):
+    body = b"name,forum\nAsha,state\n" + b"Ravi,district\n" * 3000 + b"Bad \xff name,state\n"
+    response = client.post(
+        "/drafts/batch", params={"template_id": batch_template, "input_format": "csv"}, content=body
+    )
+    assert response.status_code == 200
+    results = _results(response)
+    assert results[0]["draft_md"] == "Asha in state"
+    assert "Could not read input" in results[-1]["error"]
+    assert all("error" not in r for r in results[:-1])
+
+def test_zip_output_has_drafts_and_manifest(client, batch_template):
+    body = b"name,forum\nAsha,state\nRavi,supreme\n"
+    response = client.post(
+        "/drafts/batch",
+        params={"template_id": batch_template, "input_format": "csv", "output": "zip"},
+        content=body
+    )
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.read("draft_000001.md") == b"Asha in state"
+    manifest = [json.loads(line) for line in archive.read("manifest.ndjson").splitlines()]
+    assert [m["row"] for m in manifest] == [1, 2] and "errors" in manifest[1]
+
+def test_rows_are_rendered_off_the_event_loop(client, batch_template, monkeypatch):
+    on_loop = []
+    render_plan = drafts.render_plan
+
+    def recording_render_plan(plan, answers):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return render_plan(plan, answers)
+
+    monkeypatch.setattr(drafts, "render_plan", recording_render_plan)
+    client.post("/drafts/batch", params={"template_id": batch_template}, content=json.dumps({"name": "A"}))
+    assert on_loop == [False]
+
+def test_zip_entries_are_compressed_off_the_event_loop(client, batch_template, monkeypatch):
+    on_loop = []
+    writestr = zipfile.ZipFile.writestr
+
+    def recording_writestr(archive, name, data, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return writestr(archive, name, data, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile.ZipFile, "writestr", recording_writestr)
+    response = client.post(
+        "/drafts/batch",
+        params={"template_id": batch_template, "input_format": "csv", "output": "zip"},
+        content=b"name,forum\nAsha,state\nRavi,district\n"
+    )
+    assert zipfile.ZipFile(io.BytesIO(response.content)).read("draft_000002.md") == b"Ravi in district"
+    assert on_loop == [False, False]
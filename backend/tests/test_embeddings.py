@@ -0,0 +1,94 @@
+import asyncio
+from sqlalchemy import create_engine, text
+from database import AsyncSessionLocal, SessionLocal
+from services.embeddings import DocumentEmbeddingIndex, embed_text, from_blob, migrate_embedding_column, to_blob
+import models
+
+DIM = 64
+
+def _vector(text_content: str):
+    return embed_text(text_content, DIM)
+
+def test_embeddings_round_trip_and_are_normalized():
+    vector = _vector("policy claim rejected by the insurer")
+    assert abs(float((vector * vector).sum()) - 1.0) < 1e-5
+    assert (from_blob(to_blob(vector)) == vector).all()
+    assert not _vector("").any()
+
+def test_similar_ranks_by_cosine_and_skips_duplicates(tmp_path):
+    index = DocumentEmbeddingIndex(str(tmp_path), DIM)
+    index.append([
+        (1, _vector("fire insurance claim for the warehouse")),
+        (2, _vector("fire insurance claim for the shop")),
+        (3, _vector("tenancy agreement for a flat")),
+    ])
+    index.append([(2, _vector("something else"))])
+    assert len(index) == 3
+    assert [doc_id for doc_id, _ in index.similar(1, k=2)] == [2, 3]
+    assert index.similar(99) == []
+
+    # Another worker's index sees the rows through the files
+    assert len(DocumentEmbeddingIndex(str(tmp_path), DIM)) == 3
+
+def _add_documents(texts: list) -> list:
+    with SessionLocal() as db:
+        documents = [models.Document(filename=f"doc{i}.txt", raw_text=t) for i, t in enumerate(texts)]
+        db.add_all(documents)
+        db.commit()
+        return [d.id for d in documents]
+
+async def _sync(index):
+    async with AsyncSessionLocal() as db:
+        await index.sync_async(db)
+
+def test_sync_indexes_documents_older_than_the_newest_indexed(tmp_path, client):
+    older = _add_documents(["older lease deed", "older sale deed"])
+    newest = _add_documents(["newest gift deed"])[0]
+    index = DocumentEmbeddingIndex(str(tmp_path), DIM)
+    # An upload appends its own row before any sync has run
+    index.append([(newest, _vector("newest gift deed"))])
+
+    asyncio.run(_sync(index))
+
+    assert set(older) <= set(index.positions)
+    with SessionLocal() as db:
+        stored = db.get(models.Document, older[0]).embedding
+    assert (from_blob(stored) == _vector("older lease deed")).all()
+
+def test_old_json_embeddings_are_cleared_and_re_embedded(tmp_path, client):
+    [doc_id] = _add_documents(["legacy consumer complaint"])
+    with SessionLocal() as db:
+        db.execute(text("UPDATE documents SET embedding = '[0.1, 0.2]' WHERE id = :id"), {"id": doc_id})
+        db.commit()
+        migrate_embedding_column(db.get_bind())
+        assert db.execute(text("SELECT embedding FROM documents WHERE id = :id"), {"id": doc_id}).scalar() is None
+
+    index = DocumentEmbeddingIndex(str(tmp_path), DIM)
+    asyncio.run(_sync(index))
+    assert doc_id in index.positions
+
+def test_migrate_embedding_column_without_documents_table(tmp_path):
+    migrate_embedding_column(create_engine(f"sqlite:///{tmp_path}/empty.db"))
+
+def _add_embedded_documents(texts: list) -> list:
+    with SessionLocal() as db:
+        documents = [
+            models.Document(filename=f"doc{i}.txt", raw_text=t, embedding=to_blob(_vector(t)))
+            for i, t in enumerate(texts)
+        ]
+        db.add_all(documents)
+        db.commit()
+        return [d.id for d in documents]
+
+def test_sync_only_reads_documents_above_the_newest_indexed(tmp_path, client):
+    [skipped, indexed] = _add_embedded_documents(["stored lease deed", "indexed sale deed"])
+    index = DocumentEmbeddingIndex(str(tmp_path), DIM)
+    index.append([(indexed, _vector("indexed sale deed"))])
+    [added] = _add_embedded_documents(["later gift deed"])
+
+    asyncio.run(_sync(index))
+
+    # Embedded documents below the newest indexed id aren't read again
+    assert skipped not in index.positions
+    assert added in index.positions
+    assert index.max_row_id == added
@@ -0,0 +1,140 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from database import Base
+from services import ingestion
+from services.ingestion import IngestionQueue, QUEUED, RUNNING, SUCCEEDED, FAILED
+import models
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+@pytest.fixture
+def queue_db(tmp_path):
+    """A database of its own, so the app's running workers don't claim these jobs"""
+    path = tmp_path / "queue.db"
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    return async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{path}"), class_=AsyncSession, expire_on_commit=False
+    )
+
+@pytest.fixture
+def queue(tmp_path, queue_db):
+    return IngestionQueue(
+        str(tmp_path / "uploads"), max_attempts=3, backoff=0, job_timeout=5, lease_margin=30,
+        session_factory=queue_db
+    )
+
+async def _add_job(sessions, **values) -> int:
+    now = datetime.utcnow()
+    defaults = dict(
+        filename="notice.docx", mime_type=DOCX_MIME_TYPE, content_hash="abc", status=QUEUED,
+        attempts=0, max_attempts=3, next_attempt_at=now, created_at=now, updated_at=now
+    )
+    async with sessions() as db:
+        job = models.IngestionJob(**{**defaults, **values})
+        db.add(job)
+        await db.commit()
+        return job.id
+
+async def _job(sessions, job_id: int):
+    async with sessions() as db:
+        return await db.get(models.IngestionJob, job_id)
+
+async def _document_count(sessions) -> int:
+    async with sessions() as db:
+        return (await db.execute(select(func.count(models.Document.id)))).scalar()
+
+def test_lease_outlasts_the_job_timeout(queue):
+    now = datetime(2024, 1, 1)
+    assert queue.lease_expiry(now) == now + timedelta(seconds=35)
+
+def test_claims_due_and_expired_jobs_only(queue_db, queue):
+    async def run():
+        now = datetime.utcnow()
+        later = await _add_job(queue_db, next_attempt_at=now + timedelta(hours=1))
+        due = await _add_job(queue_db)
+        live = await _add_job(queue_db, status=RUNNING, attempts=1, lease_expires_at=now + timedelta(hours=1))
+        expired = await _add_job(queue_db, status=RUNNING, attempts=1, lease_expires_at=now - timedelta(seconds=1))
+        done = await _add_job(queue_db, status=SUCCEEDED)
+
+        claimed = [(await queue._claim()) for _ in range(3)]
+        assert [job.id for job in claimed[:2]] == [due, expired]
+        assert claimed[2] is None
+        assert [job.attempts for job in claimed[:2]] == [1, 2]
+        assert claimed[0].lease_expires_at > now + timedelta(seconds=30)
+        assert queue._running_jobs == {due, expired}
+        for job_id, status in ((later, QUEUED), (live, RUNNING), (done, SUCCEEDED)):
+            assert (await _job(queue_db, job_id)).status == status
+
+    asyncio.run(run())
+
+def _stored_upload(queue, content_hash: str = "abc"):
+    os.makedirs(queue.storage_dir, exist_ok=True)
+    with open(queue._path(content_hash), "wb") as f:
+        f.write(b"docx")
+
+def test_stop_after_the_document_is_saved_does_not_requeue(queue_db, queue, monkeypatch):
+    async def prepare(filename, mime_type, path, content_hash, use_cache=True):
+        return models.Document(filename=filename, raw_text="text", content_hash=content_hash), None
+
+    class CancelledIndex:
+        def append(self, rows):
+            # Shutdown arrives right after the document and the job were committed
+            raise asyncio.CancelledError()
+
+    monkeypatch.setattr(ingestion, "prepare_document", prepare)
+    monkeypatch.setattr(ingestion, "get_document_index", lambda: CancelledIndex())
+    _stored_upload(queue)
+
+    async def run():
+        job_id = await _add_job(queue_db)
+        job = await queue._claim()
+        with pytest.raises(asyncio.CancelledError):
+            await queue._process(job)
+        await queue.stop()
+
+        job = await _job(queue_db, job_id)
+        assert job.status == SUCCEEDED
+        assert job.document_id is not None
+        assert await _document_count(queue_db) == 1
+
+    asyncio.run(run())
+
+def test_broken_parser_pool_is_retried(queue_db, queue, monkeypatch):
+    async def broken(path, content_type):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(ingestion, "extract_text", broken)
+    _stored_upload(queue)
+    queue.backoff = 60
+
+    async def run():
+        job_id = await _add_job(queue_db)
+        await queue._process(await queue._claim())
+        job = await _job(queue_db, job_id)
+        assert job.status == QUEUED
+        assert "worker died" in job.error
+
+        await _add_job(queue_db, content_hash="bad")
+        _stored_upload(queue, "bad")
+        monkeypatch.setattr(ingestion, "extract_text", _unparseable)
+        failed = await queue._claim()
+        await queue._process(failed)
+        assert (await _job(queue_db, failed.id)).status == FAILED
+
+    asyncio.run(run())
+
+async def _unparseable(path, content_type):
+    raise KeyError("word/document.xml")
+
+def test_upload_reports_a_broken_parser_pool_as_unavailable(client, monkeypatch):
+    async def broken(path, content_type):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(ingestion, "extract_text", broken)
+    response = client.post("/documents/upload", files={"file": ("notice.docx", b"docx", DOCX_MIME_TYPE)})
+    assert response.status_code == 503
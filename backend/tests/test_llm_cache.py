@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from services import llm_client
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient, LLMBackend
+
+class CountingBackend(LLMBackend):
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt: str, task: str) -> str:
+        self.calls += 1
+        return f"response {self.calls}"
+
+def _cache(tmp_path, **kwargs):
+    return LLMResponseCache(str(tmp_path / "cache.db"), **kwargs)
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = _cache(tmp_path, memory_entries=1)
+    cache.set("task", "m", "first  prompt", "a")
+    cache.set("task", "m", "second prompt", "b")
+
+    # Whitespace is normalized; "first" was pushed out of memory but is still on disk
+    assert cache.get_from_memory("task", "m", "first prompt") is None
+    assert cache.get_from_disk("task", "m", "first prompt") == "a"
+    assert cache.get_from_memory("task", "m", "first prompt") == "a"
+    assert cache.get("task", "m", "unknown") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = _cache(tmp_path, ttl_seconds=0)
+    cache.set("task", "m", "p", "a")
+    assert cache.get("task", "m", "p") is None
+
+def test_invalidate_drops_one_namespace(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("extract", "m", "p1", "a")
+    cache.set("questions", "m", "p2", "b")
+    cache.invalidate("extract")
+    assert cache.get("extract", "m", "p1") is None
+    assert cache.get("questions", "m", "p2") == "b"
+
+def test_client_reads_disk_tier_off_the_event_loop(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, memory_entries=1)
+    monkeypatch.setattr(llm_client, "get_llm_cache", lambda: cache)
+    client = LLMClient(CountingBackend())
+    loop_threads = []
+    disk_threads = []
+    get_from_disk = cache.get_from_disk
+
+    def recording_get_from_disk(*args):
+        disk_threads.append(threading.get_ident())
+        return get_from_disk(*args)
+
+    monkeypatch.setattr(cache, "get_from_disk", recording_get_from_disk)
+
+    async def run():
+        loop_threads.append(threading.get_ident())
+        first = await client.generate("prompt", task="t")
+        again = await client.generate("prompt", task="t")
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first == again == "response 1"
+    assert client.backend.calls == 1
+    # Only the first call missed memory; its disk lookup ran in a worker thread
+    assert len(disk_threads) == 1 and disk_threads[0] != loop_threads[0]
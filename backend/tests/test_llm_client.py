@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from services.llm_client import LLMClient, LLMBackend, LLMError, is_retryable
+
+class HTTPError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class FlakyBackend(LLMBackend):
+    model_name = "flaky"
+
+    def __init__(self, errors: list):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def generate(self, prompt: str, task: str) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def _client(backend, max_retries=2):
+    return LLMClient(backend, max_retries=max_retries, backoff=0)
+
+@pytest.mark.parametrize("error, expected", [
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (HTTPError(429), True),
+    (HTTPError(503), True),
+    (HTTPError(400), False),
+    (HTTPError(403), False),
+    (LLMError("GEMINI_API_KEY is not set"), False),
+    (ValueError("bad"), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+def test_transient_errors_are_retried():
+    backend = FlakyBackend([HTTPError(429), HTTPError(500)])
+    response = asyncio.run(_client(backend).generate("p", cache=False))
+    assert response == "ok"
+    assert backend.calls == 3
+
+def test_non_retryable_errors_fail_at_once():
+    backend = FlakyBackend([LLMError("GEMINI_API_KEY is not set")])
+    with pytest.raises(LLMError, match="after 1 attempts"):
+        asyncio.run(_client(backend).generate("p", cache=False))
+    assert backend.calls == 1
+
+def test_gives_up_after_max_retries():
+    backend = FlakyBackend([HTTPError(503)] * 5)
+    with pytest.raises(LLMError, match="after 3 attempts"):
+        asyncio.run(_client(backend).generate("p", cache=False))
+    assert backend.calls == 3
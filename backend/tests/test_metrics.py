@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import engine
+from services import metrics
+from services.metrics import Counter, Histogram
+
+def _count_and_sum(histogram, *labels):
+    series = histogram._series.get(labels)
+    if series is None:
+        return 0, 0.0
+    return sum(series[:-1]), series[-1]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "x")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="x",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{op="x",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{op="x"} 3' in lines
+
+def test_counter_counts_per_label():
+    counter = Counter("test_total", "test", ("result",))
+    counter.inc("hit")
+    counter.inc("hit", amount=2)
+    counter.inc("miss")
+    assert 'test_total{result="hit"} 3' in counter.render()
+
+def test_failed_statements_are_timed_and_leave_no_state():
+    before_count, before_sum = _count_and_sum(metrics.db_query_duration, "SELECT")
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        conn.rollback()
+        conn.execute(text("SELECT 1"))
+        assert "query_start" not in conn.info
+    after_count, after_sum = _count_and_sum(metrics.db_query_duration, "SELECT")
+    assert after_count == before_count + 2
+    assert 0 <= after_sum - before_sum < 1.0
+
+def test_request_metrics_are_labelled_by_full_route(client):
+    client.get("/")
+    client.get("/templates/")
+    client.get("/templates/tpl_does_not_exist")
+    client.get("/documents/jobs/999999")
+    client.get("/no/such/path")
+    body = client.get("/metrics").text
+    for labels in (
+        'method="GET",route="/",status="200"',
+        'method="GET",route="/templates/",status="200"',
+        'method="GET",route="/templates/{template_id}",status="404"',
+        'method="GET",route="/documents/jobs/{job_id}",status="404"',
+        'method="GET",route="unmatched",status="404"',
+    ):
+        assert f"lexi_http_request_duration_seconds_count{{{labels}}}" in body
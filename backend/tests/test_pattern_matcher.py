@@ -0,0 +1,52 @@
+from services.pattern_matcher import MultiPatternMatcher, get_matcher
+from services.template_engine import create_template_with_matches, create_template_from_text
+
+def test_longest_pattern_wins():
+    matcher = MultiPatternMatcher({"Rajesh": "first_name", "Rajesh Kumar": "full_name"})
+    text = "Rajesh Kumar and Rajesh"
+    assert list(matcher.finditer(text)) == [("full_name", 0, 12), ("first_name", 17, 23)]
+
+def test_patterns_only_match_whole_words():
+    matcher = MultiPatternMatcher({"10": "count", "Ram": "name"})
+    assert list(matcher.finditer("In 2010 Ramesh paid 10 to Ram.")) == [("count", 20, 22), ("name", 26, 29)]
+
+def test_patterns_with_punctuation_edges():
+    matcher = MultiPatternMatcher({"Rs. 500": "amount", "(A)": "clause"})
+    assert [key for key, _, _ in matcher.finditer("pay Rs. 500 under (A)")] == ["amount", "clause"]
+
+def test_shared_prefixes_are_matched_independently():
+    matcher = MultiPatternMatcher({"Mumbai": "city", "Mumbai Central": "station", "Mum": "nick"})
+    assert [key for key, _, _ in matcher.finditer("Mum at Mumbai Central, not Mumbai")] == ["nick", "station", "city"]
+
+def test_substitute_reports_original_spans():
+    matcher = MultiPatternMatcher({"Asha": "name", "Pune": "city"})
+    text, matches = matcher.substitute("Asha of Pune; Asha", lambda key: f"<{key}>")
+    assert text == "<name> of <city>; <name>"
+    assert matches == {"name": [(0, 4), (14, 18)], "city": [(8, 12)]}
+
+def test_empty_matcher_is_a_no_op():
+    matcher = MultiPatternMatcher({"": "blank"})
+    assert list(matcher.finditer("anything")) == []
+    assert matcher.substitute("anything", str) == ("anything", {})
+
+def test_get_matcher_is_cached_and_first_key_wins():
+    pairs = (("a", "Same"), ("b", "Same"))
+    matcher = get_matcher(pairs)
+    assert get_matcher(pairs) is matcher
+    assert list(matcher.finditer("Same")) == [("a", 0, 4)]
+
+def test_create_template_with_matches():
+    variables = [
+        {"key": "first_name", "example": "Rajesh"},
+        {"key": "full_name", "example": "Rajesh Kumar"},
+        {"key": "year", "example": "10"},
+        {"key": "unused", "example": None},
+    ]
+    result = create_template_with_matches("Rajesh Kumar, aged 10 in 2010. Rajesh signs.", variables)
+    assert result["template_md"] == "{{full_name}}, aged {{year}} in 2010. {{first_name}} signs."
+    assert result["matches"] == {
+        "full_name": {"count": 1, "positions": [(0, 12)]},
+        "year": {"count": 1, "positions": [(19, 21)]},
+        "first_name": {"count": 1, "positions": [(31, 37)]},
+    }
+    assert create_template_from_text("Rajesh Kumar", variables) == "{{full_name}}"
@@ -0,0 +1,112 @@
+import json
+import pytest
+from services.llm_client import StubBackend, get_llm_client
+
+class QuestionBackend(StubBackend):
+    """Answers batched question prompts with batch_response; counts calls per task"""
+
+    def __init__(self, batch_response: str):
+        super().__init__()
+        self.batch_response = batch_response
+        self.calls = {}
+
+    async def generate(self, prompt: str, task: str) -> str:
+        self.calls[task] = self.calls.get(task, 0) + 1
+        if task == "generate_questions_batch":
+            return self.batch_response
+        return await super().generate(prompt, task)
+
+@pytest.fixture
+def question_llm():
+    llm = get_llm_client()
+    original = llm.backend
+
+    def use(batch_response: str) -> QuestionBackend:
+        llm.backend = QuestionBackend(batch_response)
+        return llm.backend
+
+    yield use
+    llm.backend = original
+
+def _create_template(client, template_id: str, labels: list):
+    response = client.post("/templates/", json={
+        "template_id": template_id, "title": "Questions", "description": "", "doc_type": "notice",
+        "jurisdiction": "IN", "similarity_tags": [], "body_md": "Body",
+        "variables": [
+            {"key": f"field_{i}", "label": label, "description": template_id, "example": "x"}
+            for i, label in enumerate(labels)
+        ]
+    })
+    assert response.status_code == 200, response.text
+
+def _questions(client, template_id: str, answers: dict = None, batched: bool = True) -> dict:
+    response = client.post(
+        "/chat/generate-questions", params={"template_id": template_id, "batched": batched}, json=answers or {}
+    )
+    assert response.status_code == 200
+    return {q["key"]: q["question"] for q in response.json()["questions"]}
+
+def test_batched_questions_use_one_call_and_are_reused(client, question_llm):
+    _create_template(client, "tpl_questions_batched", ["Claimant Name", "Policy Number", "Incident Date"])
+    backend = question_llm(json.dumps({"questions": {
+        "field_0": "What is your full name?",
+        "field_1": "\"What is the policy number?\"",
+        "field_2": "When did it happen?",
+        "unknown_key": "Ignored",
+    }}))
+
+    assert _questions(client, "tpl_questions_batched") == {
+        "field_0": "What is your full name?",
+        "field_1": "What is the policy number?",
+        "field_2": "When did it happen?",
+    }
+    assert backend.calls == {"generate_questions_batch": 1}
+
+    # Stored questions are reused, and answered keys are skipped
+    assert _questions(client, "tpl_questions_batched", {"field_1": "POL-1"}) == {
+        "field_0": "What is your full name?",
+        "field_2": "When did it happen?",
+    }
+    assert backend.calls == {"generate_questions_batch": 1}
+
+def test_malformed_batch_falls_back_and_is_retried(client, question_llm):
+    _create_template(client, "tpl_questions_malformed", ["Forum Name", "Claim Amount"])
+    backend = question_llm("not json at all")
+
+    assert _questions(client, "tpl_questions_malformed") == {
+        "field_0": "Please provide forum name",
+        "field_1": "Please provide claim amount",
+    }
+    assert backend.calls == {"generate_questions_batch": 1}
+
+    # Fallbacks are not stored, so the next visit asks again; a partial answer fills what it can
+    backend.batch_response = json.dumps({"questions": {"field_1": "How much are you claiming?"}})
+    assert _questions(client, "tpl_questions_malformed") == {
+        "field_0": "Please provide forum name",
+        "field_1": "How much are you claiming?",
+    }
+    assert backend.calls == {"generate_questions_batch": 2}
+
+    backend.batch_response = json.dumps({"questions": {"field_0": "Which forum?"}})
+    assert _questions(client, "tpl_questions_malformed")["field_0"] == "Which forum?"
+    assert backend.calls == {"generate_questions_batch": 3}
+    assert _questions(client, "tpl_questions_malformed") == {
+        "field_0": "Which forum?", "field_1": "How much are you claiming?"
+    }
+    assert backend.calls == {"generate_questions_batch": 3}
+
+def test_unbatched_questions_use_one_call_per_variable(client, question_llm):
+    _create_template(client, "tpl_questions_single", ["Landlord Name", "Rent Amount"])
+    backend = question_llm("{}")
+
+    questions = _questions(client, "tpl_questions_single", batched=False)
+    assert questions == {
+        "field_0": "Please provide the requested information.",
+        "field_1": "Please provide the requested information.",
+    }
+    assert backend.calls == {"generate_questions": 2}
+
+def test_unknown_template_has_no_questions(client, question_llm):
+    backend = question_llm("{}")
+    assert _questions(client, "tpl_questions_missing") == {}
+    assert backend.calls == {}
@@ -0,0 +1,53 @@
+from services.rule_extractor import extract_from_query, find_dates
+
+CLAIM_AMOUNT = {"key": "claim_amount", "label": "Claim amount", "dtype": "number"}
+INCIDENT_DATE = {"key": "incident_date", "label": "Incident date", "dtype": "date"}
+
+def _values(query: str, variables: list) -> dict:
+    return {key: result["value"] for key, result in extract_from_query(query, variables).items()}
+
+def test_dates_are_normalized():
+    values = sorted(c.value for c in find_dates("on 2024-01-05, 25/12/2023, 3rd March 2022 and Apr 7, 2021"))
+    assert values == ["2021-04-07", "2022-03-03", "2023-12-25", "2024-01-05"]
+
+def test_ambiguous_numeric_date_is_less_confident():
+    [candidate] = find_dates("on 04/05/2024")
+    assert candidate.value == "2024-05-04" and candidate.confidence < 1.0
+
+def test_currency_amount_fills_the_only_amount_variable():
+    result = extract_from_query("claim for Rs. 2.5 lakh after the fire", [CLAIM_AMOUNT])
+    assert result == {"claim_amount": {"value": 250000, "confidence": 0.9}}
+
+def test_bare_policy_number_is_not_an_amount():
+    assert _values("notice for policy 987654 dated 2024-01-05", [CLAIM_AMOUNT, INCIDENT_DATE]) == {
+        "incident_date": "2024-01-05"
+    }
+
+def test_bare_flat_number_is_not_an_amount():
+    assert _values("I live at flat 12 near 5th cross", [CLAIM_AMOUNT]) == {}
+
+def test_bare_number_named_by_its_variable_is_used():
+    result = extract_from_query("the claim amount is 45000", [CLAIM_AMOUNT])
+    assert result == {"claim_amount": {"value": 45000, "confidence": 0.8}}
+
+def test_context_words_pick_between_dates():
+    variables = [INCIDENT_DATE, {"key": "notice_date", "label": "Notice date", "dtype": "date"}]
+    assert _values("the incident happened on 2024-01-05 and much later the notice was sent on 2024-02-10", variables) == {
+        "incident_date": "2024-01-05", "notice_date": "2024-02-10"
+    }
+
+def test_regex_enum_and_email():
+    variables = [
+        {"key": "policy_number", "regex": r"POL-\d{4}"},
+        {"key": "forum", "enum": ["district", "state"]},
+        {"key": "contact_email", "dtype": "email"},
+    ]
+    result = extract_from_query("POL-1234 in the district forum, write to a@b.co", variables)
+    assert result == {
+        "policy_number": {"value": "POL-1234", "confidence": 0.95},
+        "forum": {"value": "district", "confidence": 0.9},
+        "contact_email": {"value": "a@b.co", "confidence": 0.9},
+    }
+
+def test_ambiguous_enum_is_left_to_the_llm():
+    assert _values("district or state forum", [{"key": "forum", "enum": ["district", "state"]}]) == {}
@@ -0,0 +1,43 @@
+from collections import namedtuple
+from services.search_index import highlight, merge_ranked
+
+Row = namedtuple("Row", "id score")
+
+def test_highlight_escapes_text_before_marking():
+    snippet = "<script>alert(1)</script> indemnity & costs"
+    assert highlight(snippet) == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>indemnity</mark> &amp; costs"
+    assert highlight(None) == ""
+
+def test_scores_are_normalized_per_source():
+    # Raw bm25 scores from different tables are on different scales
+    ranked = merge_ranked({
+        "documents": [Row(1, 40.0), Row(2, 20.0)],
+        "templates": [Row(7, 2.0), Row(8, 1.5)],
+    }, limit=4, offset=0)
+    assert ranked == [("templates", 7, 1.0), ("documents", 1, 1.0), ("templates", 8, 0.75), ("documents", 2, 0.5)]
+
+def test_merge_pages_and_skips_empty_sources():
+    ranked_by_source = {"documents": [Row(1, 4.0), Row(2, 1.0)], "drafts": [], "templates": [Row(3, 3.0)]}
+    assert merge_ranked(ranked_by_source, limit=1, offset=2) == [("documents", 2, 0.25)]
+    assert merge_ranked({"drafts": [Row(5, 0.0)]}, limit=5, offset=0) == [("drafts", 5, 0.0)]
+
+def test_search_escapes_indexed_html(client):
+    response = client.post("/templates/", json={
+        "template_id": "tpl_search_escape",
+        "title": "Indemnity <b>notice</b>",
+        "description": "<img src=x onerror=alert(1)> zanzibarite indemnity clause",
+        "doc_type": "notice",
+        "jurisdiction": "IN",
+        "similarity_tags": [],
+        "body_md": "Body",
+        "variables": []
+    })
+    assert response.status_code == 200
+
+    response = client.get("/search/", params={"q": "zanzibarite", "types": "templates"})
+    assert response.status_code == 200
+    [result] = response.json()["results"]
+    assert result["title"] == "Indemnity <b>notice</b>"
+    assert "<img" not in result["snippet"]
+    assert "&lt;img src=x onerror=alert(1)&gt; <mark>zanzibarite</mark>" in result["snippet"]
+    assert result["score"] == 1.0
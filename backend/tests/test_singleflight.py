@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from services.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    async def run():
+        flight = SingleFlight("test")
+        calls = 0
+        release = asyncio.Event()
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        release.set()
+        assert await asyncio.gather(*waiters) == [1] * 5
+        assert len(flight) == 0
+
+        # Nothing is cached: the next call runs again
+        assert await flight.do("key", work) == 2
+
+    asyncio.run(run())
+
+def test_different_keys_run_separately():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: work("a")), flight.do("b", lambda: work("b"))
+        )
+        assert results == ["a", "b"]
+
+    asyncio.run(run())
+
+def test_errors_reach_every_caller_and_release_the_key():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+        )
+        assert [str(e) for e in results] == ["boom", "boom"]
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
@@ -0,0 +1,40 @@
+import asyncio
+from services.streaming import iter_lines
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+def _lines(parts, **kwargs):
+    async def collect():
+        return [line async for line in iter_lines(_chunks(parts), **kwargs)]
+    return asyncio.run(collect())
+
+def test_lines_split_across_chunks_and_blank_lines_counted():
+    parts = ["﻿al".encode("utf-8"), b"pha\n\nbe", b"ta\r\ngamma"]
+    assert _lines(parts) == [(1, "alpha", None), (3, "beta", None), (4, "gamma", None)]
+
+def test_invalid_utf8_is_reported_per_line():
+    lines = _lines([b"ok\n", b"bad \xff\xfe\n", b"fine\n"])
+    assert lines[0] == (1, "ok", None)
+    assert lines[1][0] == 2 and lines[1][1] is None and "Invalid UTF-8" in lines[1][2]
+    assert lines[2] == (3, "fine", None)
+
+def test_overlong_line_is_skipped_without_buffering():
+    parts = [b"short\n"] + [b"x" * 100] * 50 + [b"\nafter\n", b"y" * 300]
+    assert _lines(parts, max_line_bytes=256) == [
+        (1, "short", None),
+        (2, None, "Line is longer than 256 bytes"),
+        (3, "after", None),
+        (4, None, "Line is longer than 256 bytes"),
+    ]
+
+def test_bulk_import_reports_bad_rows_and_keeps_going(client):
+    good = b'{"template_id": "tpl_stream_ok", "title": "Streamed", "description": "d", "jurisdiction": "IN", "doc_type": "notice", "similarity_tags": [], "body_md": "{{a}}", "variables": []}'
+    body = good + b"\n\xff\xfe not utf-8\n{not json}\n"
+    response = client.post("/templates/bulk-import", content=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 1
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert "Invalid UTF-8" in result["errors"][0]["error"]
@@ -0,0 +1,30 @@
+from services.template_engine import parse_template, compile_template, render_plan, render_draft
+
+def test_parse_template_splits_literals_and_slots():
+    plan = parse_template("Dear {{ Name }}, re {{claim_no}}. Bye {{name}}")
+    assert plan.literals == ["Dear ", ", re ", ". Bye ", ""]
+    assert plan.slots == ["name", "claim_no", "name"]
+    assert plan.raw_slots == ["{{ Name }}", "{{claim_no}}", "{{name}}"]
+    assert plan.slot_index == {"name": [0, 2], "claim_no": [1]}
+    assert plan.keys == ["name", "claim_no"]
+
+def test_compile_template_is_cached_per_body():
+    plan = compile_template("{{a}} and {{b}}", "tpl_cache")
+    assert compile_template("{{a}} and {{b}}", "tpl_cache") is plan
+    assert compile_template("{{a}} or {{b}}", "tpl_cache") is not plan
+
+def test_render_plan_matches_keys_case_insensitively():
+    plan = parse_template("{{Party}} owes {{amount}}")
+    draft, missing = render_plan(plan, {"party": "Asha", "AMOUNT": 500})
+    assert draft == "Asha owes 500"
+    assert missing == []
+
+def test_render_plan_reports_missing_once_in_order():
+    plan = parse_template("{{b}} {{a}} {{b}} {{c}}")
+    draft, missing = render_plan(plan, {"a": "x", "c": None})
+    assert draft == "{{b}} x {{b}} [MISSING: c]"
+    assert missing == ["b", "c"]
+
+def test_render_draft_unwraps_value_dicts():
+    rendered = render_draft("On {{date}}", {"date": {"value": "2024-01-05", "confidence": 0.9}})
+    assert rendered == {"draft_md": "On 2024-01-05", "missing_variables": []}
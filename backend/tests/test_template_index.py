@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+from services.template_index import TemplateIndex, template_index, tokenize
+
+def _template(id: int, template_id: str, title: str, doc_type: str = "notice", jurisdiction: str = "india",
+              tags: list = None, description: str = ""):
+    return SimpleNamespace(
+        id=id, template_id=template_id, title=title, doc_type=doc_type, jurisdiction=jurisdiction,
+        similarity_tags=tags or [], description=description
+    )
+
+def _index() -> TemplateIndex:
+    index = TemplateIndex()
+    index.add(_template(1, "tpl_insurance", "Insurance claim notice", tags=["insurance", "claim"]))
+    index.add(_template(2, "tpl_lease", "Residential lease agreement", doc_type="agreement", tags=["rent"]))
+    index.add(_template(3, "tpl_consumer", "Consumer complaint", doc_type="complaint",
+                        description="Complaint about a defective insurance product"))
+    return index
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("Please draft a Lease for my flat in Pune") == ["lease", "flat", "pune"]
+
+def test_title_and_tag_matches_outrank_description_matches():
+    index = _index()
+    assert [template_id for template_id, _ in index.search("insurance claim")] == ["tpl_insurance", "tpl_consumer"]
+    assert index.search("lease", k=1)[0][0] == "tpl_lease"
+    assert index.search("unrelated words") == []
+    assert index.search("the a of") == []
+
+def test_lexical_confidence_needs_coverage_and_a_margin():
+    index = _index()
+    clear = index.lexical_confidence("insurance claim notice", index.search("insurance claim notice"))
+    assert clear >= 0.85
+    # Only half the query terms appear in the top template
+    partial = index.lexical_confidence("lease arbitration", index.search("lease arbitration"))
+    assert partial == 0.5
+    assert index.lexical_confidence("anything", []) == 0.0
+
+def test_replacing_and_removing_templates_updates_the_index():
+    index = _index()
+    version = index.version
+    index.add(_template(2, "tpl_lease", "Commercial tenancy deed", doc_type="deed"))
+    assert index.version == version + 1
+    assert index.search("residential") == []
+    assert index.search("tenancy")[0][0] == "tpl_lease"
+    assert len(index) == 3
+
+    index.remove("tpl_lease")
+    index.remove("tpl_lease")
+    assert index.version == version + 2
+    assert index.search("tenancy") == []
+    assert "tenancy" not in index.postings
+
+def _create_template(client, template_id: str, title: str, tags: list):
+    response = client.post("/templates/", json={
+        "template_id": template_id, "title": title, "description": "", "doc_type": "notice",
+        "jurisdiction": "IN", "similarity_tags": tags, "body_md": "Body", "variables": []
+    })
+    assert response.status_code == 200, response.text
+
+def test_clear_lexical_match_skips_the_llm(client, counting_llm):
+    _create_template(client, "tpl_quokka_notice", "Quokka habitat notice", ["quokka", "habitat"])
+    _create_template(client, "tpl_wombat_notice", "Wombat burrow notice", ["wombat"])
+
+    response = client.post("/chat/match-template", json={"query": "quokka habitat notice"})
+    assert response.status_code == 200
+    assert response.json()["template"]["template_id"] == "tpl_quokka_notice"
+    assert counting_llm.calls["match_template"] == 0
+
+    # One query term: not enough to trust the lexical match alone
+    response = client.post("/chat/match-template", json={"query": "wombat"})
+    assert response.json()["template"]["template_id"] == "tpl_wombat_notice"
+    assert counting_llm.calls["match_template"] == 1
+
+def test_updated_templates_are_matched_by_their_new_metadata(client, counting_llm):
+    _create_template(client, "tpl_axolotl_notice", "Axolotl tank notice", ["axolotl"])
+    line = (
+        '{"template_id": "tpl_axolotl_notice", "title": "Narwhal tusk notice", "description": "", '
+        '"doc_type": "notice", "jurisdiction": "IN", "similarity_tags": ["narwhal"], "body_md": "Body", "variables": []}'
+    )
+    response = client.post("/templates/bulk-import?upsert=true", content=line)
+    assert response.json()["updated"] == 1
+
+    response = client.post("/chat/match-template", json={"query": "narwhal tusk notice"})
+    assert response.status_code == 200
+    assert response.json()["template"]["template_id"] == "tpl_axolotl_notice"
+    assert counting_llm.calls["match_template"] == 0
+    assert template_index.search("axolotl") == []
@@ -0,0 +1,65 @@
+import pytest
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    """At least a few pages of templates, plus the full list in id order"""
+    for i in range(7):
+        response = client.post("/templates/", json={
+            "template_id": f"tpl_listing_{i}", "title": f"Listing {i}", "description": "d", "doc_type": "notice",
+            "jurisdiction": "IN", "similarity_tags": ["listing"], "body_md": "Body",
+            "variables": [{"key": "name", "label": "Name", "description": "d", "example": "Asha"}]
+        })
+        assert response.status_code == 200
+    return client.get("/templates/", params={"limit": 1000}).json()
+
+def test_cursor_pages_cover_the_catalog_once_in_order(client, catalog):
+    seen = []
+    params = {"limit": 3}
+    while True:
+        response = client.get("/templates/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(t["id"] for t in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        assert cursor == str(page[-1]["id"])
+        params = {"limit": 3, "after_id": cursor}
+    assert seen == [t["id"] for t in catalog]
+
+def test_last_page_has_no_cursor(client, catalog):
+    response = client.get("/templates/", params={"after_id": catalog[-2]["id"], "limit": 5})
+    assert [t["id"] for t in response.json()] == [catalog[-1]["id"]]
+    assert "X-Next-Cursor" not in response.headers
+    assert client.get("/templates/", params={"after_id": catalog[-1]["id"]}).json() == []
+
+def test_skip_still_pages(client, catalog):
+    response = client.get("/templates/", params={"skip": 2, "limit": 2})
+    assert [t["id"] for t in response.json()] == [t["id"] for t in catalog[2:4]]
+
+def test_limit_is_capped(client, catalog):
+    assert client.get("/templates/", params={"limit": 1001}).status_code == 422
+    assert client.get("/templates/", params={"limit": 0}).status_code == 422
+
+def test_fields_project_columns(client, catalog):
+    response = client.get("/templates/", params={"fields": "template_id,title", "limit": 2})
+    assert response.status_code == 200
+    assert response.json() == [{"template_id": t["template_id"], "title": t["title"]} for t in catalog[:2]]
+    assert response.headers["X-Next-Cursor"] == str(catalog[1]["id"])
+
+def test_fields_can_include_variables(client, catalog):
+    listing = next(t for t in catalog if t["template_id"] == "tpl_listing_0")
+    response = client.get("/templates/", params={"fields": "id,variables", "after_id": listing["id"] - 1, "limit": 1})
+    [row] = response.json()
+    assert set(row) == {"id", "variables"}
+    assert [v["key"] for v in row["variables"]] == ["name"]
+
+def test_include_variables_false_drops_them(client, catalog):
+    [row] = client.get("/templates/", params={"include_variables": False, "limit": 1}).json()
+    assert "variables" not in row
+    assert row["template_id"] == catalog[0]["template_id"]
+
+def test_unknown_fields_are_rejected(client, catalog):
+    response = client.get("/templates/", params={"fields": "title,secret"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: secret"
@@ -0,0 +1,118 @@
+from services.template_engine import AnswerValidator, get_template_validator, validate_answers
+
+VARIABLES = [
+    {"key": "claimant_name", "label": "Claimant name", "required": True, "dtype": "string"},
+    {"key": "incident_date", "label": "Incident date", "required": True, "dtype": "date"},
+    {"key": "claim_amount", "label": "Claim amount", "dtype": "number"},
+    {"key": "email", "label": "Email", "dtype": "email"},
+    {"key": "policy_number", "label": "Policy number", "regex": r"POL-\d{4}$"},
+    {"key": "forum", "label": "Forum", "enum": ["district", "state"]},
+]
+
+def test_valid_answers_have_no_errors():
+    answers = {
+        "claimant_name": "Asha", "incident_date": "2024-01-05", "claim_amount": "1200.50",
+        "email": "asha@example.com", "policy_number": "POL-1234", "forum": "state",
+    }
+    assert AnswerValidator(VARIABLES).validate(answers) == {}
+
+def test_each_rule_reports_its_error():
+    errors = AnswerValidator(VARIABLES).validate({
+        "incident_date": "05/01/2024", "claim_amount": "lots", "email": "nope",
+        "policy_number": "1234", "forum": "supreme",
+    })
+    assert errors == {
+        "claimant_name": "Claimant name is required",
+        "incident_date": "Date must be in YYYY-MM-DD format",
+        "claim_amount": "Must be a valid number",
+        "email": "Must be a valid email address",
+        "policy_number": r"Must match pattern: POL-\d{4}$",
+        "forum": "Must be one of: district, state",
+    }
+
+def test_check_required_false_only_checks_given_values():
+    validator = AnswerValidator(VARIABLES)
+    assert validator.validate({"claim_amount": "12"}, check_required=False) == {}
+    assert validator.validate({"forum": "supreme"}, check_required=False) == {"forum": "Must be one of: district, state"}
+
+def test_validator_is_reused_until_variables_change():
+    validator = get_template_validator("tpl_validation", VARIABLES)
+    assert get_template_validator("tpl_validation", [dict(v) for v in VARIABLES]) is validator
+    changed = VARIABLES[:-1] + [{"key": "forum", "label": "Forum", "enum": ["district"]}]
+    assert get_template_validator("tpl_validation", changed) is not validator
+
+def test_validate_answers_matches_compiled_validator():
+    answers = {"claimant_name": "", "email": "x"}
+    assert validate_answers(VARIABLES, answers) == AnswerValidator(VARIABLES).validate(answers)
+
+def _create_template(client, template_id: str):
+    response = client.post("/templates/", json={
+        "template_id": template_id, "title": "Claim notice", "description": "d", "jurisdiction": "IN",
+        "doc_type": "notice", "similarity_tags": [], "body_md": "{{claimant_name}} claims {{claim_amount}} in {{forum}}",
+        "variables": [
+            {"key": "claimant_name", "label": "Claimant name", "description": "d", "example": "Asha", "required": True},
+            {"key": "claim_amount", "label": "Claim amount", "description": "d", "example": "10", "dtype": "number"},
+            {"key": "forum", "label": "Forum", "description": "d", "example": "state", "enum": ["district", "state"]},
+        ]
+    })
+    assert response.status_code == 200, response.text
+
+def test_generate_renders_partial_drafts(client):
+    _create_template(client, "tpl_partial_generate")
+    response = client.post("/drafts/generate", json={"template_id": "tpl_partial_generate", "answers": {"claim_amount": "100"}})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["draft_md"] == "{{claimant_name}} claims 100 in {{forum}}"
+    assert body["missing_variables"] == ["claimant_name", "forum"]
+
+def test_generate_rejects_invalid_values(client):
+    _create_template(client, "tpl_invalid_generate")
+    response = client.post("/drafts/generate", json={"template_id": "tpl_invalid_generate", "answers": {"forum": "supreme"}})
+    assert response.status_code == 422
+    assert response.json()["errors"] == {"forum": "Must be one of: district, state"}
+
+def test_prefill_value_dicts_are_validated_by_their_value():
+    validator = AnswerValidator(VARIABLES)
+    answers = {
+        "claimant_name": {"value": "Asha", "confidence": 0.9},
+        "incident_date": {"value": "2024-01-05", "confidence": 0.8},
+        "claim_amount": {"value": 1200},
+        "forum": {"value": "state"},
+    }
+    assert validator.validate(answers) == {}
+    assert validator.validate({"forum": {"value": "supreme"}}, check_required=False) == {
+        "forum": "Must be one of: district, state"
+    }
+    assert validator.validate({"claimant_name": {"value": None}, "incident_date": "2024-01-05"}) == {
+        "claimant_name": "Claimant name is required"
+    }
+
+def test_keys_match_case_insensitively_like_rendering():
+    validator = AnswerValidator(VARIABLES)
+    assert validator.validate({"FORUM": "supreme"}, check_required=False) == {"forum": "Must be one of: district, state"}
+    assert validator.validate({"Claimant_Name": "Asha", "incident_date": "2024-01-05"}) == {}
+    # Like the renderer, the first of two case variants wins
+    assert validator.validate({"Forum": "state", "FORUM": "supreme"}, check_required=False) == {}
+    assert validator.validate_many([{"FORUM": "supreme"}], check_required=False) == [
+        {"forum": "Must be one of: district, state"}
+    ]
+
+def test_generate_accepts_prefill_answers(client):
+    _create_template(client, "tpl_prefill_generate")
+    response = client.post("/drafts/generate", json={"template_id": "tpl_prefill_generate", "answers": {
+        "claimant_name": {"value": "Asha"}, "claim_amount": {"value": 100}, "forum": {"value": "state"}
+    }})
+    assert response.status_code == 200, response.text
+    assert response.json()["draft_md"] == "Asha claims 100 in state"
+
+def test_case_variant_keys_are_validated_everywhere(client):
+    _create_template(client, "tpl_case_variant")
+    response = client.post("/drafts/generate", json={"template_id": "tpl_case_variant", "answers": {"FORUM": "supreme"}})
+    assert response.status_code == 422
+    assert response.json()["errors"] == {"forum": "Must be one of: district, state"}
+
+    response = client.post("/templates/tpl_case_variant/validate", json={
+        "answers": {"Claimant_Name": "Asha", "FORUM": "supreme"}
+    })
+    assert response.json()["valid"] is False
+    assert response.json()["results"][0]["errors"] == {"forum": "Must be one of: district, state"}
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import pytest
+from services.ai_service import extract_variables_from_document, merge_variables, clean_variables, VariableExtractionError
+from services.llm_client import LLMBackend, get_llm_client
+
+class ScriptedBackend(LLMBackend):
+    """Returns the responses in order, one per call"""
+
+    model_name = "scripted"
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+
+    async def generate(self, prompt: str, task: str) -> str:
+        return self.responses.pop(0)
+
+@pytest.fixture
+def llm_backend():
+    client = get_llm_client()
+    original = client.backend
+
+    def use(responses):
+        client.backend = ScriptedBackend(responses)
+
+    yield use
+    client.backend = original
+
+def test_clean_variables_drops_malformed_items():
+    assert clean_variables(None) == []
+    assert clean_variables({"key": "a"}) == []
+    assert clean_variables(["oops", {"key": "a"}, {"key": " "}, {"key": 5}, {"label": "x"}]) == [{"key": "a"}]
+
+def test_merge_variables_keeps_first_definition_and_fills_gaps():
+    merged = {}
+    merge_variables(merged, [{"key": "Claimant_Name", "label": "Claimant"}])
+    merge_variables(merged, [{"key": "claimant_name", "label": "Other", "example": "Asha", "required": True}])
+    assert merged == {"claimant_name": {"key": "claimant_name", "label": "Claimant", "example": "Asha", "required": True}}
+
+def test_malformed_llm_items_do_not_fail_the_document(llm_backend):
+    llm_backend([
+        json.dumps({"variables": ["oops", {"key": "policy_number", "label": "Policy"}, 7]}),
+        json.dumps({"variables": {"not": "a list"}}),
+    ])
+    variables = asyncio.run(extract_variables_from_document("word " * 40, chunk_size=100, parallelism=1))
+    assert variables == [{"key": "policy_number", "label": "Policy"}]
+
+def test_failed_chunk_raises_instead_of_returning_partial_variables(llm_backend):
+    llm_backend([json.dumps({"variables": [{"key": "policy_number"}]}), "{not json}"])
+    with pytest.raises(VariableExtractionError, match="1 of 2 chunks"):
+        asyncio.run(extract_variables_from_document("word " * 40, chunk_size=100, parallelism=1))
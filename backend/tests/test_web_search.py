@@ -0,0 +1,114 @@
+import asyncio
+from services.web_search_service import (
+    SearchBackend, StubSearchBackend, WebSearchClient, clean_web_content, dedupe_results, normalize_url
+)
+
+def test_clean_strips_tags_and_keeps_paragraphs():
+    html = "<h1>Lease  Deed</h1>\n<p>This deed is made   on <b>1 May</b>.</p><p>Rent is due monthly.</p>"
+    assert clean_web_content(html) == "Lease Deed\n\nThis deed is made on 1 May.\n\nRent is due monthly."
+
+def test_clean_drops_whole_noise_lines_only():
+    html = (
+        "<p>The Subscriber agrees to the terms herein.</p>\n"
+        "<p>Read the privacy policy annexed as Schedule A.</p>\n"
+        "<div>Subscribe to our newsletter!</div>\n"
+        "Cookie Policy | Privacy Policy | Terms of Service\n"
+        "  Sign up for free"
+    )
+    assert clean_web_content(html) == (
+        "The Subscriber agrees to the terms herein.\n\nRead the privacy policy annexed as Schedule A."
+    )
+
+def test_clean_handles_empty_input():
+    assert clean_web_content(None) == ""
+
+def test_normalize_url_ignores_tracking_and_trailing_slash():
+    assert normalize_url("HTTPS://Example.com/deed/?utm_source=x&id=3&fbclid=y#top") == "https://example.com/deed?id=3"
+
+def test_dedupe_keeps_the_first_of_each_url_or_content():
+    documents = [
+        {"url": "https://a.com/x", "text": "Lease deed"},
+        {"url": "https://a.com/x/?ref=feed", "text": "Other text"},
+        {"url": "https://b.com/y", "text": "  LEASE   deed "},
+        {"url": "https://c.com/z", "text": "Sale deed"},
+    ]
+    assert [d["url"] for d in dedupe_results(documents)] == ["https://a.com/x", "https://c.com/z"]
+
+class CountingSearchBackend(StubSearchBackend):
+    """Stub results; counts searches and the most that ran at once"""
+
+    def __init__(self, latency_ms: int = 0, fail: bool = False):
+        super().__init__(latency_ms)
+        self.fail = fail
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def search(self, query: str, num_results: int) -> list:
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.fail:
+                raise ConnectionError("search down")
+            return await super().search(query, num_results)
+        finally:
+            self.active -= 1
+
+def test_results_are_cleaned_and_cached_per_normalized_query():
+    backend = CountingSearchBackend()
+    client = WebSearchClient(backend, ttl_seconds=60)
+
+    async def run():
+        first = await client.search("Lease  Deed", 2)
+        again = await client.search("lease deed", 2)
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert again is first
+    assert backend.calls == 1
+    assert "Privacy Policy" not in first[0]["text"]
+    assert "<p>" not in first[0]["text"]
+
+def test_cache_entries_expire():
+    backend = CountingSearchBackend()
+    client = WebSearchClient(backend, ttl_seconds=0)
+
+    async def run():
+        await client.search("lease deed", 2)
+        await client.search("lease deed", 2)
+
+    asyncio.run(run())
+    assert backend.calls == 2
+
+def test_failed_searches_are_not_cached():
+    backend = CountingSearchBackend(fail=True)
+    client = WebSearchClient(backend, ttl_seconds=60)
+
+    async def run():
+        return [await client.search("lease deed", 2) for _ in range(2)]
+
+    assert asyncio.run(run()) == [[], []]
+    assert backend.calls == 2
+
+def test_concurrent_searches_are_capped():
+    backend = CountingSearchBackend(latency_ms=20)
+    client = WebSearchClient(backend, max_concurrency=2)
+
+    async def run():
+        await asyncio.gather(*(client.search(f"query {i}", 1) for i in range(6)))
+
+    asyncio.run(run())
+    assert backend.calls == 6
+    assert backend.max_active == 2
+
+def test_slow_searches_time_out_to_no_results():
+    class SlowBackend(SearchBackend):
+        name = "slow"
+
+        async def search(self, query: str, num_results: int) -> list:
+            await asyncio.sleep(1)
+            return []
+
+    client = WebSearchClient(SlowBackend(), timeout=0.01)
+    assert asyncio.run(client.search("lease deed")) == []